@@ -8,9 +8,9 @@ def _patched_md5(*args, **kwargs):
         kwargs.pop('usedforsecurity')
     return _original_md5(*args, **kwargs)
 hashlib.md5 = _patched_md5
-from logic import load_json_file
 import ui
 from project_manager import ProjectManager
+from project_store import bind_project_data, release_private
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -44,27 +44,20 @@ if 'current_project_id' not in st.session_state:
     else:
         st.session_state.current_project_id = None
 
-# Helper to load project data
-def load_project_data(project_id):
-    if not project_id:
-        return [], [], []
-    paths = pm.get_project_paths(project_id)
-    envs = load_json_file(paths['env_file'])
-    apis = load_json_file(paths['api_file'])
-    hist = load_json_file(paths['history_file'])
-    return envs, apis, hist
-
-# Load data if not present or if explicit reload needed
 # 'data_loaded_for_project' tracks which project is currently loaded in memory
 if 'data_loaded_for_project' not in st.session_state or st.session_state.data_loaded_for_project != st.session_state.current_project_id:
-    envs, apis, hist = load_project_data(st.session_state.current_project_id)
-    st.session_state.environments = envs
-    st.session_state.api_templates = apis
-    st.session_state.comparison_history = hist
+    release_private()
     st.session_state.data_loaded_for_project = st.session_state.current_project_id
     # Reset run results when switching projects
     st.session_state.current_run_results = None
 
+# Project data is shared by all sessions (see project_store) and refreshed on every rerun;
+# run history is not held in the session: the Dashboard queries one page of it from the history store
+if st.session_state.current_project_id:
+    bind_project_data(st.session_state.current_project_id, pm.get_project_paths(st.session_state.current_project_id))
+else:
+    st.session_state.environments, st.session_state.api_templates = [], []
+
 # --- Inject CSS ---
 ui.inject_custom_css()
 
@@ -180,7 +173,7 @@ if st.session_state.current_project_id:
     elif st.session_state.page == "configuration":
         ui.render_configuration(current_paths['api_file'], current_paths['env_file'])
     elif st.session_state.page == "comparator":
-        ui.render_comparator(current_paths['history_file'], current_paths['env_file'], current_paths['api_file'])
+        ui.render_comparator(pm.get_history_store(st.session_state.current_project_id), current_paths['env_file'], current_paths['api_file'], current_paths['cassette_dir'], current_paths['blob_dir'], current_paths['report_dir'])
     elif st.session_state.page == "playground":
         ui.render_debugger()
 else:
@@ -0,0 +1,240 @@
+import asyncio
+import functools
+import json
+import uuid
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dependency_graph import DependencyGraph, run_graph_async
+from http_client import (
+    BodyBuffer, SessionPool, DEFAULT_TIMEOUT, DEFAULT_POOL_MAXSIZE, DEFAULT_KEEP_ALIVE, STREAM_CHUNK_BYTES,
+    get_default_transport, get_env_setting, get_max_body_bytes
+)
+from retry_policy import AsyncRetryingTransport
+from response_cache import AsyncCachingTransport
+from rate_limit import EnvLimiter
+from env_context import EnvContext
+from variable_store import VariableStore
+from response_body import run_blob_dir, discard_run_bodies
+from logic import (
+    prepare_run, build_request_info, parse_response, apply_extraction,
+    ComparisonPipeline, build_run_summary, flush_variable_stores
+)
+
+# --- Async Transports ---
+# An async transport exposes `open()`, `close()` and `send(env, api_template, request_info, limiter=None) -> HttpResponse`,
+# holding the limiter (rate_limit.EnvLimiter) for every request it puts on the wire.
+
+class ThreadedAsyncTransport:
+    """
+    Runs any synchronous transport (pooled sessions by default) on a private thread pool.
+    Works everywhere; in-flight requests are bounded by `max_threads`.
+    """
+    def __init__(self, sync_transport=None, max_threads=64):
+        self.sync_transport = sync_transport or get_default_transport()
+        self.max_threads = max_threads
+        self._executor = None
+
+    async def open(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="async-transport")
+
+    async def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def send(self, env, api_template, request_info, limiter=None):
+        loop = asyncio.get_running_loop()
+        # The sync chain takes the limiter's thread slot per attempt (retries and hedges included)
+        send = functools.partial(self.sync_transport.send, env, api_template, request_info, limiter=limiter)
+        return await loop.run_in_executor(self._executor, send)
+
+
+class AiohttpTransport:
+    """
+    Native non-blocking transport (requires the optional `aiohttp` package).
+    Like the pooled sync sessions, each environment gets its own session: its connector holds at most
+    the environment's `pool_size` connections and closes them after every request when `keep_alive` is off.
+    """
+    def __init__(self, limit_per_host=0):
+        self.limit_per_host = limit_per_host
+        self._sessions = {}
+
+    async def open(self):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("The 'aiohttp' async transport requires: pip install aiohttp")
+
+    def _get_session(self, env):
+        import aiohttp
+        key = SessionPool._pool_key(env)
+        session = self._sessions.get(key)
+        if session is None:
+            connector = aiohttp.TCPConnector(
+                limit=max(1, get_env_setting(env, 'pool_size', DEFAULT_POOL_MAXSIZE)),
+                limit_per_host=self.limit_per_host,
+                force_close=not get_env_setting(env, 'keep_alive', DEFAULT_KEEP_ALIVE)
+            )
+            # No cookie jar: requests stay independent, like the pooled sync transport
+            session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT), cookie_jar=aiohttp.DummyCookieJar())
+            self._sessions[key] = session
+        return session
+
+    async def close(self):
+        sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            await session.close()
+
+    async def send(self, env, api_template, request_info, limiter=None):
+        if limiter:
+            async with limiter.async_slot():
+                return await self.send(env, api_template, request_info)
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        params = request_info['params']
+        if isinstance(params, dict):
+            # aiohttp only accepts str/int/float query values
+            params = {k: (v if isinstance(v, (str, int, float)) else json.dumps(v)) for k, v in params.items() if v is not None}
+        async with self._get_session(env).request(
+            request_info['method'],
+            request_info['url'],
+            params=params,
+            json=request_info['body'],
+            headers=request_info['headers'],
+            timeout=aiohttp.ClientTimeout(total=get_env_setting(env, 'timeout', DEFAULT_TIMEOUT))
+        ) as response:
+            buffer = BodyBuffer(get_max_body_bytes(env))
+            try:
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_BYTES):
+                    buffer.write(chunk)
+            except BaseException:
+                buffer.abort()
+                raise
+            return buffer.finish(response.status, response.headers, int((loop.time() - started) * 1000))
+
+
+def build_aiohttp_transport():
+    """aiohttp behind the same retry/hedging and response cache as the default sync transport."""
+    return AsyncCachingTransport(AsyncRetryingTransport(AiohttpTransport()))
+
+
+ASYNC_TRANSPORTS = {
+    "threaded": ThreadedAsyncTransport,
+    "aiohttp": build_aiohttp_transport,
+}
+
+
+def get_async_transport(transport=None, sync_transport=None):
+    """
+    Accepts a transport instance, a registered name, or None (threaded).
+    A given `sync_transport` (e.g. record/replay) is always run through the threaded adapter.
+    """
+    if sync_transport is not None:
+        return ThreadedAsyncTransport(sync_transport)
+    if transport is None:
+        return ThreadedAsyncTransport()
+    if isinstance(transport, str):
+        if transport not in ASYNC_TRANSPORTS:
+            raise ValueError(f"Unknown async transport: {transport}")
+        return ASYNC_TRANSPORTS[transport]()
+    return transport
+
+
+# --- Engine ---
+
+async def fetch_api_data_async(env, api_template, runtime_context, transport, limiter=None, env_context=None, blob_dir=None):
+    """Async twin of logic.fetch_api_data: same request rendering and result shape."""
+    request_info, error_result = build_request_info(env, api_template, runtime_context, env_context)
+    if error_result is not None:
+        return error_result
+    try:
+        response = await transport.send(env, api_template, request_info, limiter=limiter)
+        return parse_response(response, request_info, blob_dir)
+    except Exception as e:
+        return {"error": str(e) or type(e).__name__, "status": "failed", "_debug_request": request_info}
+
+
+async def _run_comparison(selected_envs, selected_api_templates, transport, progress_callback, pipeline, variable_stores, scheduler="dag", blob_dir=None):
+    total_steps = len(selected_api_templates) * len(selected_envs)
+    progress = {"done": 0}
+    loop = asyncio.get_running_loop()
+    ingest_tasks = []
+
+    def on_result(env, api_tpl, data):
+        # Fingerprinting and (inline) diffs are CPU work: keep them off the event loop
+        ingest_tasks.append(loop.run_in_executor(None, pipeline.on_result, env, api_tpl, data))
+        progress["done"] += 1
+        if progress_callback:
+            progress_callback(min(progress["done"], total_steps), total_steps, f"{env['name']}: {api_tpl['name']}")
+
+    async def run_sequence_for_env(env):
+        limiter = EnvLimiter(env)
+        env_context = EnvContext(env)
+        if scheduler == "sequential":
+            runtime_context = {}
+            for api_tpl in selected_api_templates:
+                data = await fetch_api_data_async(env, api_tpl, runtime_context, transport, limiter, env_context, blob_dir)
+                on_result(env, api_tpl, data)
+                apply_extraction(env, api_tpl, data, runtime_context, variable_stores[env['id']])
+            return
+
+        graph = DependencyGraph(selected_api_templates, env)
+
+        async def run_node(index, runtime_context):
+            api_tpl = selected_api_templates[index]
+            data = await fetch_api_data_async(env, api_tpl, runtime_context, transport, limiter, env_context, blob_dir)
+            on_result(env, api_tpl, data)
+            return apply_extraction(env, api_tpl, data, runtime_context, variable_stores[env['id']])
+
+        await run_graph_async(graph, run_node, max_parallel=limiter.max_concurrency)
+
+    await transport.open()
+    try:
+        outcomes = await asyncio.gather(*(run_sequence_for_env(env) for env in selected_envs), return_exceptions=True)
+    finally:
+        await transport.close()
+
+    for env, outcome in zip(selected_envs, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"Error running sequence for {env['name']}: {outcome}")
+    await asyncio.gather(*ingest_tasks)
+
+
+def _new_event_loop():
+    try:
+        import uvloop
+        return uvloop.new_event_loop()
+    except ImportError:
+        return asyncio.new_event_loop()
+
+
+def execute_comparison_run_async(selected_api_ids, selected_env_ids, environments, api_templates, progress_callback=None, transport=None, scheduler="dag", sync_transport=None, on_variables_changed=None, blob_dir=None):
+    """
+    asyncio-based alternative to logic.execute_comparison_run.
+    All environments run concurrently on one event loop (uvloop when installed);
+    the returned run_summary has exactly the same shape as the threaded engine.
+    """
+    selected_envs, selected_api_templates, api_results = prepare_run(selected_api_ids, selected_env_ids, environments, api_templates)
+
+    run_id = str(uuid.uuid4())
+    run_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    transport = get_async_transport(transport, sync_transport)
+    pipeline = ComparisonPipeline(selected_api_templates, selected_envs, api_results)
+    variable_stores = {env['id']: VariableStore(env) for env in selected_envs}
+    loop = _new_event_loop()
+    try:
+        loop.run_until_complete(
+            _run_comparison(selected_envs, selected_api_templates, transport, progress_callback, pipeline, variable_stores, scheduler, run_blob_dir(blob_dir, run_id))
+        )
+        flush_variable_stores(variable_stores, selected_envs, on_variables_changed)
+        pipeline.finish()
+    except BaseException:
+        # The run is never returned, so nothing will store its spilled bodies
+        discard_run_bodies(blob_dir, run_id)
+        raise
+    finally:
+        loop.close()
+
+    return build_run_summary(run_id, run_timestamp, selected_envs, selected_api_templates, api_results)
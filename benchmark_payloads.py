@@ -0,0 +1,95 @@
+"""
+Disk size and load time of the run history: plain history.json vs. history.db per payload codec.
+
+    python benchmark_payloads.py [path/to/history.json] [--repeat N]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+from history_store import HistoryStore
+from payload_codec import PayloadCodec, CODECS, zstandard
+
+
+def db_size(db_path):
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def bench_json(path, repeat):
+    def load():
+        with open(path, "r", encoding="utf-8") as f:
+            json.load(f)
+    return {"format": "history.json", "size_kb": os.path.getsize(path) / 1024, "list_ms": best_of(repeat, load), "open_api_ms": None, "full_ms": None}
+
+
+def bench_codec(path, codec_name, repeat, workdir):
+    db_path = os.path.join(workdir, f"history_{codec_name}.db")
+    legacy = os.path.join(workdir, f"history_{codec_name}.json")
+    shutil.copyfile(path, legacy)
+    store = HistoryStore(db_path, legacy, codec=PayloadCodec(codec_name))
+    store._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    runs = store.list_runs()
+    first_api = next((r['run_id'], api_id) for r in runs for api_id in r.get('api_results', {}))
+
+    def open_api():
+        run_id, api_id = first_api
+        run = next(r for r in store.list_runs() if r['run_id'] == run_id)
+        store.load_payloads(run['api_results'][api_id])
+
+    def full():
+        for run in store.list_runs():
+            for api_result in run.get('api_results', {}).values():
+                store.load_payloads(api_result)
+
+    result = {
+        "format": f"history.db ({codec_name})",
+        "size_kb": db_size(db_path) / 1024,
+        "list_ms": best_of(repeat, store.list_runs),
+        "open_api_ms": best_of(repeat, open_api),
+        "full_ms": best_of(repeat, full),
+    }
+    store.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("history", nargs="?", default="comparison_history.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if not os.path.exists(args.history):
+        sys.exit(f"History file not found: {args.history}")
+
+    workdir = tempfile.mkdtemp(prefix="apicomp_bench_")
+    try:
+        results = [bench_json(args.history, args.repeat)]
+        for codec_name in CODECS:
+            if codec_name == "zstd" and zstandard is None:
+                print("zstd skipped (pip install zstandard)")
+                continue
+            results.append(bench_codec(args.history, codec_name, args.repeat, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    fmt = lambda v: "-" if v is None else f"{v:.1f}"
+    print(f"{'format':<22}{'size KB':>10}{'list ms':>10}{'1 API ms':>10}{'all ms':>10}")
+    for r in results:
+        print(f"{r['format']:<22}{fmt(r['size_kb']):>10}{fmt(r['list_ms']):>10}{fmt(r['open_api_ms']):>10}{fmt(r['full_ms']):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+JSON backend timings on a real history file: stdlib json vs. the serialization layer (orjson when installed).
+
+    python benchmark_serialization.py [path/to/history.json] [--repeat N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import serialization
+from serialization import dumps_bytes, loads, json_default
+
+
+def legacy_make_serializable(obj):
+    """The recursive copy DeepDiff results used to go through before being saved."""
+    if isinstance(obj, (set, list, tuple)):
+        return [legacy_make_serializable(x) for x in obj]
+    if isinstance(obj, dict):
+        return {k: legacy_make_serializable(v) for k, v in obj.items()}
+    if type(obj).__name__ == 'SetOrdered':
+        return list(obj)
+    return obj
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def with_sets(runs):
+    """History diffs were stored as lists; turn them back into sets like a fresh DeepDiff result."""
+    def convert(obj, key=None):
+        if isinstance(obj, dict):
+            return {k: convert(v, k) for k, v in obj.items()}
+        if isinstance(obj, list):
+            items = [convert(v) for v in obj]
+            if key and key.endswith(("_added", "_removed")) and all(isinstance(v, str) for v in items):
+                return set(items)
+            return items
+        return obj
+    return convert(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("history", nargs="?", default="comparison_history.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if not os.path.exists(args.history):
+        sys.exit(f"History file not found: {args.history}")
+
+    with open(args.history, "rb") as f:
+        raw = f.read()
+    runs = json.loads(raw)
+    diff_runs = with_sets(runs)
+
+    rows = [
+        ("load: json.loads", best_of(args.repeat, lambda: json.loads(raw))),
+        (f"load: serialization.loads ({serialization.JSON_BACKEND})", best_of(args.repeat, lambda: loads(raw))),
+        ("save: json.dumps indent=2", best_of(args.repeat, lambda: json.dumps(runs, indent=2, ensure_ascii=False))),
+        (f"save: dumps_bytes pretty ({serialization.JSON_BACKEND})", best_of(args.repeat, lambda: dumps_bytes(runs, pretty=True))),
+        (f"save: dumps_bytes compact ({serialization.JSON_BACKEND})", best_of(args.repeat, lambda: dumps_bytes(runs))),
+        ("diffs: make_serializable + json.dumps", best_of(args.repeat, lambda: json.dumps(legacy_make_serializable(diff_runs), ensure_ascii=False, default=str))),
+        (f"diffs: dumps_bytes default hook ({serialization.JSON_BACKEND})", best_of(args.repeat, lambda: dumps_bytes(diff_runs))),
+    ]
+    print(f"{args.history}: {len(raw) / 1024:.1f} KB, {len(runs)} runs; compact output {len(dumps_bytes(runs)) / 1024:.1f} KB")
+    width = max(len(name) for name, _ in rows)
+    for name, ms in rows:
+        print(f"{name:<{width}}  {ms:8.2f} ms")
+    assert loads(dumps_bytes(diff_runs, sort_keys=True)) == json.loads(json.dumps(diff_runs, default=json_default, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
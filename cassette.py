@@ -0,0 +1,143 @@
+import os
+import json
+import base64
+import shutil
+import hashlib
+import threading
+from http_client import HttpResponse, PooledTransport
+from retry_policy import RetryingTransport
+from serialization import dumps_bytes, loads
+
+TRANSPORT_MODES = ["live", "record", "replay"]
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when no recording exists for a request."""
+
+
+def request_key(env, request_info):
+    """
+    Stable key for a rendered request: environment + method + URL + params + body.
+    Headers are left out on purpose: they carry per-run tokens that would defeat replay.
+    """
+    material = json.dumps({
+        "env": env.get('id'),
+        "method": (request_info.get('method') or '').upper(),
+        "url": request_info.get('url'),
+        "params": request_info.get('params'),
+        "body": request_info.get('body'),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class CassetteStore:
+    """
+    Per-project on-disk store of raw responses (status, headers, body), one file per request:
+    <directory>/<env_id>/<request_key>.json
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, env, key):
+        return os.path.join(self.directory, str(env.get('id')), f"{key}.json")
+
+    def save(self, env, request_info, response):
+        key = request_key(env, request_info)
+        path = self._path(env, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if response.spilled:
+            # Oversized bodies are copied next to the record instead of being inlined
+            shutil.copyfile(response.body_path, f"{path[:-len('.json')]}.body")
+            body = {"body_file": f"{key}.body", "sha256": response.sha256, "size": response.size}
+        else:
+            try:
+                body = {"text": response.content.decode('utf-8')}
+            except UnicodeDecodeError:
+                body = {"base64": base64.b64encode(response.content).decode('ascii')}
+        record = {
+            "request": {k: request_info.get(k) for k in ("method", "url", "params", "body")},
+            "response": {
+                "status_code": response.status_code,
+                "headers": dict(response.headers),
+                "elapsed_ms": response.elapsed_ms,
+                **body
+            }
+        }
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(dumps_bytes(record))
+        os.replace(tmp_path, path)
+        return key
+
+    def load(self, env, request_info):
+        path = self._path(env, request_key(env, request_info))
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            stored = loads(f.read())['response']
+        if 'body_file' in stored:
+            return HttpResponse(stored['status_code'], stored.get('headers'), None, stored.get('elapsed_ms'),
+                                body_path=os.path.join(os.path.dirname(path), stored['body_file']),
+                                sha256=stored.get('sha256'), size=stored.get('size'))
+        if 'base64' in stored:
+            content = base64.b64decode(stored['base64'])
+        else:
+            content = stored.get('text', '').encode('utf-8')
+        return HttpResponse(stored['status_code'], stored.get('headers'), content, stored.get('elapsed_ms'))
+
+    def count(self):
+        total = 0
+        if os.path.isdir(self.directory):
+            for _, _, files in os.walk(self.directory):
+                total += sum(1 for f in files if f.endswith('.json'))
+        return total
+
+
+class RecordingTransport:
+    """Sends live (never from the response cache) and persists every raw response into the cassette store."""
+    def __init__(self, store, inner=None):
+        self.store = store
+        self.inner = inner or RetryingTransport(PooledTransport())
+
+    @property
+    def session_pool(self):
+        return getattr(self.inner, 'session_pool', None)
+
+    def send(self, env, api_template, request_info, limiter=None):
+        response = self.inner.send(env, api_template, request_info, limiter=limiter)
+        self.store.save(env, request_info, response)
+        request_info['cassette'] = "recorded"
+        return response
+
+
+class ReplayTransport:
+    """Serves responses from the cassette store only; never touches the network."""
+    session_pool = None
+
+    def __init__(self, store):
+        self.store = store
+
+    def send(self, env, api_template, request_info, limiter=None):
+        response = self.store.load(env, request_info)
+        if response is None:
+            raise CassetteMiss(f"No recorded response for {request_info.get('method')} {request_info.get('url')}")
+        request_info['cassette'] = "replayed"
+        return response
+
+
+def build_transport(mode="live", cassette_dir=None):
+    """
+    Sync transport for a run mode: record (live + persist) or replay (store only).
+    Live mode returns None so each engine uses its own default (pooled sessions, or the chosen async transport).
+    """
+    if mode == "live" or not mode:
+        return None
+    if not cassette_dir:
+        raise ValueError(f"Transport mode '{mode}' needs a cassette directory")
+    store = CassetteStore(cassette_dir)
+    if mode == "record":
+        return RecordingTransport(store)
+    if mode == "replay":
+        return ReplayTransport(store)
+    raise ValueError(f"Unknown transport mode: {mode}")
@@ -0,0 +1,194 @@
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from template_compiler import TEMPLATE_VAR_PATTERN, get_compiled_template
+
+# Max APIs of one environment's chain that may be in flight at the same time
+DEFAULT_ENV_PARALLELISM = 8
+
+# Environment variables every request renders implicitly (see logic.build_request_info)
+IMPLICIT_ENV_KEYS = ('auth_token', 'headers')
+
+
+def find_template_vars(obj, found=None):
+    """Collect every {{var}} name referenced anywhere in a string/dict/list (JSON strings included)."""
+    if found is None:
+        found = set()
+    if isinstance(obj, str):
+        for match in TEMPLATE_VAR_PATTERN.finditer(obj):
+            found.add(match.group(1).strip())
+    elif isinstance(obj, list):
+        for item in obj:
+            find_template_vars(item, found)
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            find_template_vars(k, found)
+            find_template_vars(v, found)
+    return found
+
+
+def get_template_refs(api_tpl):
+    """Variables a template consumes: path, headers, params and json_body (from its compiled render plan)."""
+    return set(get_compiled_template(api_tpl).refs)
+
+
+def get_extract_targets(api_tpl):
+    """Variables a template produces through its Post Action (`extract`) rules."""
+    rules = api_tpl.get('extract')
+    if isinstance(rules, str):
+        try: rules = json.loads(rules)
+        except: rules = []
+    targets = set()
+    if not isinstance(rules, list):
+        return targets
+    for rule in rules:
+        if not isinstance(rule, dict):
+            continue
+        if 'source' in rule and 'target_var' in rule:
+            targets.add(rule['target_var'])
+        else:
+            targets.update(rule.keys())
+    return targets
+
+
+def get_env_implicit_refs(env):
+    """
+    Variables every request in `env` reads regardless of the template:
+    the base URL plus the auth_token/headers variables and whatever they reference.
+    """
+    refs = set(IMPLICIT_ENV_KEYS)
+    find_template_vars(env.get('base_url', ''), refs)
+    variables = env.get('variables', [])
+    if isinstance(variables, list):
+        values = {v.get('key'): v.get('value') for v in variables if isinstance(v, dict)}
+    elif isinstance(variables, dict):
+        values = variables
+    else:
+        values = {}
+    for key in IMPLICIT_ENV_KEYS:
+        find_template_vars(values.get(key), refs)
+    return refs
+
+
+class DependencyGraph:
+    """
+    DAG over one environment's ordered templates.
+    Edges keep the serial chain semantics for every shared variable:
+      - read-after-write:  last earlier producer  -> consumer
+      - write-after-read:  earlier consumer       -> later producer
+      - write-after-write: earlier producer       -> later producer
+    Because edges always point forward in `order`, the graph is acyclic by construction.
+    """
+    def __init__(self, templates, env=None):
+        self.templates = list(templates)
+        implicit = get_env_implicit_refs(env) if env else set()
+        self.refs = [get_template_refs(t) | implicit for t in self.templates]
+        self.targets = [get_extract_targets(t) for t in self.templates]
+        self.deps = [set() for _ in self.templates]
+
+        last_producer = {}  # var -> index
+        readers = {}        # var -> indexes that read it since the last write
+        for i in range(len(self.templates)):
+            for var in self.refs[i]:
+                if var in last_producer:
+                    self.deps[i].add(last_producer[var])
+            for var in self.targets[i]:
+                if var in last_producer:
+                    self.deps[i].add(last_producer[var])
+                self.deps[i].update(j for j in readers.get(var, ()) if j != i)
+            for var in self.refs[i]:
+                readers.setdefault(var, []).append(i)
+            for var in self.targets[i]:
+                last_producer[var] = i
+                readers[var] = []
+
+        self.dependents = [[] for _ in self.templates]
+        for i, deps in enumerate(self.deps):
+            for j in deps:
+                self.dependents[j].append(i)
+
+    def roots(self):
+        return [i for i, deps in enumerate(self.deps) if not deps]
+
+    def levels(self):
+        """Topological levels: every template in a level can run concurrently."""
+        depth = []
+        for i in range(len(self.templates)):
+            depth.append(1 + max((depth[j] for j in self.deps[i]), default=-1))
+        grouped = {}
+        for i, d in enumerate(depth):
+            grouped.setdefault(d, []).append(i)
+        return [grouped[d] for d in sorted(grouped)]
+
+
+def chain_context_for(index, extracted_by_index):
+    """
+    Runtime context seen by template `index`: what a serial run would have accumulated,
+    i.e. the extracted variables of every earlier template, later ones overriding.
+    """
+    context = {}
+    for j in sorted(k for k in extracted_by_index if k < index):
+        context.update(extracted_by_index[j])
+    return context
+
+
+def run_graph(graph, run_node, max_parallel=DEFAULT_ENV_PARALLELISM):
+    """
+    Execute `run_node(index, runtime_context) -> extracted_vars` for every template in the
+    graph on a thread pool, starting each node as soon as all of its dependencies finished.
+    """
+    total = len(graph.templates)
+    if total == 0:
+        return
+    remaining = [len(d) for d in graph.deps]
+    extracted_by_index = {}
+    lock = threading.Lock()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        def submit(i):
+            with lock:
+                context = chain_context_for(i, extracted_by_index)
+            return executor.submit(run_node, i, context)
+
+        running = {submit(i): i for i in graph.roots()}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                try:
+                    new_vars = future.result() or {}
+                except Exception as e:
+                    print(f"Error running {graph.templates[i].get('name')}: {e}")
+                    new_vars = {}
+                with lock:
+                    extracted_by_index[i] = new_vars
+                for k in graph.dependents[i]:
+                    remaining[k] -= 1
+                    if remaining[k] == 0:
+                        running[submit(k)] = k
+
+
+async def run_graph_async(graph, run_node, max_parallel=DEFAULT_ENV_PARALLELISM):
+    """asyncio twin of run_graph: `run_node` is a coroutine function."""
+    total = len(graph.templates)
+    if total == 0:
+        return
+    extracted_by_index = {}
+    finished = [asyncio.Event() for _ in range(total)]
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def run(i):
+        try:
+            for j in graph.deps[i]:
+                await finished[j].wait()
+            async with semaphore:
+                new_vars = await run_node(i, chain_context_for(i, extracted_by_index))
+            extracted_by_index[i] = new_vars or {}
+        except Exception as e:
+            print(f"Error running {graph.templates[i].get('name')}: {e}")
+            extracted_by_index[i] = {}
+        finally:
+            finished[i].set()
+
+    await asyncio.gather(*(run(i) for i in range(total)))
@@ -0,0 +1,100 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from deepdiff import DeepDiff
+from response_body import SpilledBody, resolve_body
+from serialization import dumps_bytes
+
+# --- Settings (overridable through environment variables) ---
+# Worker processes used for large diffs (0 = always diff in-process)
+DIFF_WORKERS = int(os.environ.get("APICOMP_DIFF_WORKERS", os.cpu_count() or 1))
+# Payloads smaller than this (canonical JSON bytes) are diffed in-process: pickling would cost more than it saves
+INLINE_DIFF_THRESHOLD_BYTES = int(os.environ.get("APICOMP_DIFF_INLINE_BYTES", 256 * 1024))
+
+
+def run_deepdiff(clean_ref, clean_target, diff_options):
+    """
+    DeepDiff wrapper that can run in a worker process.
+    Returns DeepDiff's result dict (its sets are serialized by serialization.json_default), or None when both sides are equal.
+    """
+    # Spilled bodies are only read here, i.e. in the worker process for large payloads
+    clean_ref, clean_target = resolve_body(clean_ref), resolve_body(clean_target)
+    ddiff = DeepDiff(clean_ref, clean_target, **diff_options)
+    if not ddiff:
+        return None
+    return ddiff.to_dict()
+
+
+def estimate_payload_size(data, fingerprint=None):
+    if fingerprint:
+        return fingerprint['size']
+    if isinstance(data, SpilledBody):
+        return data.size
+    try:
+        return len(dumps_bytes(data))
+    except (TypeError, ValueError):
+        return 0
+
+
+class DiffExecutor:
+    """
+    Dispatches DeepDiff comparisons: small payloads inline, large ones to a process pool
+    so a run with many multi-MB responses uses every core instead of one GIL-bound thread.
+    """
+    def __init__(self, max_workers=DIFF_WORKERS, inline_threshold=INLINE_DIFF_THRESHOLD_BYTES):
+        self.max_workers = max_workers
+        self.inline_threshold = inline_threshold
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # spawn, not fork: forking the threaded Streamlit server can copy held locks into the workers
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+        return self._pool
+
+    @staticmethod
+    def _inline(clean_ref, clean_target, diff_options, compare=run_deepdiff):
+        future = Future()
+        try:
+            future.set_result(compare(clean_ref, clean_target, diff_options))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit(self, clean_ref, clean_target, diff_options, payload_size=0, compare=run_deepdiff):
+        """Returns a Future resolving to compare's result (run_deepdiff by default; must be a module-level function)."""
+        if self.max_workers <= 0 or payload_size < self.inline_threshold:
+            return self._inline(clean_ref, clean_target, diff_options, compare)
+        try:
+            return self._get_pool().submit(compare, clean_ref, clean_target, diff_options)
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            print(f"Diff process pool unavailable, diffing in-process: {e}")
+            self.shutdown()
+            return self._inline(clean_ref, clean_target, diff_options, compare)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+_diff_executor = None
+_diff_executor_lock = threading.Lock()
+
+
+def get_diff_executor():
+    """Process-wide executor so worker processes are started once, not per run."""
+    global _diff_executor
+    if _diff_executor is None:
+        with _diff_executor_lock:
+            if _diff_executor is None:
+                _diff_executor = DiffExecutor()
+    return _diff_executor
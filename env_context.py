@@ -0,0 +1,121 @@
+import json
+from collections import ChainMap
+from types import MappingProxyType
+from template_compiler import compile_string, compile_obj
+
+# Variables that shape every request of an environment (see build_request_info)
+AUTH_TOKEN_KEY = 'auth_token'
+HEADERS_KEY = 'headers'
+
+
+def flatten_env_variables(env):
+    """
+    env['variables'] as a plain dict with trimmed keys/values.
+    V2 Update: variables can be a dict OR a list of {key, value, description}
+    """
+    env_vars_raw = env.get('variables', {})
+    if isinstance(env_vars_raw, str):
+        try: env_vars_raw = json.loads(env_vars_raw)
+        except: env_vars_raw = {}
+
+    env_vars = {}
+    if isinstance(env_vars_raw, list):
+        # Flatten list to dict and TRIM keys/values
+        for item in env_vars_raw:
+            if isinstance(item, dict) and 'key' in item:
+                k = item['key'].strip() if isinstance(item['key'], str) else item['key']
+                v = item.get('value', '')
+                v = v.strip() if isinstance(v, str) else v
+                env_vars[k] = v
+    elif isinstance(env_vars_raw, dict):
+        env_vars = {k.strip() if isinstance(k, str) else k: (v.strip() if isinstance(v, str) else v) for k, v in env_vars_raw.items()}
+    return env_vars
+
+
+def _parse_headers(env_headers):
+    if isinstance(env_headers, str):
+        try: env_headers = json.loads(env_headers)
+        except: env_headers = {}
+    return env_headers
+
+
+def _normalize_headers(headers):
+    if not isinstance(headers, dict):
+        return {}
+    return {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in headers.items()}
+
+
+class _Resolved:
+    """One pre-rendered part: its plan, the value rendered from env variables, and the keys it used."""
+    __slots__ = ('plan', 'value', 'used')
+
+    def __init__(self, plan, context):
+        used = set()
+        self.plan = plan
+        self.value = plan.render(context, used)
+        self.used = frozenset(used)
+
+
+class EnvContext:
+    """
+    Immutable per-run view of one environment: variables, rendered base URL, Authorization
+    and default headers are resolved once. Per call, only the runtime chain variables are
+    overlaid; a pre-rendered part is re-rendered only when the chain overrides a variable it references.
+    """
+    def __init__(self, env):
+        self.env_id = env.get('id')
+        self.variables = MappingProxyType(flatten_env_variables(env))
+
+        base_url = env.get('base_url', '')
+        # A broken base URL is reported per request, as "URL Construction Failed"
+        self.base_url_error = None
+        self._base_url = None
+        try:
+            self._base_url = _Resolved(compile_string(base_url.rstrip('/') + '/'), self.variables)
+        except Exception as e:
+            self.base_url_error = e
+
+        self._auth = self._resolve_auth(self.variables)
+        self._headers = self._resolve_headers(self.variables)
+
+    @staticmethod
+    def _resolve_auth(context):
+        return _Resolved(compile_obj(context.get(AUTH_TOKEN_KEY, '')), context)
+
+    @staticmethod
+    def _resolve_headers(context):
+        return _Resolved(compile_obj(_parse_headers(context.get(HEADERS_KEY, {}))), context)
+
+    def full_context(self, runtime_context):
+        """Runtime chain variables override environment variables (no copy of the env variables)."""
+        return ChainMap(runtime_context or {}, self.variables)
+
+    @staticmethod
+    def _pick(resolved, runtime_context, context, used_keys):
+        if runtime_context and not resolved.plan.refs.isdisjoint(runtime_context):
+            return resolved.plan.render(context, used_keys)
+        used_keys.update(resolved.used)
+        return resolved.value
+
+    def base_url(self, runtime_context, context, used_keys):
+        if self.base_url_error is not None:
+            raise self.base_url_error
+        return self._pick(self._base_url, runtime_context, context, used_keys)
+
+    def default_headers(self, runtime_context, context, used_keys):
+        """Authorization + Content-Type + environment headers, in that order."""
+        auth = self._auth
+        if runtime_context and AUTH_TOKEN_KEY in runtime_context:
+            auth = self._resolve_auth(context)
+        auth_token = self._pick(auth, runtime_context, context, used_keys)
+
+        env_headers = self._headers
+        if runtime_context and HEADERS_KEY in runtime_context:
+            env_headers = self._resolve_headers(context)
+        env_headers = self._pick(env_headers, runtime_context, context, used_keys)
+
+        return {
+            'Authorization': auth_token.strip() if isinstance(auth_token, str) else auth_token,
+            'Content-Type': 'application/json',
+            **_normalize_headers(env_headers)
+        }
@@ -0,0 +1,105 @@
+import re
+import json
+import hashlib
+
+# Matches one step of a DeepDiff path: ['key'], ["key"] or [0]
+_PATH_STEP = re.compile(r"""\[(?:'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)"|(-?\d+))\]""")
+
+
+def parse_ignore_path(path):
+    """
+    Convert a DeepDiff exclude path like "root['data'][0]['id']" into a tuple ('data', 0, 'id').
+    Returns None when the path can't be interpreted exactly (it is then left to DeepDiff).
+    """
+    if not isinstance(path, str):
+        return None
+    rest = path.strip()
+    if rest.startswith('root'):
+        rest = rest[4:]
+    steps = []
+    pos = 0
+    for match in _PATH_STEP.finditer(rest):
+        if match.start() != pos:
+            return None
+        key_sq, key_dq, index = match.groups()
+        if index is not None:
+            steps.append(int(index))
+        else:
+            steps.append(key_sq if key_sq is not None else key_dq)
+        pos = match.end()
+    if pos != len(rest):
+        return None
+    return tuple(steps)
+
+
+def _strip_paths(obj, paths):
+    """Return a copy of obj without the given (already parsed) paths."""
+    if not paths:
+        return obj
+    here = {p[0] for p in paths if len(p) == 1}
+    deeper = {}
+    for p in paths:
+        if len(p) > 1:
+            deeper.setdefault(p[0], []).append(p[1:])
+    if isinstance(obj, dict):
+        return {k: _strip_paths(v, deeper.get(k)) for k, v in obj.items() if k not in here}
+    if isinstance(obj, list):
+        return [_strip_paths(v, deeper.get(i)) for i, v in enumerate(obj) if i not in here]
+    return obj
+
+
+def _canonical(obj, ignore_order):
+    """Sorted-keys canonical form; with ignore_order, list items are sorted by their own canonical text."""
+    if isinstance(obj, dict):
+        return {k: _canonical(v, ignore_order) for k, v in obj.items()}
+    if isinstance(obj, list):
+        items = [_canonical(v, ignore_order) for v in obj]
+        if ignore_order:
+            items.sort(key=lambda x: json.dumps(x, sort_keys=True, ensure_ascii=False, separators=(',', ':')))
+        return items
+    return obj
+
+
+def canonical_bytes(data, ignore_order=False, ignore_paths=None):
+    """Canonical serialization of a response body (debug/status `_` keys removed)."""
+    if isinstance(data, dict):
+        data = {k: v for k, v in data.items() if not (isinstance(k, str) and k.startswith('_'))}
+    parsed = [parse_ignore_path(p) for p in (ignore_paths or [])]
+    data = _strip_paths(data, [p for p in parsed if p])
+    if ignore_order:
+        data = _canonical(data, True)
+    return json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def compute_fingerprint(data, ignore_order=False, ignore_paths=None):
+    """
+    Fast hash of a response under the template's comparison options.
+    Equal fingerprints mean DeepDiff would report no difference, so the diff can be skipped.
+    Returns {"hash", "size"} or None if the body can't be fingerprinted safely.
+    """
+    parsed = [parse_ignore_path(p) for p in (ignore_paths or [])]
+    if any(p is None for p in parsed):
+        # Wildcard/regex exclude paths: only DeepDiff knows how to apply them
+        return None
+    if ignore_order and any(isinstance(step, int) for p in parsed for step in p):
+        # Index-based excludes don't survive reordering
+        return None
+    try:
+        payload = canonical_bytes(data, ignore_order, ignore_paths)
+    except (TypeError, ValueError):
+        return None
+    return {
+        "hash": hashlib.blake2b(payload, digest_size=16).hexdigest(),
+        "size": len(payload)
+    }
+
+
+def fingerprint_for_template(data, api_tpl):
+    ignore_order, ignore_paths = api_tpl.get('ignore_order', False), api_tpl.get('ignore_paths', [])
+    spilled = data.get('_body_ref') if isinstance(data, dict) else None
+    if spilled:
+        # Spilled bodies stay on disk: identical raw bytes are equal, anything else goes to DeepDiff
+        if ignore_order or ignore_paths or not spilled.get('sha256'):
+            return None
+        return {"hash": f"sha256:{spilled['sha256']}", "size": spilled.get('size') or 0}
+    return compute_fingerprint(data, ignore_order, ignore_paths)
@@ -0,0 +1,428 @@
+import os
+import json
+import hashlib
+import sqlite3
+import datetime
+import threading
+from collections import OrderedDict
+from payload_codec import get_default_codec
+from serialization import dumps, loads
+from response_body import get_body_ref, adopt_spilled_bodies, remove_shared_bodies, find_shared_body, is_shared_body, shared_body_hash
+
+# Suffix given to a legacy history.json once its runs live in the database
+MIGRATED_SUFFIX = ".migrated"
+
+# Bumped when stored runs need rewriting on open
+# (2: response payloads moved to the blobs table, 3: run records and blobs compressed, 4: summary column)
+SCHEMA_VERSION = 4
+
+# Full runs (opened with View/Rerun) kept in memory per store
+DETAIL_CACHE_RUNS = int(os.environ.get("APICOMP_HISTORY_CACHE_RUNS", 8))
+
+# Run fields the Dashboard lists; the rest of a run is only read when it is opened
+SUMMARY_KEYS = ["run_id", "timestamp", "envs", "api_count", "consistent_count", "inconsistent_count", "error_count"]
+
+# Placeholder left in a run record for a payload kept in the blobs table
+BLOB_KEY = '$blob'
+DEBUG_BLOB_KEY = '$debug_blob'
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS runs (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL UNIQUE,
+        timestamp TEXT,
+        comment TEXT NOT NULL DEFAULT '',
+        summary TEXT,
+        data TEXT NOT NULL
+    )""",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data TEXT NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS run_blobs (
+        run_id TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        PRIMARY KEY (run_id, hash)
+    )""",
+    "CREATE INDEX IF NOT EXISTS run_blobs_hash ON run_blobs (hash)",
+    "CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp)",
+]
+
+# Dashboard status filter -> condition on a run's summary
+RUN_STATUS_FILTERS = {
+    "Same": "json_extract(summary, '$.inconsistent_count') = 0 AND json_extract(summary, '$.error_count') = 0",
+    "Different": "json_extract(summary, '$.inconsistent_count') > 0",
+    "Error": "json_extract(summary, '$.error_count') > 0",
+}
+
+
+def run_summary(run):
+    """Lightweight index entry of a run: counts plus the APIs it covered (id, name, path)."""
+    summary = {k: run.get(k) for k in SUMMARY_KEYS}
+    summary['apis'] = [
+        {"id": api_id, "name": r.get('name'), "relative_path": r.get('relative_path')}
+        for api_id, r in (run.get('api_results') or {}).items()
+    ]
+    return summary
+
+
+# --- Blobs ---
+
+def canonical_json(value):
+    # Hash material: always the stdlib encoder, so blob keys don't depend on the installed backend
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def blob_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pack_run(run, blobs):
+    """
+    Copy of `run` whose per-environment payloads are replaced by content hashes.
+    The response body and its `_debug_request` become separate blobs (the body is often identical
+    across environments, the request across runs); `blobs` collects {hash: json text}.
+    """
+    def put(value):
+        # Keyed by the canonical form, stored in the original key order for display
+        key = blob_hash(canonical_json(value))
+        if key not in blobs:
+            blobs[key] = dumps(value)
+        return key
+
+    packed_results = {}
+    for api_id, api_result in (run.get('api_results') or {}).items():
+        data_by_env = {}
+        for env_id, entry in (api_result.get('data_by_env') or {}).items():
+            data = entry.get('data')
+            if isinstance(data, dict):
+                body = {k: v for k, v in data.items() if k != '_debug_request'}
+                ref = {BLOB_KEY: put(body)}
+                if '_debug_request' in data:
+                    ref[DEBUG_BLOB_KEY] = put(data['_debug_request'])
+                entry = {**entry, 'data': ref}
+            data_by_env[env_id] = entry
+        packed_results[api_id] = {**api_result, 'data_by_env': data_by_env}
+    return {**run, 'api_results': packed_results}
+
+
+def spilled_body_refs(run):
+    """References of a run's spilled (oversized) response bodies, see response_body."""
+    for api_result in (run.get('api_results') or {}).values():
+        for entry in (api_result.get('data_by_env') or {}).values():
+            ref = get_body_ref(entry.get('data'))
+            if ref:
+                yield ref
+
+
+def is_packed_entry(entry):
+    data = entry.get('data') if isinstance(entry, dict) else None
+    return isinstance(data, dict) and BLOB_KEY in data
+
+
+def has_packed_payloads(api_result):
+    return any(is_packed_entry(entry) for entry in (api_result.get('data_by_env') or {}).values())
+
+
+def unpack_api_result(api_result, load_blob):
+    """Put one API's payloads back in place of their hashes; `load_blob(hash)` returns the value (None if missing)."""
+    for entry in (api_result.get('data_by_env') or {}).values():
+        if not is_packed_entry(entry):
+            continue  # stored before blobs existed, or already loaded
+        ref = entry['data']
+        data = load_blob(ref[BLOB_KEY])
+        if not isinstance(data, dict):
+            data = {"error": "Stored response is missing", "status": "failed"}
+        if DEBUG_BLOB_KEY in ref:
+            data['_debug_request'] = load_blob(ref[DEBUG_BLOB_KEY])
+        entry['data'] = data
+    return api_result
+
+
+def unpack_run(run, load_blob):
+    """Inverse of pack_run."""
+    for api_result in (run.get('api_results') or {}).values():
+        unpack_api_result(api_result, load_blob)
+    return run
+
+
+class HistoryStore:
+    """
+    Run history in SQLite: one row per run, so adding a run, editing its comment or deleting it
+    touches that row only (history.json used to be rewritten in full for each of these).
+    Response payloads are content-addressed: each distinct body is stored once in `blobs`,
+    however many environments and runs returned it, and run records hold its hash.
+    Spilled (oversized) bodies are content-addressed the same way, as files in `body_dir` compressed
+    with `codec` (see response_body.adopt_spilled_bodies); `run_blobs` counts the runs using each.
+    Run records and blobs are compressed with `codec` (see payload_codec).
+    Listing reads only the summary column, one filtered page at a time (query_summaries);
+    a full run is read by open_run (View/Rerun) and kept
+    in a small LRU, and its payloads are decompressed per API by load_payloads when shown.
+    Runs are returned newest first, like the old list.
+    """
+    def __init__(self, db_path, legacy_json_path=None, codec=None, body_dir=None):
+        self.db_path = db_path
+        self.codec = codec or get_default_codec()
+        # Shared spilled bodies; the project's blob_dir, next to the database
+        self.body_dir = body_dir or os.path.join(os.path.dirname(db_path), "blobs")
+        self._lock = threading.RLock()
+        self._details = OrderedDict()  # run_id -> opened run, most recent last
+        self._env_names = None  # env_names() result, until the next write
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+        self._upgrade()
+        if legacy_json_path:
+            self.migrate_json(legacy_json_path)
+
+    # --- Migration ---
+
+    def _upgrade(self):
+        """Rewrite runs stored by an older schema into the current format."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+            version = int(row[0]) if row else 1
+            if version >= SCHEMA_VERSION:
+                return
+            columns = [c[1] for c in self._conn.execute("PRAGMA table_info(runs)")]
+            if 'summary' not in columns:
+                self._conn.execute("ALTER TABLE runs ADD COLUMN summary TEXT")
+            if version < 2:
+                # Inline payloads -> blobs
+                rows = self._conn.execute("SELECT comment, data FROM runs ORDER BY seq").fetchall()
+                for comment, data in rows:
+                    run = self._row_to_run((comment, data), payloads=True)
+                    self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run['run_id'],))
+                    self._insert(run)
+            if version < 3:
+                # Plain JSON text -> compressed
+                for table, key in (("runs", "run_id"), ("blobs", "hash")):
+                    rows = self._conn.execute(f"SELECT {key}, data FROM {table} WHERE typeof(data) = 'text'").fetchall()
+                    self._conn.executemany(
+                        f"UPDATE {table} SET data = ? WHERE {key} = ?",
+                        [(self.codec.encode(data), k) for k, data in rows]
+                    )
+            if version < 4:
+                rows = self._conn.execute("SELECT comment, data FROM runs WHERE summary IS NULL").fetchall()
+                self._conn.executemany(
+                    "UPDATE runs SET summary = ? WHERE run_id = ?",
+                    [(dumps(run_summary(run)), run['run_id']) for run in (self._row_to_run(row) for row in rows)]
+                )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+    def migrate_json(self, json_path):
+        """One-time import of a legacy history.json (newest first); the file is kept as <name>.migrated."""
+        if not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path, "rb") as f:
+                runs = loads(f.read())
+        except (ValueError, OSError) as e:
+            print(f"History migration skipped, cannot read {json_path}: {e}")
+            return 0
+        if not isinstance(runs, list):
+            return 0
+        with self._lock, self._conn:
+            # Oldest first, so newer runs get higher sequence numbers
+            for run in reversed(runs):
+                if isinstance(run, dict) and run.get('run_id'):
+                    self._insert(run, replace=False)
+        os.replace(json_path, json_path + MIGRATED_SUFFIX)
+        print(f"Migrated {len(runs)} runs from {json_path} to {self.db_path}")
+        return len(runs)
+
+    # --- Runs ---
+
+    def _insert(self, run, replace=True):
+        run_id = run['run_id']
+        if not replace and self._conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone():
+            return
+        blobs = {}
+        record = pack_run({k: v for k, v in run.items() if k != 'comment'}, blobs)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO runs (run_id, timestamp, comment, summary, data) VALUES (?, ?, ?, ?, ?)",
+            (
+                run_id, run.get('timestamp'), run.get('comment') or "",
+                dumps(run_summary(run)),
+                self.codec.encode(dumps(record))
+            )
+        )
+        # Only compress blobs this store hasn't seen yet
+        new_blobs = [(h, text) for h, text in blobs.items() if not self._conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (h,)).fetchone()]
+        self._conn.executemany("INSERT INTO blobs (hash, data) VALUES (?, ?)", [(h, self.codec.encode(text)) for h, text in new_blobs])
+        # Shared body files count as references too (bodies still in a run directory are the run's own)
+        bodies = {ref['sha256'] for ref in spilled_body_refs(run) if is_shared_body(ref, self.body_dir)}
+        self._conn.execute("DELETE FROM run_blobs WHERE run_id = ?", (run_id,))
+        self._conn.executemany("INSERT INTO run_blobs (run_id, hash) VALUES (?, ?)", [(run_id, h) for h in set(blobs) | bodies])
+
+    def _load_blob(self, key):
+        row = self._conn.execute("SELECT data FROM blobs WHERE hash = ?", (key,)).fetchone()
+        return loads(self.codec.decode(row[0])) if row else None
+
+    def _row_to_run(self, row, payloads=False):
+        run = loads(self.codec.decode(row[1]))
+        if payloads:
+            unpack_run(run, self._load_blob)
+        run['comment'] = row[0]
+        return run
+
+    def _collect_garbage(self, hashes=()):
+        """Drop blobs no run references any more; returns the shared body files among `hashes` that became unused."""
+        self._conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM run_blobs)")
+        return [
+            h for h in hashes
+            if find_shared_body(self.body_dir, h)
+            and not self._conn.execute("SELECT 1 FROM run_blobs WHERE hash = ? LIMIT 1", (h,)).fetchone()
+        ]
+
+    def _remember(self, run):
+        self._details[run['run_id']] = run
+        self._details.move_to_end(run['run_id'])
+        while len(self._details) > DETAIL_CACHE_RUNS:
+            self._details.popitem(last=False)
+
+    def add_run(self, run):
+        """Store a finished run; returns its summary (as query_summaries yields it)."""
+        with self._lock, self._conn:
+            adopt_spilled_bodies(spilled_body_refs(run), self.body_dir, self.codec)
+            self._insert(run)
+            self._remember(run)
+            self._env_names = None
+        summary = run_summary(run)
+        summary['comment'] = run.get('comment') or ""
+        return summary
+
+    def query_summaries(self, date_from=None, date_to=None, envs=None, status=None, offset=0, limit=None):
+        """
+        One page of run summaries, newest first, plus the number of runs matching the filters.
+        date_from/date_to: datetime.date bounds (inclusive); envs: runs that include every one of
+        these environment names; status: a RUN_STATUS_FILTERS key ("All"/None = no filter).
+        Only the returned page is parsed; no run record is decompressed.
+        """
+        conditions, params = [], []
+        if date_from:
+            conditions.append("timestamp >= ?")
+            params.append(date_from.isoformat())
+        if date_to:
+            conditions.append("timestamp < ?")
+            params.append((date_to + datetime.timedelta(days=1)).isoformat())
+        for env_name in envs or []:
+            conditions.append("EXISTS (SELECT 1 FROM json_each(summary, '$.envs') WHERE value = ?)")
+            params.append(env_name)
+        if status in RUN_STATUS_FILTERS:
+            conditions.append(RUN_STATUS_FILTERS[status])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM runs {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT comment, summary FROM runs {where} ORDER BY seq DESC LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset]
+            ).fetchall()
+        summaries = []
+        for comment, summary in rows:
+            summary = loads(summary)
+            summary['comment'] = comment
+            summaries.append(summary)
+        return summaries, total
+
+    def env_names(self):
+        """Sorted environment names used by any run (filter options)."""
+        with self._lock:
+            if self._env_names is None:
+                rows = self._conn.execute("SELECT DISTINCT value FROM runs, json_each(runs.summary, '$.envs')").fetchall()
+                self._env_names = sorted(r[0] for r in rows if r[0] is not None)
+            return self._env_names
+
+    def open_run(self, run_id):
+        """Full run (payloads still packed, see load_payloads), served from the LRU when recently opened."""
+        with self._lock:
+            run = self._details.get(run_id)
+            if run is None:
+                run = self.get_run(run_id, payloads=False)
+                if run is None:
+                    return None
+            self._remember(run)
+            return run
+
+    def list_runs(self):
+        """Every full run, newest first; response payloads stay packed until load_payloads."""
+        with self._lock:
+            rows = self._conn.execute("SELECT comment, data FROM runs ORDER BY seq DESC").fetchall()
+        return [self._row_to_run(row) for row in rows]
+
+    def get_run(self, run_id, payloads=True):
+        with self._lock:
+            row = self._conn.execute("SELECT comment, data FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            return self._row_to_run(row, payloads) if row else None
+
+    def load_payloads(self, api_result):
+        """Decompress one API's responses into `api_result` (in place, no-op once loaded)."""
+        if has_packed_payloads(api_result):
+            with self._lock:
+                unpack_api_result(api_result, self._load_blob)
+        return api_result
+
+    def spill_entries(self):
+        """Names in body_dir owned by stored runs: shared bodies, and run directories from before bodies were shared."""
+        with self._lock:
+            names = {row[0] for row in self._conn.execute("SELECT run_id FROM runs")}
+            if os.path.isdir(self.body_dir):
+                names.update(
+                    name for name in os.listdir(self.body_dir)
+                    if shared_body_hash(name) and self._conn.execute(
+                        "SELECT 1 FROM run_blobs WHERE hash = ? LIMIT 1", (shared_body_hash(name),)
+                    ).fetchone()
+                )
+            return names
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def update_comment(self, run_id, comment):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET comment = ? WHERE run_id = ?", (comment or "", run_id))
+            if run_id in self._details:
+                self._details[run_id]['comment'] = comment or ""
+
+    def delete_run(self, run_id):
+        with self._lock:
+            with self._conn:
+                hashes = [row[0] for row in self._conn.execute("SELECT hash FROM run_blobs WHERE run_id = ?", (run_id,))]
+                self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+                self._conn.execute("DELETE FROM run_blobs WHERE run_id = ?", (run_id,))
+                unused_bodies = self._collect_garbage(hashes)
+            # Files go once the deletion is committed
+            remove_shared_bodies(self.body_dir, unused_bodies)
+            self._details.pop(run_id, None)
+            self._env_names = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_history_stores = {}
+_history_stores_lock = threading.Lock()
+
+
+def get_history_store(db_path, legacy_json_path=None, body_dir=None):
+    """Process-wide store per database file (opened, and migrated, once)."""
+    key = os.path.abspath(db_path)
+    store = _history_stores.get(key)
+    if store is None:
+        with _history_stores_lock:
+            store = _history_stores.get(key)
+            if store is None:
+                store = HistoryStore(db_path, legacy_json_path, body_dir=body_dir)
+                _history_stores[key] = store
+    return store
+
+
+def close_history_store(db_path):
+    with _history_stores_lock:
+        store = _history_stores.pop(os.path.abspath(db_path), None)
+    if store:
+        store.close()
@@ -0,0 +1,324 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util.connection import is_connection_dropped
+
+# --- Defaults (overridable per environment record) ---
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_KEEP_ALIVE = True
+DEFAULT_WARM_UP = True
+# Bodies larger than this are spilled to disk instead of being held in memory (0 = no cap)
+DEFAULT_MAX_BODY_MB = 8.0
+STREAM_CHUNK_BYTES = 64 * 1024
+SPILL_DIR = os.environ.get("APICOMP_SPILL_DIR") or os.path.join(tempfile.gettempdir(), "apicomp_spill")
+
+
+def get_env_setting(env, key, default):
+    """Read an optional per-environment setting, falling back to the default on empty/invalid values."""
+    val = (env or {}).get(key)
+    if val is None or val == "":
+        return default
+    if isinstance(default, bool):
+        if isinstance(val, str):
+            return val.strip().lower() in ("1", "true", "yes", "on")
+        return bool(val)
+    try:
+        return type(default)(val)
+    except (TypeError, ValueError):
+        return default
+
+
+# --- Response ---
+
+class HttpResponse:
+    """
+    Transport-neutral response object.
+    Every transport returns one of these so the comparison engine never depends on requests directly.
+    A body over the environment's in-memory cap lives in `body_path` and is only read when asked for.
+    """
+    def __init__(self, status_code, headers=None, content=b"", elapsed_ms=None, body_path=None, sha256=None, size=None, owns_body_file=False):
+        self.status_code = status_code
+        self.headers = dict(headers or {})
+        self.body_path = body_path
+        self._content = None if body_path else (content or b"")
+        self.sha256 = sha256
+        self.size = size if size is not None else len(self._content or b"")
+        # True for transport spill files, which may be moved/deleted once consumed
+        self.owns_body_file = owns_body_file
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def spilled(self):
+        return self.body_path is not None
+
+    @property
+    def content(self):
+        if self.body_path is not None:
+            with open(self.body_path, "rb") as f:
+                return f.read()
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def discard(self):
+        """Delete an owned spill file (e.g. a response that is retried rather than used)."""
+        if self.owns_body_file and self.body_path and os.path.exists(self.body_path):
+            os.remove(self.body_path)
+
+    @classmethod
+    def from_requests(cls, response):
+        return cls(
+            status_code=response.status_code,
+            headers=response.headers,
+            content=response.content,
+            elapsed_ms=int(response.elapsed.total_seconds() * 1000) if response.elapsed else None
+        )
+
+
+def get_max_body_bytes(env):
+    return int(max(0.0, get_env_setting(env, 'max_body_mb', DEFAULT_MAX_BODY_MB)) * 1024 * 1024)
+
+
+class BodyBuffer:
+    """
+    Accumulates a streamed body chunk by chunk: sha256 is computed while reading, and the body
+    stays in memory only up to `max_bytes`; past that it continues in a spill file under SPILL_DIR.
+    """
+    def __init__(self, max_bytes, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir or SPILL_DIR
+        self.size = 0
+        self.path = None
+        self._chunks = []
+        self._file = None
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is not None:
+            self._file.write(chunk)
+            return
+        self._chunks.append(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            fd, self.path = tempfile.mkstemp(prefix="body-", suffix=".part", dir=self.spill_dir)
+            self._file = os.fdopen(fd, "wb")
+            for buffered in self._chunks:
+                self._file.write(buffered)
+            self._chunks = []
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            os.remove(self.path)
+            self._file = None
+
+    def finish(self, status_code, headers, elapsed_ms=None):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            return HttpResponse(status_code, headers, None, elapsed_ms, body_path=self.path,
+                                sha256=self._hash.hexdigest(), size=self.size, owns_body_file=True)
+        return HttpResponse(status_code, headers, b"".join(self._chunks), elapsed_ms,
+                            sha256=self._hash.hexdigest(), size=self.size)
+
+
+# --- Session Pool ---
+
+class SessionPool:
+    """
+    One pooled keep-alive requests.Session per environment/base_url.
+    Sessions live for the whole process, so chains and reruns reuse already-open connections.
+    """
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _pool_key(env):
+        base_url = (env or {}).get('base_url', '') or ''
+        parts = urlsplit(base_url)
+        origin = f"{parts.scheme}://{parts.netloc}" if parts.netloc else base_url
+        return (
+            (env or {}).get('id'),
+            origin,
+            get_env_setting(env, 'pool_size', DEFAULT_POOL_MAXSIZE),
+            get_env_setting(env, 'keep_alive', DEFAULT_KEEP_ALIVE),
+        )
+
+    @staticmethod
+    def _build_session(env):
+        pool_size = max(1, get_env_setting(env, 'pool_size', DEFAULT_POOL_MAXSIZE))
+        session = requests.Session()
+        # Only connections are pooled: like a one-off requests.request, no cookie survives a request
+        # (a login in one run or Streamlit session must not leak into another's calls)
+        session.cookies = RequestsCookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(
+            pool_connections=DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize=pool_size,
+            pool_block=False
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not get_env_setting(env, 'keep_alive', DEFAULT_KEEP_ALIVE):
+            session.headers['Connection'] = 'close'
+        return session
+
+    def get_session(self, env):
+        key = self._pool_key(env)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                # Settings changed for this env -> drop the stale session for it
+                for old_key in [k for k in self._sessions if k[0] == key[0] and k != key]:
+                    self._sessions.pop(old_key).close()
+                session = self._build_session(env)
+                self._sessions[key] = session
+            return session
+
+    def has_live_connection(self, env):
+        """True when the environment's session already holds an open idle connection to its host."""
+        session = self._sessions.get(self._pool_key(env))
+        if session is None:
+            return False
+        parts = urlsplit((env or {}).get('base_url', '') or '')
+        target = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        pools = session.get_adapter(f"{parts.scheme}://{parts.netloc}/").poolmanager.pools
+        for key in pools.keys():
+            if (key.key_scheme, key.key_host, key.key_port) != target:
+                continue
+            pool = pools.get(key)
+            idle = list(pool.pool.queue) if pool is not None and pool.pool is not None else []
+            if any(conn is not None and not is_connection_dropped(conn) for conn in idle):
+                return True
+        return False
+
+    def warm_up(self, env, limiter=None):
+        """
+        Open a connection (TCP+TLS) to the environment host before the chain starts,
+        unless one is already open. The HEAD request counts against the given limiter.
+        """
+        if not get_env_setting(env, 'warm_up', DEFAULT_WARM_UP):
+            return False
+        if not get_env_setting(env, 'keep_alive', DEFAULT_KEEP_ALIVE):
+            return False
+        base_url = (env or {}).get('base_url', '') or ''
+        parts = urlsplit(base_url)
+        if not parts.netloc or '{{' in parts.netloc:
+            return False
+        try:
+            if self.has_live_connection(env):
+                return False
+            with (limiter.slot() if limiter else nullcontext()):
+                self.get_session(env).head(f"{parts.scheme}://{parts.netloc}/", timeout=DEFAULT_TIMEOUT, allow_redirects=False)
+            return True
+        except Exception:
+            return False  # Warm-up is best effort only
+
+    def warm_up_all(self, environments, limiters=None):
+        """`limiters`: optional {env id: EnvLimiter} of the run the warm-up is for."""
+        envs = list(environments)
+        if not envs:
+            return
+        limiters = limiters or {}
+        with ThreadPoolExecutor(max_workers=min(len(envs), 8)) as executor:
+            list(executor.map(lambda env: self.warm_up(env, limiters.get(env.get('id'))), envs))
+
+    def close_all(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_session_pool = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    """Process-wide session pool shared by the Comparator, Dashboard reruns and the Playground."""
+    global _session_pool
+    if _session_pool is None:
+        with _session_pool_lock:
+            if _session_pool is None:
+                _session_pool = SessionPool()
+    return _session_pool
+
+
+# --- Transports ---
+
+class PooledTransport:
+    """
+    Default transport: sends the rendered request over the environment's pooled session.
+    A given `limiter` (rate_limit.EnvLimiter) is held for the request; RetryingTransport takes it per attempt instead.
+    """
+    def __init__(self, pool=None):
+        self.pool = pool or get_session_pool()
+
+    @property
+    def session_pool(self):
+        return self.pool
+
+    def send(self, env, api_template, request_info, limiter=None):
+        if limiter:
+            with limiter.slot():
+                return self.send(env, api_template, request_info)
+        session = self.pool.get_session(env)
+        response = session.request(
+            method=request_info['method'],
+            url=request_info['url'],
+            params=request_info['params'],
+            json=request_info['body'],
+            headers=request_info['headers'],
+            timeout=get_env_setting(env, 'timeout', DEFAULT_TIMEOUT),
+            stream=True
+        )
+        buffer = BodyBuffer(get_max_body_bytes(env))
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_BYTES):
+                buffer.write(chunk)
+        except Exception:
+            buffer.abort()
+            raise
+        finally:
+            response.close()
+        elapsed_ms = int(response.elapsed.total_seconds() * 1000) if response.elapsed else None
+        return buffer.finish(response.status_code, response.headers, elapsed_ms)
+
+
+_default_transport = None
+
+
+def get_default_transport():
+    """
+    Pooled sessions wrapped by retry/hedging (see retry_policy)
+    behind the opt-in per-template response cache (see response_cache).
+    """
+    global _default_transport
+    if _default_transport is None:
+        from response_cache import CachingTransport
+        from retry_policy import RetryingTransport
+        _default_transport = CachingTransport(RetryingTransport(PooledTransport()))
+    return _default_transport
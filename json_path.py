@@ -0,0 +1,394 @@
+import re
+from functools import lru_cache
+
+# Compiled JSONPath subset used by Post Action (`extract`) rules:
+#   $.a.b[0]  $['key.with.dots']  $.items[*].id  $.items[-1]  $.items[1:3]  $.items[::2]
+#   $..id (recursive descent)  $.items[?(@.type=='x' && @.price > 10)].id  $['a','b']  $[0,2]
+# Paths not starting with `$.`, `$[` or `$..` keep the legacy dotted form: `result.token`, `items.0.id`.
+# A definite path extracts its value; an indefinite one (wildcard, slice, filter, ..) extracts its first match.
+
+_MISSING = object()
+_NAME_END = re.compile(r'[.\[]')
+_FILTER_TOKEN = re.compile(r"""\s*(?:
+    (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<num>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<op>==|!=|<=|>=|<|>|&&|\|\||!|\(|\))
+  | (?P<cur>@(?:\.[A-Za-z_$][\w$-]*|\[(?:'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|-?\d+)\])*)
+  | (?P<word>true|false|null)
+)""", re.VERBOSE)
+
+
+class JsonPathError(ValueError):
+    """Raised when a path cannot be compiled."""
+
+
+# --- Steps ---
+# A step maps one value to the values it selects; `key` identifies it when rules share a prefix.
+
+class Member:
+    def __init__(self, name):
+        self.name = name
+        self.key = ('member', name)
+
+    def matches(self, value):
+        if isinstance(value, dict):
+            if self.name in value:
+                yield value[self.name]
+        elif isinstance(value, list) and self.name.isdecimal():
+            # Legacy dotted form: `items.0` indexes lists
+            index = int(self.name)
+            if index < len(value):
+                yield value[index]
+
+
+class Index:
+    def __init__(self, index):
+        self.index = index
+        self.key = ('index', index)
+
+    def matches(self, value):
+        if isinstance(value, list) and -len(value) <= self.index < len(value):
+            yield value[self.index]
+
+
+class Union:
+    def __init__(self, steps):
+        self.steps = steps
+        self.key = ('union',) + tuple(s.key for s in steps)
+
+    def matches(self, value):
+        for step in self.steps:
+            yield from step.matches(value)
+
+
+class Wildcard:
+    key = ('wildcard',)
+
+    def matches(self, value):
+        if isinstance(value, dict):
+            yield from value.values()
+        elif isinstance(value, list):
+            yield from value
+
+
+class Slice:
+    def __init__(self, start, stop, step):
+        if step == 0:
+            raise JsonPathError("slice step cannot be 0")
+        self.slice = slice(start, stop, step)
+        self.key = ('slice', start, stop, step)
+
+    def matches(self, value):
+        if isinstance(value, list):
+            yield from value[self.slice]
+
+
+class Filter:
+    def __init__(self, source, predicate):
+        self.predicate = predicate
+        self.key = ('filter', source)
+
+    def matches(self, value):
+        items = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+        for item in items:
+            if _truthy(self.predicate(item)):
+                yield item
+
+
+class Descendants:
+    """`..step`: applies `step` to the value and every nested value, in document order."""
+    def __init__(self, step):
+        self.step = step
+        self.key = ('descendants',) + step.key
+
+    def matches(self, value):
+        stack = [value]
+        while stack:
+            current = stack.pop()
+            yield from self.step.matches(current)
+            if isinstance(current, dict):
+                stack.extend(reversed(list(current.values())))
+            elif isinstance(current, list):
+                stack.extend(reversed(current))
+
+
+# --- Filter Expressions ---
+
+def _unquote(token):
+    return re.sub(r'\\(.)', r'\1', token[1:-1])
+
+
+def _compile_relative(source):
+    """`@.a['b'][0]` -> function returning the value or _MISSING."""
+    steps = []
+    for name, quoted, index in re.findall(r"""\.([A-Za-z_$][\w$-]*)|\[('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")\]|\[(-?\d+)\]""", source[1:]):
+        if name:
+            steps.append(name)
+        elif quoted:
+            steps.append(_unquote(quoted))
+        else:
+            steps.append(int(index))
+
+    def resolve(item):
+        for step in steps:
+            if isinstance(step, int):
+                if not (isinstance(item, list) and -len(item) <= step < len(item)):
+                    return _MISSING
+                item = item[step]
+            else:
+                if not (isinstance(item, dict) and step in item):
+                    return _MISSING
+                item = item[step]
+        return item
+    return resolve
+
+
+def _truthy(value):
+    return value is not _MISSING and value is not False and value is not None
+
+
+def _compare(op, left, right):
+    if op in ('==', '!='):
+        if left is _MISSING or right is _MISSING:
+            equal = left is right
+        else:
+            # true/false never equal 1/0
+            equal = left == right and isinstance(left, bool) == isinstance(right, bool)
+        return equal if op == '==' else not equal
+    if left is _MISSING or right is _MISSING or isinstance(left, bool) or isinstance(right, bool):
+        return False
+    try:
+        if op == '<': return left < right
+        if op == '<=': return left <= right
+        if op == '>': return left > right
+        return left >= right
+    except TypeError:
+        return False
+
+
+class _FilterParser:
+    def __init__(self, source):
+        self.source = source
+        self.tokens = []
+        pos = 0
+        while pos < len(source):
+            if source[pos:].strip() == '':
+                break
+            match = _FILTER_TOKEN.match(source, pos)
+            if not match or match.end() == pos:
+                raise JsonPathError(f"invalid filter expression at: {source[pos:]!r}")
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            pos = match.end()
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _take(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        expr = self._or()
+        if self.pos != len(self.tokens):
+            raise JsonPathError(f"unexpected token in filter: {self._peek()[1]!r}")
+        return expr
+
+    def _or(self):
+        left = self._and()
+        while self._peek() == ('op', '||'):
+            self._take()
+            left = (lambda a, b: lambda item: _truthy(a(item)) or _truthy(b(item)))(left, self._and())
+        return left
+
+    def _and(self):
+        left = self._comparison()
+        while self._peek() == ('op', '&&'):
+            self._take()
+            left = (lambda a, b: lambda item: _truthy(a(item)) and _truthy(b(item)))(left, self._comparison())
+        return left
+
+    def _comparison(self):
+        left = self._unary()
+        kind, op = self._peek()
+        if kind == 'op' and op in ('==', '!=', '<', '<=', '>', '>='):
+            self._take()
+            right = self._unary()
+            return lambda item: _compare(op, left(item), right(item))
+        return left
+
+    def _unary(self):
+        kind, text = self._take()
+        if (kind, text) == ('op', '!'):
+            operand = self._unary()
+            return lambda item: not _truthy(operand(item))
+        if (kind, text) == ('op', '('):
+            inner = self._or()
+            if self._take() != ('op', ')'):
+                raise JsonPathError("unbalanced parentheses in filter")
+            return inner
+        if kind == 'cur':
+            return _compile_relative(text)
+        if kind == 'str':
+            value = _unquote(text)
+        elif kind == 'num':
+            value = float(text) if any(c in text for c in '.eE') else int(text)
+        elif kind == 'word':
+            value = {'true': True, 'false': False, 'null': None}[text]
+        else:
+            raise JsonPathError(f"unexpected token in filter: {text!r}")
+        return lambda item: value
+
+
+# --- Path Compiler ---
+
+def _bracket_end(path, pos):
+    """Index of the `]` closing the bracket opened at pos (quotes and nested brackets respected)."""
+    depth, quote = 0, None
+    for i in range(pos, len(path)):
+        c = path[i]
+        if quote:
+            if c == quote and path[i - 1] != '\\':
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c == '[':
+            depth += 1
+        elif c == ']':
+            depth -= 1
+            if depth == 0:
+                return i
+    raise JsonPathError(f"unclosed bracket in {path!r}")
+
+
+def _parse_bracket(content):
+    content = content.strip()
+    if content == '*':
+        return Wildcard()
+    if content.startswith('?'):
+        expr = content[1:].strip()
+        return Filter(expr, _FilterParser(expr).parse())
+    parts = [p.strip() for p in re.findall(r"""'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|[^,]+""", content)]
+    if not parts:
+        raise JsonPathError("empty brackets")
+    steps = []
+    for part in parts:
+        if part[:1] in "'\"":
+            steps.append(Member(_unquote(part)))
+        elif ':' in part:
+            bounds = part.split(':')
+            if len(bounds) > 3:
+                raise JsonPathError(f"invalid slice: {part!r}")
+            try:
+                start, stop, step = (int(b) if b.strip() else None for b in bounds + [''] * (3 - len(bounds)))
+            except ValueError:
+                raise JsonPathError(f"invalid slice: {part!r}")
+            steps.append(Slice(start, stop, step))
+        else:
+            try:
+                steps.append(Index(int(part)))
+            except ValueError:
+                raise JsonPathError(f"invalid index: {part!r}")
+    return steps[0] if len(steps) == 1 else Union(steps)
+
+
+@lru_cache(maxsize=4096)
+def compile_path(path):
+    """Compile a path into a tuple of steps (cached per path string)."""
+    if not isinstance(path, str):
+        raise JsonPathError(f"path must be a string, got {type(path).__name__}")
+    if path != '$' and not path.startswith(('$.', '$[')):
+        # Legacy dotted form
+        return tuple(Member(part) for part in path.replace("$.", "").split('.'))
+
+    steps = []
+    pos, n = 1, len(path)
+    while pos < n:
+        recursive = path.startswith('..', pos)
+        if recursive:
+            pos += 2
+        elif path[pos] == '.':
+            pos += 1
+        if pos >= n:
+            raise JsonPathError(f"path ends with a dot: {path!r}")
+
+        if path[pos] == '[':
+            end = _bracket_end(path, pos)
+            step = _parse_bracket(path[pos + 1:end])
+            pos = end + 1
+        elif path[pos] == '*':
+            step = Wildcard()
+            pos += 1
+        elif recursive or path[pos - 1] == '.':
+            match = _NAME_END.search(path, pos)
+            end = match.start() if match else n
+            if end == pos:
+                raise JsonPathError(f"empty member name in {path!r}")
+            step = Member(path[pos:end])
+            pos = end
+        else:
+            raise JsonPathError(f"unexpected character {path[pos]!r} in {path!r}")
+        steps.append(Descendants(step) if recursive else step)
+    return tuple(steps)
+
+
+# --- Rule Sets ---
+# All paths of a template share one trie, so the response is walked once for every rule.
+
+class _TrieNode:
+    __slots__ = ('children', 'terminals', 'ordinals')
+
+    def __init__(self):
+        self.children = {}   # step key -> (step, node)
+        self.terminals = []  # ordinals of paths ending here
+        self.ordinals = set()  # ordinals of paths ending here or below
+
+
+@lru_cache(maxsize=1024)
+def compile_paths(paths):
+    """Trie over a tuple of paths; a path that fails to compile is skipped (it extracts nothing)."""
+    root = _TrieNode()
+    for ordinal, path in enumerate(paths):
+        try:
+            steps = compile_path(path)
+        except JsonPathError as e:
+            print(f"Invalid extraction path {path!r}: {e}")
+            continue
+        node = root
+        node.ordinals.add(ordinal)
+        for step in steps:
+            if step.key not in node.children:
+                node.children[step.key] = (step, _TrieNode())
+            node = node.children[step.key][1]
+            node.ordinals.add(ordinal)
+        node.terminals.append(ordinal)
+    return root
+
+
+def _walk(node, value, found):
+    for ordinal in node.terminals:
+        if ordinal not in found and value is not None:
+            found[ordinal] = value
+    for step, child in node.children.values():
+        if child.ordinals.issubset(found):
+            continue
+        for match in step.matches(value):
+            _walk(child, match, found)
+            if child.ordinals.issubset(found):
+                break
+
+
+def evaluate_paths(data, paths):
+    """
+    Evaluate many paths against `data` in a single traversal.
+    Returns {ordinal: value} for every path with a (non-null) match.
+    """
+    found = {}
+    _walk(compile_paths(tuple(paths)), data, found)
+    return found
+
+
+def find_first(data, path):
+    """Value of one path in `data`, or None."""
+    return evaluate_paths(data, [path]).get(0)
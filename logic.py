@@ -1,37 +1,29 @@
 import json
-import os
 import uuid
 import datetime
-import requests
-import re
-from deepdiff import DeepDiff
+import threading
 from urllib.parse import urljoin
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from http_client import get_default_transport
+from rate_limit import EnvLimiter
+from fingerprint import fingerprint_for_template
+from diff_engine import get_diff_executor, estimate_payload_size, run_deepdiff
+from stream_compare import get_comparator, get_max_diffs, run_stream_compare
+from env_context import EnvContext
+from json_path import evaluate_paths
+from variable_store import VariableStore
+from response_body import BODY_REF_KEY, SpilledBody, store_spilled_body, get_body_ref, load_response_body, run_blob_dir, discard_run_bodies
+from template_compiler import compile_string, get_compiled_template
+from serialization import load_file, save_file
 
 # --- Helpers ---
 
-def make_serializable(obj):
-    """Recursively convert objects (like sets) to JSON-serializable types (lists)."""
-    if isinstance(obj, (set, list, tuple)):
-        return [make_serializable(x) for x in obj]
-    if isinstance(obj, dict):
-        return {k: make_serializable(v) for k, v in obj.items()}
-    if type(obj).__name__ == 'SetOrdered':
-        return list(obj)
-    return obj
-
 def load_json_file(file_path):
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return []
-    return []
+    return load_file(file_path, [])
 
 def save_json_file(file_path, data):
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    # Environments/templates are read and edited by people: keep them indented
+    save_file(file_path, data, pretty=True)
 
 # --- Variable Logic ---
 
@@ -41,19 +33,8 @@ def render_template_string(template_str, context, used_keys=None):
     """
     if not isinstance(template_str, str):
         return template_str
-    
-    # regex for {{var}}, permissive on characters between curly braces
-    pattern = re.compile(r'\{\{\s*([^\}]+?)\s*\}\}')
-    
-    def replace_match(match):
-        var_name = match.group(1).strip()
-        if var_name in context:
-            if used_keys is not None:
-                used_keys.add(var_name)
-            return str(context.get(var_name))
-        return match.group(0) # Default to raw string if missing
-    
-    return pattern.sub(replace_match, template_str)
+    # Missing variables keep their raw {{var}} text
+    return compile_string(template_str).render(context, used_keys)
 
 def render_template_obj(obj, context, used_keys=None):
     """
@@ -70,123 +51,67 @@ def render_template_obj(obj, context, used_keys=None):
 def extract_value_from_response(response_data, extraction_rules):
     """
     Extract values from JSON response based on rules.
-    rules: [{"source": "path.to.key", "target_var": "var_name"}]
-    Simple dot notation support for now.
+    rules: [{"source": "$.path.to.key", "target_var": "var_name"}] or [{"var_name": "$.path.to.key"}]
+    Paths are compiled JSONPath (see json_path); every rule is evaluated in one traversal of the response.
     """
     extracted = {}
     if not extraction_rules or not isinstance(extraction_rules, list):
         return extracted
         
+    items = []
     for rule in extraction_rules:
+        if not isinstance(rule, dict):
+            continue
         # Determine format
         # 1. Legacy: {"source": "a", "target_var": "b"}
         if 'source' in rule and 'target_var' in rule:
-            items = [(rule['target_var'], rule['source'])]
+            items.append((rule['target_var'], rule['source']))
         else:
             # 2. Key-Value: {"token": "$.result.token"}
-            items = list(rule.items())
-            
-        for target_var, source_path in items:
-            # Traverse
-            val = response_data
-            try:
-                parts = source_path.replace("$.", "").split('.')
-                for part in parts:
-                    if isinstance(val, dict):
-                        val = val.get(part)
-                    elif isinstance(val, list) and part.isdigit():
-                        val = val[int(part)]
-                    else:
-                        val = None
-                        break
-                
-                if val is not None:
-                    extracted[target_var] = val
-            except Exception:
-                pass # Extraction failed
+            items.extend(rule.items())
+    items = [(target_var, source_path) for target_var, source_path in items if isinstance(source_path, str)]
+
+    found = evaluate_paths(response_data, [source_path for _, source_path in items])
+    # Later rules win for the same variable, as when rules were applied one by one
+    for ordinal, (target_var, _) in enumerate(items):
+        if ordinal in found:
+            extracted[target_var] = found[ordinal]
             
     return extracted
 
 # --- API Interaction ---
 
-def fetch_api_data(env, api_template, runtime_context):
+def build_request_info(env, api_template, runtime_context, env_context=None):
     """
-    Execute API call using the Runtime Context for variable substitution.
+    Render the full request (URL, headers, params, body) for one API in one environment.
+    `env_context` is the environment's pre-resolved EnvContext for the run (built on the fly when omitted).
+    Returns (request_info, error_result). Exactly one of them is None.
     """
-    # 0. Merge Context: Env Variables + API Runtime Variables
-    # Env variables are defined in environment config
-    # V2 Update: variables can be a dict OR a list of {key, value, description}
-    env_vars_raw = env.get('variables', {})
-    if isinstance(env_vars_raw, str):
-        try: env_vars_raw = json.loads(env_vars_raw)
-        except: env_vars_raw = {}
-    
-    env_vars = {}
-    if isinstance(env_vars_raw, list):
-        # Flatten list to dict and TRIM keys/values
-        for item in env_vars_raw:
-            if isinstance(item, dict) and 'key' in item:
-                k = item['key'].strip() if isinstance(item['key'], str) else item['key']
-                v = item.get('value', '')
-                v = v.strip() if isinstance(v, str) else v
-                env_vars[k] = v
-    elif isinstance(env_vars_raw, dict):
-        env_vars = {k.strip() if isinstance(k, str) else k: (v.strip() if isinstance(v, str) else v) for k, v in env_vars_raw.items()}
-            
+    env_context = env_context or EnvContext(env)
     # Combine: Runtime overrides Env
-    full_context = {**env_vars, **(runtime_context or {})}
+    full_context = env_context.full_context(runtime_context)
     used_keys = set()
+    compiled = get_compiled_template(api_template)
     
     # 1. Render URL
     try:
-        base_url_raw = env.get('base_url', '').rstrip('/') + '/'
-        base_url = render_template_string(base_url_raw, full_context, used_keys)
-        
-        rel_path_raw = api_template.get('relative_path', '').lstrip('/')
-        relative_path = render_template_string(rel_path_raw, full_context, used_keys)
+        base_url = env_context.base_url(runtime_context, full_context, used_keys)
+        relative_path = compiled.render_path(full_context, used_keys)
         
         full_url = urljoin(base_url, relative_path)
     except Exception as e:
-        return {"error": f"URL Construction Failed: {e}", "status": "failed"}
+        return None, {"error": f"URL Construction Failed: {e}", "status": "failed"}
     
     # 2. Render Headers
-    auth_token = full_context.get('auth_token', '')
-    auth_token = render_template_string(auth_token, full_context, used_keys)
-    
-    env_headers = full_context.get('headers', {})
-    if isinstance(env_headers, str):
-        try: env_headers = json.loads(env_headers)
-        except: env_headers = {}
-    
-    api_headers = api_template.get('headers', {})
-    if isinstance(api_headers, str):
-        try: api_headers = json.loads(api_headers)
-        except: api_headers = {}
-        
-    # Render values in headers
-    env_headers = render_template_obj(env_headers, full_context, used_keys)
-    api_headers = render_template_obj(api_headers, full_context, used_keys)
-
+    api_headers = compiled.headers_plan.render(full_context, used_keys)
     headers = {
-        'Authorization': auth_token.strip() if isinstance(auth_token, str) else auth_token,
-        'Content-Type': 'application/json',
-        **({k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in env_headers.items()} if isinstance(env_headers, dict) else {}),
+        **env_context.default_headers(runtime_context, full_context, used_keys),
         **({k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in api_headers.items()} if isinstance(api_headers, dict) else {})
     }
     
-    # 3. Render Params & Body
-    params = api_template.get('params')
-    if isinstance(params, str):
-        try: params = json.loads(params) if params.strip() else None
-        except: params = None
-    params = render_template_obj(params, full_context, used_keys)
-            
-    json_body = api_template.get('json_body')
-    if isinstance(json_body, str):
-        try: json_body = json.loads(json_body) if json_body.strip() else None
-        except: json_body = None
-    if json_body is None: json_body = {}
-    json_body = render_template_obj(json_body, full_context, used_keys)
+    # 3. Render Params & Body (static parts are shared between calls: treat as read-only)
+    params = compiled.params_plan.render(full_context, used_keys)
+    json_body = compiled.body_plan.render(full_context, used_keys)
 
     # Debug Info - Only include variables that were actually used
     context_used_filtered = {k: full_context[k] for k in used_keys if k in full_context}
@@ -199,53 +124,58 @@ def fetch_api_data(env, api_template, runtime_context):
         "body": json_body,
         "context_used": context_used_filtered
     }
-    print(f"DEBUG REQUEST: {json.dumps(request_info, default=str)}")
-    
-    try:
-        response = requests.request(
-            method=api_template['method'],
-            url=full_url,
-            params=params,
-            json=json_body,
-            headers=headers,
-            timeout=10
-        )
-        # We don't raise for status immediately to allow inspection of 400s etc
-        # response.raise_for_status() 
+    return request_info, None
+
+def parse_response(response, request_info, blob_dir=None):
+    """
+    Convert a transport HttpResponse into the result dict stored per environment.
+    A spilled (oversized) body is not parsed: the result references its file in `blob_dir` instead.
+    """
+    # We don't raise for status immediately to allow inspection of 400s etc
+    if response.spilled:
+        result = {BODY_REF_KEY: store_spilled_body(response, blob_dir)}
+    else:
         try:
             result = response.json()
         except:
             result = {"raw_text": response.text}
-            
-        # Add metadata
-        if isinstance(result, dict):
-            result["_status_code"] = response.status_code
-            result["_debug_request"] = request_info
-            
-        return result
+        
+    # Add metadata
+    if isinstance(result, dict):
+        result["_status_code"] = response.status_code
+        result["_debug_request"] = request_info
+        
+    return result
+
+def fetch_api_data(env, api_template, runtime_context, transport=None, limiter=None, env_context=None, blob_dir=None):
+    """
+    Execute API call using the Runtime Context for variable substitution.
+    The request goes through `transport` (default: pooled keep-alive session per environment),
+    throttled per attempt by the environment's `limiter` (see rate_limit.EnvLimiter) when given.
+    Oversized bodies are spilled into `blob_dir` (see response_body).
+    """
+    request_info, error_result = build_request_info(env, api_template, runtime_context, env_context)
+    if error_result is not None:
+        return error_result
+    print(f"DEBUG REQUEST: {json.dumps(request_info, default=str)}")
+    
+    transport = transport or get_default_transport()
+    try:
+        response = transport.send(env, api_template, request_info, limiter=limiter)
+        return parse_response(response, request_info, blob_dir)
     except Exception as e:
         return {"error": str(e), "status": "failed", "_debug_request": request_info}
 
 # --- Comparison Logic ---
 
-def execute_comparison_run(selected_api_ids, selected_env_ids, environments, api_templates, progress_callback=None):
-    """
-    Executes comparison with Chaining support.
-    Logic:
-    1. Sort APIs by Order.
-    2. For each Environment:
-       - Run APIs sequentially.
-       - Update Context after each API if extraction rules exist.
-    """
+def prepare_run(selected_api_ids, selected_env_ids, environments, api_templates):
+    """Select + order environments/templates and build the empty per-API result structure."""
     selected_envs = [e for e in environments if e['id'] in selected_env_ids]
     
     # Filter and Sort Templates by Order
     selected_api_templates = [t for t in api_templates if t['id'] in selected_api_ids]
     selected_api_templates.sort(key=lambda x: int(x.get('order', 0) or 0))
     
-    run_id = str(uuid.uuid4())
-    run_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     api_results = {}
     # Init structure
     for api_tpl in selected_api_templates:
@@ -258,67 +188,289 @@ def execute_comparison_run(selected_api_ids, selected_env_ids, environments, api
             "comparisons": {},
             "overall_status": "Consistent"
         }
+    return selected_envs, selected_api_templates, api_results
+
+def get_extract_rules(api_tpl):
+    extract_rules = api_tpl.get('extract')
+    if isinstance(extract_rules, str):
+        try: extract_rules = json.loads(extract_rules)
+        except: extract_rules = []
+    return extract_rules
+
+def apply_extraction(env, api_tpl, data, runtime_context, variable_store=None):
+    """
+    Run the template's Post Action rules on a response and feed the chain + environment.
+    Extracted values go to `variable_store` (flushed once at run end); without one they are persisted right away.
+    """
+    extract_rules = get_extract_rules(api_tpl)
+    if not (extract_rules and isinstance(data, dict)):
+        return {}
+    if get_body_ref(data):
+        data = load_response_body(data) or {}
+    new_vars = extract_value_from_response(data, extract_rules)
+    
+    # 2a. Update Runtime Context (For next API in chain)
+    runtime_context.update(new_vars)
+    
+    # 2b. Persist to Environment (Session State)
+    # New requirement: "Refresh if exists, Create if not"
+    if variable_store is None:
+        variable_store = VariableStore(env)
+        variable_store.set_many(new_vars)
+        variable_store.flush()
+    else:
+        variable_store.set_many(new_vars)
+    return new_vars
+
+def clean_response_data(data):
+    """Body to compare: data keys starting with _ (debug/status) removed; spilled bodies stay on disk until diffed."""
+    ref = get_body_ref(data)
+    if ref:
+        return SpilledBody(ref)
+    return {k:v for k,v in data.items() if not k.startswith('_')} if isinstance(data, dict) else data
+
+def make_env_entry(api_tpl, data):
+    """Per-environment result of one API, fingerprinted as soon as the response arrives."""
+    return {
+        "data": data,
+        "fingerprint": fingerprint_for_template(data, api_tpl)
+    }
+
+def schedule_api_comparison(api_tpl, api_result, selected_envs, diff_executor=None):
+    """
+    Start comparing every target environment against the reference (first) environment for one API.
+    Returns the pending comparisons to hand to finish_api_comparison.
+    """
+    # Check if we have data (might be missing if env run failed)
+    if not api_result["data_by_env"]:
+        api_result["overall_status"] = "Error"
+        return []
+
+    ref_env = selected_envs[0]
+    if ref_env['id'] not in api_result["data_by_env"]:
+         api_result["overall_status"] = "Error"
+         return []
+         
+    ref_entry = api_result["data_by_env"][ref_env['id']]
+    ref_data = ref_entry['data']
+    
+    clean_ref = clean_response_data(ref_data)
+
+    diff_options = {
+        'ignore_order': api_tpl.get('ignore_order', False),
+        'exclude_paths': api_tpl.get('ignore_paths', [])
+    }
+    # Per-template comparator: DeepDiff over parsed bodies, or lockstep streaming with early exit
+    compare = run_deepdiff
+    if get_comparator(api_tpl) == "stream":
+        compare = run_stream_compare
+        diff_options['max_diffs'] = get_max_diffs(api_tpl)
+    diff_executor = diff_executor or get_diff_executor()
+    pending = []
+    for i in range(1, len(selected_envs)):
+        target_env = selected_envs[i]
+        if target_env['id'] not in api_result["data_by_env"]:
+            continue
+            
+        target_entry = api_result["data_by_env"][target_env['id']]
+        target_data = target_entry['data']
+        
+        clean_target = clean_response_data(target_data)
+        
+        comp_key = f"{ref_env['name']} vs {target_env['name']}"
+        
+        # Fast path: identical fingerprints => DeepDiff would find nothing
+        ref_fp, target_fp = ref_entry.get('fingerprint'), target_entry.get('fingerprint')
+        if ref_fp and target_fp and ref_fp['hash'] == target_fp['hash']:
+            future = None
+        else:
+            # Use DeepDiff to check for consistency (in a worker process for large payloads)
+            payload_size = max(estimate_payload_size(clean_ref, ref_fp), estimate_payload_size(clean_target, target_fp))
+            future = diff_executor.submit(clean_ref, clean_target, diff_options, payload_size, compare)
+        pending.append((comp_key, future, clean_ref, clean_target))
+    return pending
+
+def finish_api_comparison(api_result, pending):
+    """Collect the diffs started by schedule_api_comparison and set statuses."""
+    for comp_key, future, clean_ref, clean_target in pending:
+        diff_output = future.result() if future is not None else None
+        
+        if diff_output:
+            # If they are different, check if it's because of an error
+            if (isinstance(clean_ref, dict) and "error" in clean_ref) or (isinstance(clean_target, dict) and "error" in clean_target):
+                status = "Error"
+            else:
+                status = "Inconsistent"
+        else:
+            # Both are identical (even if they both failed with the same error)
+            status = "Consistent"
+            diff_output = None
+        
+        api_result["comparisons"][comp_key] = {"status": status, "diff": diff_output}
+        if status != "Consistent":
+            api_result["overall_status"] = status
+
+def compare_api_result(api_tpl, api_result, selected_envs, diff_executor=None):
+    """Compare every target environment against the reference (first) environment for one API."""
+    finish_api_comparison(api_result, schedule_api_comparison(api_tpl, api_result, selected_envs, diff_executor))
+
+class ComparisonPipeline:
+    """
+    Fetch-and-diff pipeline: each API is compared the moment every environment has answered it,
+    so diff CPU overlaps the network wait of the APIs still in flight.
+    Engines call on_result() as responses arrive and finish() once all chains are done.
+    """
+    def __init__(self, selected_api_templates, selected_envs, api_results, diff_executor=None):
+        self.templates = {t['id']: t for t in selected_api_templates}
+        self.selected_api_templates = selected_api_templates
+        self.selected_envs = selected_envs
+        self.api_results = api_results
+        self.diff_executor = diff_executor or get_diff_executor()
+        self._env_names = {e['id']: e['name'] for e in selected_envs}
+        self._pending = {}  # api_id -> pending comparisons
+        self._lock = threading.Lock()
+
+    def on_result(self, env, api_tpl, data):
+        api_id = api_tpl['id']
+        entry = make_env_entry(api_tpl, data)
+        with self._lock:
+            data_by_env = self.api_results[api_id]["data_by_env"]
+            data_by_env[env['id']] = {"env_name": self._env_names[env['id']], **entry}
+            ready = len(data_by_env) == len(self.selected_envs) and api_id not in self._pending
+            if ready:
+                self._pending[api_id] = None  # claimed
+        if ready:
+            self._schedule(api_id)
+
+    def _schedule(self, api_id):
+        api_result = self.api_results[api_id]
+        # Keep environment columns in selection order regardless of arrival order
+        data_by_env = api_result["data_by_env"]
+        api_result["data_by_env"] = {e['id']: data_by_env[e['id']] for e in self.selected_envs if e['id'] in data_by_env}
+        pending = schedule_api_comparison(self.templates[api_id], api_result, self.selected_envs, self.diff_executor)
+        with self._lock:
+            self._pending[api_id] = pending
+
+    def finish(self):
+        """Compare APIs some environment never answered (failed chain), then collect every diff."""
+        for api_tpl in self.selected_api_templates:
+            if api_tpl['id'] not in self._pending:
+                self._schedule(api_tpl['id'])
+        for api_tpl in self.selected_api_templates:
+            finish_api_comparison(self.api_results[api_tpl['id']], self._pending[api_tpl['id']])
+
+def flush_variable_stores(variable_stores, selected_envs, on_variables_changed=None):
+    """Write every environment's extracted variables back in one batch and report which ones changed."""
+    changed_envs = [env for env in selected_envs if variable_stores[env['id']].flush()]
+    if changed_envs and on_variables_changed:
+        on_variables_changed(changed_envs)
+    return changed_envs
+
+def build_run_summary(run_id, run_timestamp, selected_envs, selected_api_templates, api_results):
+    return {
+        "run_id": run_id,
+        "timestamp": run_timestamp,
+        "envs": [e['name'] for e in selected_envs],
+        "api_count": len(selected_api_templates),
+        "consistent_count": sum(1 for r in api_results.values() if r["overall_status"] == "Consistent"),
+        "inconsistent_count": sum(1 for r in api_results.values() if r["overall_status"] == "Inconsistent"),
+        "error_count": sum(1 for r in api_results.values() if r["overall_status"] == "Error"),
+        "api_results": api_results
+    }
+
+def execute_comparison_run(selected_api_ids, selected_env_ids, environments, api_templates, progress_callback=None, transport=None, engine="threads", async_transport=None, scheduler="dag", on_variables_changed=None, blob_dir=None):
+    """
+    Executes comparison with Chaining support.
+    Logic:
+    1. Sort APIs by Order.
+    2. For each Environment:
+       - Run APIs sequentially.
+       - Update Context after each API if extraction rules exist.
+    engine: "threads" (one worker thread per environment) or "asyncio" (see async_engine).
+    scheduler: "dag" runs APIs that don't share chain variables concurrently (see dependency_graph),
+               "sequential" runs every API strictly in order.
+    on_variables_changed: called once with the environments whose variables were updated by extraction.
+    blob_dir: where oversized response bodies are kept, one sub-directory per run (temp dir by default).
+    """
+    if engine == "asyncio":
+        from async_engine import execute_comparison_run_async
+        return execute_comparison_run_async(
+            selected_api_ids, selected_env_ids, environments, api_templates,
+            progress_callback=progress_callback, transport=async_transport, scheduler=scheduler,
+            sync_transport=transport, on_variables_changed=on_variables_changed, blob_dir=blob_dir
+        )
+
+    run_id = str(uuid.uuid4())
+    try:
+        return _execute_comparison_run_threads(
+            run_id, selected_api_ids, selected_env_ids, environments, api_templates,
+            progress_callback, transport, scheduler, on_variables_changed, blob_dir
+        )
+    except BaseException:
+        # The run is never returned, so nothing will store its spilled bodies
+        discard_run_bodies(blob_dir, run_id)
+        raise
+
+def _execute_comparison_run_threads(run_id, selected_api_ids, selected_env_ids, environments, api_templates, progress_callback, transport, scheduler, on_variables_changed, blob_dir):
+    from dependency_graph import DependencyGraph, run_graph
+
+    selected_envs, selected_api_templates, api_results = prepare_run(selected_api_ids, selected_env_ids, environments, api_templates)
+    
+    run_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    spill_dir = run_blob_dir(blob_dir, run_id)
 
     total_steps = len(selected_api_templates) * len(selected_envs)
     step_count = 0
+
+    transport = transport or get_default_transport()
+    limiters = {env['id']: EnvLimiter(env) for env in selected_envs}
+    # Open connections to every environment up-front so the first API in each chain skips the handshake
+    # (only transports sending over a session pool can reuse them)
+    session_pool = getattr(transport, 'session_pool', None)
+    if session_pool is not None:
+        session_pool.warm_up_all(selected_envs, limiters)
+    
+    pipeline = ComparisonPipeline(selected_api_templates, selected_envs, api_results)
+    # One variable store per environment: extracted values are persisted once, after the run
+    variable_stores = {env['id']: VariableStore(env) for env in selected_envs}
     
     # Helper to run a whole sequence for ONE env
     def run_sequence_for_env(env):
-        results = {} # api_id -> data
-        runtime_context = {} 
+        limiter = limiters[env['id']]
+        # Environment variables, base URL and default headers are resolved once for the whole run
+        env_context = EnvContext(env)
+        variable_store = variable_stores[env['id']]
         
-        for api_tpl in selected_api_templates:
-            # 1. Fetch
-            data = fetch_api_data(env, api_tpl, runtime_context)
-            results[api_tpl['id']] = data
-            
-            # 2. Extract Variables
-            extract_rules = api_tpl.get('extract')
-            if isinstance(extract_rules, str):
-                try: extract_rules = json.loads(extract_rules)
-                except: extract_rules = []
-            
-            if extract_rules and isinstance(data, dict):
-                 new_vars = extract_value_from_response(data, extract_rules)
-                 
-                 # 2a. Update Runtime Context (For next API in chain)
-                 runtime_context.update(new_vars)
-                 
-                 # 2b. Persist to Environment (Session State)
-                 # New requirement: "Refresh if exists, Create if not"
-                 # env['variables'] is a list of dicts: [{"key": "k", "value": "v", ...}]
-                 if 'variables' not in env or not isinstance(env['variables'], list):
-                     env['variables'] = []
-                 
-                 for key, value in new_vars.items():
-                     str_val = str(value)
-                     # Find existing
-                     found = False
-                     for var_item in env['variables']:
-                         if var_item.get('key') == key:
-                             var_item['value'] = str_val
-                             found = True
-                             break
-                     if not found:
-                         env['variables'].append({
-                             "key": key,
-                             "value": str_val,
-                             "description": "Auto-extracted"
-                         })
-                 
-        return env['id'], results
-
-    # Run Environments in Parallel (Each Env runs its own chain sequentially)
-    environment_results = {} # env_id -> {api_id: data}
-    
-    with ThreadPoolExecutor(max_workers=5) as executor:
+        if scheduler == "sequential":
+            runtime_context = {} 
+            for api_tpl in selected_api_templates:
+                # 1. Fetch (the pipeline diffs it as soon as every env has answered)
+                data = fetch_api_data(env, api_tpl, runtime_context, transport=transport, limiter=limiter, env_context=env_context, blob_dir=spill_dir)
+                pipeline.on_result(env, api_tpl, data)
+                
+                # 2. Extract Variables
+                apply_extraction(env, api_tpl, data, runtime_context, variable_store)
+            return
+
+        # DAG: independent APIs run concurrently, producer -> consumer edges are honored
+        graph = DependencyGraph(selected_api_templates, env)
+
+        def run_node(index, runtime_context):
+            api_tpl = selected_api_templates[index]
+            data = fetch_api_data(env, api_tpl, runtime_context, transport=transport, limiter=limiter, env_context=env_context, blob_dir=spill_dir)
+            pipeline.on_result(env, api_tpl, data)
+            return apply_extraction(env, api_tpl, data, runtime_context, variable_store)
+
+        run_graph(graph, run_node, max_parallel=limiter.max_concurrency)
+
+    # Run Environments in Parallel (Each Env runs its own chain; throttling is per environment)
+    with ThreadPoolExecutor(max_workers=max(1, len(selected_envs))) as executor:
         futures = {executor.submit(run_sequence_for_env, env): env for env in selected_envs}
         
         for future in as_completed(futures):
             env = futures[future]
             try:
-                env_id, seq_results = future.result()
-                environment_results[env_id] = seq_results
+                future.result()
             except Exception as e:
                 print(f"Error running sequence for {env['name']}: {e}")
             
@@ -327,83 +479,10 @@ def execute_comparison_run(selected_api_ids, selected_env_ids, environments, api
             if progress_callback:
                  progress_callback(min(step_count, total_steps), total_steps, f"Processed {env['name']}")
 
-    # Re-structure for Comparison View (Pivot results)
-    for env_id, seq_results in environment_results.items():
-        env_name = next(e['name'] for e in selected_envs if e['id'] == env_id)
-        for api_id, data in seq_results.items():
-            api_results[api_id]["data_by_env"][env_id] = {
-                "env_name": env_name,
-                "data": data
-            }
-
-    # Compare (All vs Ref)
-    for api_tpl in selected_api_templates:
-        api_id = api_tpl['id']
-        
-        # Check if we have data (might be missing if env run failed)
-        if not api_results[api_id]["data_by_env"]:
-            api_results[api_id]["overall_status"] = "Error"
-            continue
-
-        ref_env = selected_envs[0]
-        if ref_env['id'] not in api_results[api_id]["data_by_env"]:
-             api_results[api_id]["overall_status"] = "Error"
-             continue
-             
-        ref_entry = api_results[api_id]["data_by_env"][ref_env['id']]
-        ref_data = ref_entry['data']
-        
-        # Clean data keys starting with _ (debug/status)
-        clean_ref = {k:v for k,v in ref_data.items() if not k.startswith('_')} if isinstance(ref_data, dict) else ref_data
-
-        diff_options = {
-            'ignore_order': api_tpl.get('ignore_order', False),
-            'exclude_paths': api_tpl.get('ignore_paths', [])
-        }
-        for i in range(1, len(selected_envs)):
-            target_env = selected_envs[i]
-            if target_env['id'] not in api_results[api_id]["data_by_env"]:
-                continue
-                
-            target_entry = api_results[api_id]["data_by_env"][target_env['id']]
-            target_data = target_entry['data']
-            
-            # Clean data keys starting with _ (debug/status)
-            clean_target = {k:v for k,v in target_data.items() if not k.startswith('_')} if isinstance(target_data, dict) else target_data
-            
-            comp_key = f"{ref_env['name']} vs {target_env['name']}"
-            
-            # Use DeepDiff to check for consistency
-            ddiff = DeepDiff(clean_ref, clean_target, **diff_options)
-            
-            if ddiff:
-                # If they are different, check if it's because of an error
-                if (isinstance(clean_ref, dict) and "error" in clean_ref) or (isinstance(clean_target, dict) and "error" in clean_target):
-                    status = "Error"
-                else:
-                    status = "Inconsistent"
-                diff_output = make_serializable(ddiff.to_dict())
-            else:
-                # Both are identical (even if they both failed with the same error)
-                status = "Consistent"
-                diff_output = None
-            
-            api_results[api_id]["comparisons"][comp_key] = {"status": status, "diff": diff_output}
-            if status != "Consistent":
-                api_results[api_id]["overall_status"] = status
+    flush_variable_stores(variable_stores, selected_envs, on_variables_changed)
+    pipeline.finish()
 
-    run_summary = {
-        "run_id": run_id,
-        "timestamp": run_timestamp,
-        "envs": [e['name'] for e in selected_envs],
-        "api_count": len(selected_api_templates),
-        "consistent_count": sum(1 for r in api_results.values() if r["overall_status"] == "Consistent"),
-        "inconsistent_count": sum(1 for r in api_results.values() if r["overall_status"] == "Inconsistent"),
-        "error_count": sum(1 for r in api_results.values() if r["overall_status"] == "Error"),
-        "api_results": api_results
-    }
-    
-    return run_summary
+    return build_run_summary(run_id, run_timestamp, selected_envs, selected_api_templates, api_results)
 
 # --- OpenAPI Parsing Stub (Kept simple) ---
 # --- OpenAPI Parsing ---
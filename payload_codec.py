@@ -0,0 +1,80 @@
+import os
+import gzip
+import shutil
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- Settings (overridable through environment variables) ---
+# Codec for persisted run payloads: "zstd" (needs the optional `zstandard` package), "gzip" or "none"
+PAYLOAD_CODEC = os.environ.get("APICOMP_PAYLOAD_CODEC") or ("zstd" if zstandard else "gzip")
+# Compression level; empty = the codec's default (zstd 3, gzip 6)
+PAYLOAD_LEVEL = os.environ.get("APICOMP_PAYLOAD_LEVEL")
+
+DEFAULT_LEVELS = {"zstd": 3, "gzip": 6}
+CODECS = ["zstd", "gzip", "none"]
+
+# Frame signatures used to recognise stored data (anything else is plain UTF-8 JSON)
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class PayloadCodec:
+    """
+    Compresses JSON text for storage. Decoding sniffs the frame signature, so data written with
+    another codec (or uncompressed, before compression existed) always reads back.
+    """
+    def __init__(self, name=None, level=None):
+        name = (name or PAYLOAD_CODEC).lower()
+        if name not in CODECS:
+            raise ValueError(f"Unknown payload codec '{name}', expected one of {CODECS}")
+        if name == "zstd" and zstandard is None:
+            raise ImportError("The 'zstd' payload codec requires: pip install zstandard")
+        self.name = name
+        level = level if level is not None else PAYLOAD_LEVEL
+        self.level = int(level) if level not in (None, "") else DEFAULT_LEVELS.get(name)
+
+    def encode(self, text):
+        raw = text.encode("utf-8")
+        if self.name == "zstd":
+            return zstandard.ZstdCompressor(level=self.level).compress(raw)
+        if self.name == "gzip":
+            return gzip.compress(raw, compresslevel=self.level, mtime=0)
+        return raw
+
+    def compress_file(self, source, target):
+        """Write `source` compressed into `target`, streamed (spilled bodies can be large)."""
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            if self.name == "zstd":
+                zstandard.ZstdCompressor(level=self.level).copy_stream(src, dst)
+            elif self.name == "gzip":
+                with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=self.level, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz)
+            else:
+                shutil.copyfileobj(src, dst)
+
+    @staticmethod
+    def decompress(data):
+        """Bytes written by any codec -> the original bytes."""
+        data = bytes(data)
+        if data.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise ImportError("This history was compressed with zstd: pip install zstandard")
+            # decompressobj also reads streamed frames, which don't record their size
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        if data.startswith(GZIP_MAGIC):
+            return gzip.decompress(data)
+        return data
+
+    @staticmethod
+    def decode(data):
+        """Stored value (bytes, or str from before compression) -> JSON text."""
+        if isinstance(data, str):
+            return data
+        return PayloadCodec.decompress(data).decode("utf-8")
+
+
+def get_default_codec():
+    return PayloadCodec()
@@ -1,9 +1,14 @@
 
 import os
-import json
+import time
 import shutil
 import uuid
+import threading
 import streamlit as st
+from serialization import load_file, save_file
+from history_store import get_history_store, close_history_store
+from project_store import file_version
+from response_body import prune_spilled_bodies_once
 
 DATA_DIR = "data"
 PROJECTS_FILE = os.path.join(DATA_DIR, "projects.json")
@@ -13,12 +18,69 @@ LEGACY_ENV = "environments.json"
 LEGACY_API = "api_templates_UAT.json" # As seen in app.py
 LEGACY_HISTORY = "comparison_history.json"
 
+# How often (seconds) the cached registry checks projects.json for changes made by other processes
+REGISTRY_CHECK_INTERVAL = 1.0
+
+
+class ProjectRegistry:
+    """
+    projects.json held in memory, shared by every session of the process: reruns read the cached
+    list, and the file is re-read only when its mtime/size changed (checked at most every
+    REGISTRY_CHECK_INTERVAL). Updates hold the lock for the whole read-modify-write and are saved
+    atomically (see serialization.save_file).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self._projects = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def list(self):
+        """Cached project list: treat as read-only, change it through update()."""
+        now = time.monotonic()
+        if self._projects is not None and now - self._checked_at < REGISTRY_CHECK_INTERVAL:
+            return self._projects
+        with self.lock:
+            version = file_version(self.path)
+            if self._projects is None or version != self._version:
+                self._projects = load_file(self.path, [])
+                self._version = version
+            self._checked_at = now
+            return self._projects
+
+    def update(self, change):
+        """Save change(projects) -> new list and cache it."""
+        with self.lock:
+            self._checked_at = 0.0  # always compare against the file before a write
+            projects = change(list(self.list()))
+            save_file(self.path, projects)
+            self._projects = projects
+            self._version = file_version(self.path)
+            self._checked_at = time.monotonic()
+            return projects
+
+
+_registry = ProjectRegistry(PROJECTS_FILE)
+_data_structure_ready = False
+_data_structure_lock = threading.Lock()
+
+
 class ProjectManager:
     def __init__(self):
         self._ensure_data_structure()
 
     def _ensure_data_structure(self):
-        """Ensure data directory and projects registry exist. Handle migration."""
+        """Ensure data directory and projects registry exist (once per process). Handle migration."""
+        global _data_structure_ready
+        if _data_structure_ready:
+            return
+        with _data_structure_lock:
+            if not _data_structure_ready:
+                self._create_data_structure()
+                _data_structure_ready = True
+
+    def _create_data_structure(self):
         if not os.path.exists(DATA_DIR):
             os.makedirs(DATA_DIR)
         
@@ -35,21 +97,11 @@ class ProjectManager:
         project_id = str(uuid.uuid4())
         project_name = "Default Project"
         
-        # 1. Register Project
-        projects = [{
-            "id": project_id,
-            "name": project_name,
-            "created_at": str(uuid.uuid1())
-        }]
-        
-        with open(PROJECTS_FILE, 'w') as f:
-            json.dump(projects, f, indent=2)
-            
-        # 2. Create Project Folder
+        # 1. Create Project Folder
         project_dir = os.path.join(DATA_DIR, project_id)
         os.makedirs(project_dir)
         
-        # 3. Move Files
+        # 2. Move Files
         # We rename them to standard names: environments.json, apis.json, history.json
         if os.path.exists(LEGACY_ENV):
             shutil.move(LEGACY_ENV, os.path.join(project_dir, "environments.json"))
@@ -61,84 +113,73 @@ class ProjectManager:
         else:
             self._write_empty_json(os.path.join(project_dir, "apis.json"))
 
+        # history.json is imported into history.db when the project is first opened
         if os.path.exists(LEGACY_HISTORY):
             shutil.move(LEGACY_HISTORY, os.path.join(project_dir, "history.json"))
-        else:
-            self._write_empty_json(os.path.join(project_dir, "history.json"))
+
+        # 3. Register Project (last, so a listed project always has its files)
+        _registry.update(lambda projects: [{
+            "id": project_id,
+            "name": project_name,
+            "created_at": str(uuid.uuid1())
+        }])
             
         print(f"Migrated legacy data to project: {project_id}")
 
     def _create_default_project(self, fresh=False):
         """Create a fresh default project."""
         project_id = str(uuid.uuid4())
-        projects = [{
-            "id": project_id,
-            "name": "My First Project",
-            "created_at": str(uuid.uuid1())
-        }]
-        with open(PROJECTS_FILE, 'w') as f:
-            json.dump(projects, f, indent=2)
-            
         project_dir = os.path.join(DATA_DIR, project_id)
         os.makedirs(project_dir)
         self._init_project_files(project_dir)
+        _registry.update(lambda projects: [{
+            "id": project_id,
+            "name": "My First Project",
+            "created_at": str(uuid.uuid1())
+        }])
 
     def _init_project_files(self, project_dir):
         self._write_empty_json(os.path.join(project_dir, "environments.json"))
         self._write_empty_json(os.path.join(project_dir, "apis.json"))
-        self._write_empty_json(os.path.join(project_dir, "history.json"))
+        # Run history lives in history.db, created on first use (see history_store)
 
     def _write_empty_json(self, path):
-        with open(path, 'w') as f:
-            json.dump([], f)
+        save_file(path, [])
 
     def list_projects(self):
-        """Return list of projects."""
-        if os.path.exists(PROJECTS_FILE):
-            with open(PROJECTS_FILE, 'r') as f:
-                return json.load(f)
-        return []
+        """Return list of projects (cached registry, see ProjectRegistry)."""
+        return _registry.list()
 
     def create_project(self, name):
         """Create a new project."""
-        projects = self.list_projects()
         new_id = str(uuid.uuid4())
-        projects.append({
-            "id": new_id,
-            "name": name,
-            "created_at": str(uuid.uuid1())
-        })
-        
-        with open(PROJECTS_FILE, 'w') as f:
-            json.dump(projects, f, indent=2)
-            
         project_dir = os.path.join(DATA_DIR, new_id)
         os.makedirs(project_dir)
         self._init_project_files(project_dir)
+
+        _registry.update(lambda projects: projects + [{
+            "id": new_id,
+            "name": name,
+            "created_at": str(uuid.uuid1())
+        }])
         return new_id
     
     def delete_project(self, project_id):
         """Delete a project and its files."""
         # Remove from registry
-        projects = self.list_projects()
-        projects = [p for p in projects if p['id'] != project_id]
-        with open(PROJECTS_FILE, 'w') as f:
-            json.dump(projects, f, indent=2)
+        _registry.update(lambda projects: [p for p in projects if p['id'] != project_id])
             
         # Remove directory
+        close_history_store(self.get_project_paths(project_id)['history_db'])
         project_dir = os.path.join(DATA_DIR, project_id)
         if os.path.exists(project_dir):
             shutil.rmtree(project_dir)
             
     # Rename Project
     def rename_project(self, project_id, new_name):
-        projects = self.list_projects()
-        for p in projects:
-            if p['id'] == project_id:
-                p['name'] = new_name
-                break
-        with open(PROJECTS_FILE, 'w') as f:
-            json.dump(projects, f, indent=2)
+        _registry.update(lambda projects: [
+            {**p, "name": new_name} if p['id'] == project_id else p for p in projects
+        ])
 
     def get_project_paths(self, project_id):
         """Get file paths for a specific project."""
@@ -146,5 +187,18 @@ class ProjectManager:
         return {
             "env_file": os.path.join(project_dir, "environments.json"),
             "api_file": os.path.join(project_dir, "apis.json"),
-            "history_file": os.path.join(project_dir, "history.json")
+            "history_file": os.path.join(project_dir, "history.json"),  # legacy, migrated into history_db
+            "history_db": os.path.join(project_dir, "history.db"),
+            "cassette_dir": os.path.join(project_dir, "cassettes"),
+            "blob_dir": os.path.join(project_dir, "blobs"),
+            "report_dir": os.path.join(project_dir, "reports")
         }
+
+    def get_history_store(self, project_id):
+        """The project's run history (imports a legacy history.json on first open)."""
+        paths = self.get_project_paths(project_id)
+        store = get_history_store(paths['history_db'], paths['history_file'], paths['blob_dir'])
+        # Spilled bodies of runs that were never stored (interrupted runs, Playground requests, killed processes)
+        prune_spilled_bodies_once(paths['blob_dir'], store.spill_entries)
+        prune_spilled_bodies_once()
+        return store
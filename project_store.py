@@ -0,0 +1,107 @@
+import os
+import copy
+import threading
+import streamlit as st
+from logic import load_json_file
+
+# Session state key -> project file it is loaded from (see ProjectManager.get_project_paths)
+PROJECT_DATA_FILES = {
+    "environments": "env_file",
+    "api_templates": "api_file",
+}
+
+# Session state key listing the data keys this session has taken a private copy of
+PRIVATE_KEYS_STATE = "private_project_data"
+
+
+def file_version(path):
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+class ProjectSnapshot:
+    """One version of a project's environments and templates, shared read-only by every session."""
+    __slots__ = ('project_id', 'version', 'data')
+
+    def __init__(self, project_id, version, data):
+        self.project_id = project_id
+        self.version = version
+        self.data = data
+
+
+class ProjectStore:
+    """
+    Process-wide cache of project files, keyed by project id and reloaded when a file's mtime/size
+    changes, so concurrent sessions share one parsed copy instead of loading their own.
+    """
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, project_id, paths):
+        version = tuple(file_version(paths[f]) for f in PROJECT_DATA_FILES.values())
+        snapshot = self._snapshots.get(project_id)
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(project_id)
+            if snapshot is None or snapshot.version != version:
+                data = {key: load_json_file(paths[f]) for key, f in PROJECT_DATA_FILES.items()}
+                snapshot = ProjectSnapshot(project_id, version, data)
+                self._snapshots[project_id] = snapshot
+            return snapshot
+
+    def invalidate(self, project_id):
+        with self._lock:
+            self._snapshots.pop(project_id, None)
+
+
+_project_store = None
+_project_store_lock = threading.Lock()
+
+
+def get_project_store():
+    """Process-wide project store (shared by all Streamlit sessions)."""
+    global _project_store
+    if _project_store is None:
+        with _project_store_lock:
+            if _project_store is None:
+                _project_store = ProjectStore()
+    return _project_store
+
+
+# --- Session binding (copy-on-write) ---
+
+def bind_project_data(project_id, paths):
+    """
+    Point the session's environments/api_templates at the shared snapshot, picking up edits saved
+    by other sessions. Keys this session made private (make_private) are left alone.
+    """
+    private = st.session_state.setdefault(PRIVATE_KEYS_STATE, set())
+    snapshot = get_project_store().get(project_id, paths)
+    for key in PROJECT_DATA_FILES:
+        if key not in private:
+            st.session_state[key] = snapshot.data[key]
+
+
+def make_private(*keys):
+    """Copy shared project data into this session before it is modified in place."""
+    private = st.session_state.setdefault(PRIVATE_KEYS_STATE, set())
+    for key in keys:
+        if key not in private:
+            st.session_state[key] = copy.deepcopy(st.session_state[key])
+            private.add(key)
+
+
+def release_private(*keys):
+    """
+    Drop the session's private copies (all of them on project switch, or `keys` once saved);
+    the next bind shares the snapshot again.
+    """
+    if keys:
+        st.session_state.setdefault(PRIVATE_KEYS_STATE, set()).difference_update(keys)
+    else:
+        st.session_state[PRIVATE_KEYS_STATE] = set()
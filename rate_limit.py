@@ -0,0 +1,93 @@
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from http_client import get_env_setting
+
+# --- Defaults (overridable per environment record) ---
+DEFAULT_MAX_CONCURRENCY = 8     # requests in flight per environment per run
+DEFAULT_RATE_LIMIT_RPS = 0.0    # 0 = unlimited
+DEFAULT_RATE_LIMIT_BURST = 0    # 0 = same as rps (at least 1)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `reserve()` takes a token immediately (going into debt if needed)
+    and returns how long the caller must wait, so callers never spin.
+    """
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(env):
+    """
+    Process-wide token bucket for an environment (None when unlimited).
+    Shared by every run and every session so a backend's quota is respected globally.
+    """
+    rps = get_env_setting(env, 'rate_limit_rps', DEFAULT_RATE_LIMIT_RPS)
+    if rps <= 0:
+        return None
+    burst = get_env_setting(env, 'rate_limit_burst', DEFAULT_RATE_LIMIT_BURST) or max(1, int(rps))
+    key = (env.get('id'), rps, burst)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(rps, burst)
+            _buckets[key] = bucket
+        return bucket
+
+
+class EnvLimiter:
+    """
+    Per-run throttle for one environment: a concurrency cap plus the shared token bucket.
+    Use `slot()` from worker threads and `async_slot()` from the asyncio engine.
+    """
+    def __init__(self, env):
+        self.max_concurrency = max(1, get_env_setting(env, 'max_concurrency', DEFAULT_MAX_CONCURRENCY))
+        self.bucket = get_rate_limiter(env)
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_semaphore = None
+
+    @contextmanager
+    def slot(self):
+        with self._semaphore:
+            if self.bucket:
+                self.bucket.acquire()
+            yield
+
+    @asynccontextmanager
+    async def async_slot(self):
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._async_semaphore:
+            if self.bucket:
+                await self.bucket.acquire_async()
+            yield
@@ -0,0 +1,157 @@
+import os
+import json
+import difflib
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from response_body import SpilledBody, get_body_ref, resolve_body
+
+# Bump when the report layout changes, so cached files are rebuilt
+REPORT_VERSION = 1
+
+# Format -> (report_utils builder, file extension, MIME type)
+REPORT_FORMATS = {
+    "pdf": ("generate_pdf_report", "pdf", "application/pdf"),
+    "word": ("generate_word_report", "docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+}
+
+# Reports generated at the same time (reportlab/python-docx are CPU-bound)
+REPORT_WORKERS = int(os.environ.get("APICOMP_REPORT_WORKERS", 1))
+# Report cache used when no project report directory is given
+REPORT_DIR = os.environ.get("APICOMP_REPORT_DIR") or os.path.join(tempfile.gettempdir(), "apicomp_reports")
+
+
+# --- Similarity ---
+
+def _similarity_content(data):
+    """Response compared for similarity, without _ keys; a spilled body is read back like the diff does."""
+    ref = get_body_ref(data)
+    if ref is None:
+        return json.dumps({k:v for k,v in data.items() if not k.startswith('_')}, sort_keys=True)
+    body = resolve_body(SpilledBody(ref))
+    if body is None:
+        raise FileNotFoundError(ref['path'])
+    return json.dumps(body, sort_keys=True)
+
+
+def api_similarity(api_data):
+    """
+    Similarity (0-100) between the first two environments' responses; 100 for a consistent API only
+    (an inconsistent one tops out at 99 even when the compared text matches, e.g. differing raw bodies).
+    """
+    if api_data.get('overall_status') == "Consistent":
+        return 100
+    try:
+        env_keys = list(api_data['data_by_env'].keys())
+        if len(env_keys) >= 2:
+            ref_content = _similarity_content(api_data['data_by_env'][env_keys[0]]['data'])
+            target_content = _similarity_content(api_data['data_by_env'][env_keys[1]]['data'])
+            return min(99, int(difflib.SequenceMatcher(None, ref_content, target_content).ratio() * 100))
+    except:
+        pass
+    return 0
+
+
+def get_api_similarity(api_data):
+    """api_similarity, computed once per API and kept in the result (payloads must be loaded)."""
+    if 'similarity' not in api_data:
+        api_data['similarity'] = api_similarity(api_data)
+    return api_data['similarity']
+
+
+# --- Report cache ---
+
+def report_path(report_dir, run_id, fmt, options=None):
+    """Cache file of one report: <report_dir>/<run_id>/<format>-<options hash>.<ext>"""
+    report_dir = report_dir or REPORT_DIR
+    material = json.dumps({"format": fmt, "version": REPORT_VERSION, **(options or {})}, sort_keys=True)
+    digest = hashlib.sha1(material.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(report_dir, run_id, f"{fmt}-{digest}.{REPORT_FORMATS[fmt][1]}")
+
+
+def discard_reports(report_dir, run_id):
+    """Remove a run's cached reports (e.g. when the run is deleted)."""
+    directory = os.path.join(report_dir or REPORT_DIR, run_id)
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+def build_report_input(run, load_payloads=None):
+    """
+    Copy of the run fields the reports use, with each API's similarity.
+    Payloads are loaded into copies of the entries, so the run shown in the UI is not touched.
+    """
+    api_results = {}
+    for api_id, api_data in run['api_results'].items():
+        similarity = api_data.get('similarity')
+        if similarity is None:
+            api_copy = {**api_data, 'data_by_env': {k: dict(v) for k, v in api_data.get('data_by_env', {}).items()}}
+            if load_payloads and api_copy['overall_status'] != "Consistent":
+                load_payloads(api_copy)
+            similarity = api_similarity(api_copy)
+        api_results[api_id] = {"name": api_data['name'], "overall_status": api_data['overall_status'], "similarity": similarity}
+    report_input = {k: run.get(k) for k in ("run_id", "timestamp", "envs", "api_count", "consistent_count", "inconsistent_count", "error_count")}
+    report_input['api_results'] = api_results
+    return report_input
+
+
+class ReportJobs:
+    """
+    Builds PDF/Word reports only when asked for, on a background thread, and caches the bytes on disk
+    keyed by run id + options; the Streamlit script thread only checks the job state.
+    """
+    def __init__(self, workers=REPORT_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="report")
+        self._jobs = {}  # cache path -> Future
+        self._lock = threading.Lock()
+
+    def status(self, path):
+        """("ready", None), ("running", None), ("failed", error) or ("missing", None)."""
+        with self._lock:
+            future = self._jobs.get(path)
+        if future is not None and not future.done():
+            return "running", None
+        if os.path.exists(path):
+            return "ready", None
+        if future is not None and future.exception() is not None:
+            return "failed", future.exception()
+        return "missing", None
+
+    def request(self, run, fmt, report_dir, options=None, load_payloads=None):
+        """Start building a report unless it is cached or already being built. Returns its cache path."""
+        path = report_path(report_dir, run['run_id'], fmt, options)
+        with self._lock:
+            future = self._jobs.get(path)
+            if os.path.exists(path) or (future is not None and not future.done()):
+                return path
+            self._jobs[path] = self._executor.submit(self._build, run, fmt, path, load_payloads)
+        return path
+
+    @staticmethod
+    def _build(run, fmt, path, load_payloads):
+        import report_utils  # reportlab/python-docx are only imported when a report is built
+        report_input = build_report_input(run, load_payloads)
+        buffer = getattr(report_utils, REPORT_FORMATS[fmt][0])(report_input)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+        return path
+
+
+_report_jobs = None
+_report_jobs_lock = threading.Lock()
+
+
+def get_report_jobs():
+    """Process-wide report builder shared by all sessions."""
+    global _report_jobs
+    if _report_jobs is None:
+        with _report_jobs_lock:
+            if _report_jobs is None:
+                _report_jobs = ReportJobs()
+    return _report_jobs
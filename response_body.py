@@ -0,0 +1,198 @@
+import os
+import time
+import shutil
+import threading
+from http_client import SPILL_DIR
+from payload_codec import PayloadCodec
+from serialization import loads
+
+# Result key holding the reference to a spilled body (see http_client.BodyBuffer)
+BODY_REF_KEY = '_body_ref'
+
+# Name suffix of a shared (stored) body per payload codec: the file name tells how it was written
+SHARED_BODY_SUFFIXES = {"none": ".body", "zstd": ".body.zst", "gzip": ".body.gz"}
+
+# Spill files and run directories untouched for this long (seconds) that no stored run owns are pruned
+SPILL_MAX_AGE = float(os.environ.get("APICOMP_SPILL_MAX_AGE", 24 * 3600))
+
+
+def run_blob_dir(blob_dir, run_id):
+    """Directory that receives a run's spilled bodies: <blob_dir>/<run_id> (temp spill area by default)."""
+    return os.path.join(blob_dir or SPILL_DIR, run_id)
+
+
+def discard_run_bodies(blob_dir, run_id):
+    """Remove a run's spilled bodies (the run was deleted, or is never going to be stored)."""
+    shutil.rmtree(run_blob_dir(blob_dir, run_id), ignore_errors=True)
+
+
+def prune_spilled_bodies(blob_dir=None, keep=(), max_age=SPILL_MAX_AGE):
+    """
+    Remove entries of a spill area (run directories, stray bodies, unfinished .part files) not modified
+    for `max_age` seconds, except the run directories named in `keep` (runs in the history).
+    """
+    directory = blob_dir or SPILL_DIR
+    if not os.path.isdir(directory):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name in keep or os.path.getmtime(path) > cutoff:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        except OSError:
+            pass  # removed meanwhile, or in use
+
+
+_pruned_dirs = set()
+_pruned_lock = threading.Lock()
+
+
+def prune_spilled_bodies_once(blob_dir=None, keep=None):
+    """prune_spilled_bodies the first time a spill area is used in this process; `keep()` lists stored runs."""
+    directory = os.path.abspath(blob_dir or SPILL_DIR)
+    with _pruned_lock:
+        if directory in _pruned_dirs:
+            return
+        _pruned_dirs.add(directory)
+    prune_spilled_bodies(directory, keep() if keep else ())
+
+
+def store_spilled_body(response, blob_dir=None):
+    """
+    Move (or copy, if the transport doesn't own it) a spilled body to <blob_dir>/<sha256>.body.
+    Returns the reference stored in the result instead of the body.
+    """
+    directory = blob_dir or SPILL_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{response.sha256}.body")
+    if os.path.exists(path):
+        response.discard()
+    elif response.owns_body_file:
+        os.replace(response.body_path, path)
+    else:
+        shutil.copyfile(response.body_path, path)
+    content_type = {k.lower(): v for k, v in response.headers.items()}.get('content-type')
+    return {"path": path, "sha256": response.sha256, "size": response.size, "content_type": content_type}
+
+
+def shared_body_paths(body_dir, sha256):
+    """Where a stored run's body, shared by every run that received it, may be: one name per codec."""
+    return [os.path.join(body_dir, f"{sha256}{suffix}") for suffix in SHARED_BODY_SUFFIXES.values()]
+
+
+def find_shared_body(body_dir, sha256):
+    return next((path for path in shared_body_paths(body_dir, sha256) if os.path.exists(path)), None)
+
+
+def is_shared_body(ref, body_dir):
+    return os.path.normpath(ref['path']) in {os.path.normpath(p) for p in shared_body_paths(body_dir, ref['sha256'])}
+
+
+def shared_body_hash(name):
+    """sha256 of a shared body file name, None for anything else."""
+    for suffix in SHARED_BODY_SUFFIXES.values():
+        if name.endswith(suffix) and "." not in name[:-len(suffix)]:
+            return name[:-len(suffix)]
+    return None
+
+
+def adopt_spilled_bodies(refs, body_dir, codec=None):
+    """
+    Move spilled bodies from their run directory into the shared content-addressed area when the
+    run is stored, compressed with `codec` (see payload_codec); a body already there is kept once.
+    Refs are updated in place; emptied run directories are removed.
+    Returns the sha256 of every body now in the shared area.
+    """
+    codec_name = codec.name if codec else "none"
+    shared, run_dirs = set(), set()
+    for ref in refs:
+        source = ref.get('path')
+        if is_shared_body(ref, body_dir):
+            shared.add(ref['sha256'])
+            continue
+        target = find_shared_body(body_dir, ref['sha256'])
+        if target:
+            if os.path.exists(source):
+                os.remove(source)
+        elif os.path.exists(source):
+            os.makedirs(body_dir, exist_ok=True)
+            target = os.path.join(body_dir, f"{ref['sha256']}{SHARED_BODY_SUFFIXES[codec_name]}")
+            if codec_name == "none":
+                shutil.move(source, target)
+            else:
+                tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+                codec.compress_file(source, tmp_path)
+                os.replace(tmp_path, target)
+                os.remove(source)
+        else:
+            continue  # body file lost: the ref keeps pointing at it
+        run_dirs.add(os.path.dirname(source))
+        ref['path'] = target
+        shared.add(ref['sha256'])
+    for directory in run_dirs:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass  # still holds other bodies
+    return shared
+
+
+def remove_shared_bodies(body_dir, hashes):
+    for sha256 in hashes:
+        for path in shared_body_paths(body_dir, sha256):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def get_body_ref(data):
+    if isinstance(data, dict):
+        ref = data.get(BODY_REF_KEY)
+        if isinstance(ref, dict) and ref.get('path'):
+            return ref
+    return None
+
+
+def load_response_body(data_or_ref):
+    """Read a spilled body back: parsed JSON, or {"raw_text": ...} like parse_response; None if the file is gone."""
+    ref = get_body_ref(data_or_ref) or data_or_ref
+    path = ref.get('path') if isinstance(ref, dict) else None
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        raw = f.read()
+    if not path.endswith(SHARED_BODY_SUFFIXES["none"]):
+        # Compressed when its run was stored (the suffix names the codec); only decompressed here, when read
+        raw = PayloadCodec.decompress(raw)
+    try:
+        return loads(raw)
+    except ValueError:
+        return {"raw_text": raw.decode("utf-8", errors="replace")}
+
+
+class SpilledBody:
+    """Stands in for a spilled body in a comparison; resolved (in the diff worker) by resolve_body."""
+    __slots__ = ('ref',)
+
+    def __init__(self, ref):
+        self.ref = ref
+
+    @property
+    def size(self):
+        return self.ref.get('size') or 0
+
+
+def resolve_body(value):
+    """Load a SpilledBody, without top-level _ keys like clean_response_data; other values pass through."""
+    if isinstance(value, SpilledBody):
+        body = load_response_body(value.ref)
+        if isinstance(body, dict):
+            body = {k: v for k, v in body.items() if not (isinstance(k, str) and k.startswith('_'))}
+        return body
+    return value
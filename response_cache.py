@@ -0,0 +1,200 @@
+import time
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# --- Defaults ---
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+CACHEABLE_METHODS = ("GET",)
+
+
+def get_cache_ttl(api_template):
+    """Per-template opt-in: `cache_ttl` seconds (0/empty = caching disabled)."""
+    try:
+        return max(0.0, float(api_template.get('cache_ttl') or 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def cache_key(env, request_info):
+    """Full request identity, headers included (auth decides what a GET returns)."""
+    material = json.dumps({
+        "env": env.get('id'),
+        "url": request_info.get('url'),
+        "params": request_info.get('params'),
+        "headers": request_info.get('headers'),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU of HttpResponses bounded by entry count and total body bytes."""
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, response, ttl):
+        size = response.size
+        if response.spilled or size > self.max_bytes:
+            return
+        headers = {k.lower(): v for k, v in response.headers.items()}
+        entry = {
+            "response": response,
+            "stored_at": time.time(),
+            "ttl": ttl,
+            "etag": headers.get('etag'),
+            "last_modified": headers.get('last-modified'),
+            "size": size,
+        }
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old['size']
+            self._entries[key] = entry
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted['size']
+
+    def touch(self, key):
+        """Mark an entry fresh again after a successful 304 revalidation."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry['stored_at'] = time.time()
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+def _is_storable(response):
+    if response.status_code != 200:
+        return False
+    cache_control = {k.lower(): v for k, v in response.headers.items()}.get('cache-control', '').lower()
+    return 'no-store' not in cache_control
+
+
+class CachingTransport:
+    """
+    Serves idempotent GETs of templates with `cache_ttl` from an in-memory cache.
+    Stale entries with an ETag/Last-Modified are revalidated with If-None-Match/If-Modified-Since.
+    The outcome is recorded as request_info['cache']: hit | revalidated | miss.
+    """
+    def __init__(self, inner, cache=None):
+        self.inner = inner
+        self.cache = cache or get_response_cache()
+
+    @property
+    def session_pool(self):
+        return getattr(self.inner, 'session_pool', None)
+
+    def _lookup(self, env, api_template, request_info):
+        """(key, entry, outgoing request_info), or None when the request is not cacheable."""
+        if get_cache_ttl(api_template) <= 0 or (request_info.get('method') or '').upper() not in CACHEABLE_METHODS:
+            return None
+        key = cache_key(env, request_info)
+        entry = self.cache.get(key)
+        outgoing = request_info
+        if entry and (entry['etag'] or entry['last_modified']):
+            conditional = dict(request_info.get('headers') or {})
+            if entry['etag']:
+                conditional['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                conditional['If-Modified-Since'] = entry['last_modified']
+            outgoing = {**request_info, "headers": conditional}
+        return key, entry, outgoing
+
+    @staticmethod
+    def _is_fresh(entry):
+        return entry is not None and time.time() - entry['stored_at'] < entry['ttl']
+
+    @staticmethod
+    def _copy_attempts(request_info, outgoing):
+        # Inner transports record into the dict they are given (e.g. RetryingTransport's attempts)
+        if outgoing is not request_info and 'attempts' in outgoing:
+            request_info['attempts'] = outgoing['attempts']
+
+    def _complete(self, api_template, request_info, key, entry, response):
+        if entry and response.status_code == 304:
+            self.cache.touch(key)
+            request_info['cache'] = "revalidated"
+            return entry['response']
+
+        if _is_storable(response):
+            self.cache.put(key, response, get_cache_ttl(api_template))
+        request_info['cache'] = "miss"
+        return response
+
+    def send(self, env, api_template, request_info, limiter=None):
+        lookup = self._lookup(env, api_template, request_info)
+        if lookup is None:
+            return self.inner.send(env, api_template, request_info, limiter=limiter)
+
+        key, entry, outgoing = lookup
+        if self._is_fresh(entry):
+            request_info['cache'] = "hit"
+            return entry['response']
+
+        try:
+            response = self.inner.send(env, api_template, outgoing, limiter=limiter)
+        finally:
+            self._copy_attempts(request_info, outgoing)
+        return self._complete(api_template, request_info, key, entry, response)
+
+
+class AsyncCachingTransport(CachingTransport):
+    """CachingTransport for async transports (async_engine), sharing the same process-wide cache."""
+    async def open(self):
+        await self.inner.open()
+
+    async def close(self):
+        await self.inner.close()
+
+    async def send(self, env, api_template, request_info, limiter=None):
+        lookup = self._lookup(env, api_template, request_info)
+        if lookup is None:
+            return await self.inner.send(env, api_template, request_info, limiter=limiter)
+
+        key, entry, outgoing = lookup
+        if self._is_fresh(entry):
+            request_info['cache'] = "hit"
+            return entry['response']
+
+        try:
+            response = await self.inner.send(env, api_template, outgoing, limiter=limiter)
+        finally:
+            self._copy_attempts(request_info, outgoing)
+        return self._complete(api_template, request_info, key, entry, response)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide cache so Dashboard reruns and new sessions benefit from earlier runs."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
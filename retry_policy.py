@@ -0,0 +1,283 @@
+import sys
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
+
+# --- Defaults (a policy is merged: defaults <- environment 'retry' <- template 'retry') ---
+DEFAULT_RETRY_POLICY = {
+    "max_attempts": 1,                      # 1 = no retry
+    "backoff_base": 0.5,                    # seconds, doubled per attempt
+    "backoff_max": 8.0,
+    "jitter": True,                         # full jitter: sleep uniform(0, backoff)
+    "retry_on_status": [429, 502, 503, 504],
+    "retry_on_exceptions": ["timeout", "connection"],
+    "hedge": False,                         # fire a duplicate request when the first one is slow
+    "hedge_after_ms": None,                 # fixed threshold; default = observed p95 latency
+    "hedge_percentile": 0.95,
+    "hedge_min_samples": 20,                # p95 is only trusted after this many observations
+    "hedge_methods": ["GET", "HEAD", "OPTIONS"],
+}
+
+LATENCY_WINDOW = 200
+HEDGE_WORKERS = 32
+
+
+def get_retry_policy(env, api_template):
+    policy = dict(DEFAULT_RETRY_POLICY)
+    for source in (env or {}, api_template or {}):
+        overrides = source.get('retry')
+        if isinstance(overrides, dict):
+            policy.update({k: v for k, v in overrides.items() if v is not None})
+    policy['max_attempts'] = max(1, int(policy.get('max_attempts') or 1))
+    return policy
+
+
+def classify_exception(exc):
+    if isinstance(exc, (requests.exceptions.Timeout, TimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(exc, (requests.exceptions.ConnectionError, ConnectionError)):
+        return "connection"
+    # aiohttp is optional: only its own errors can come from it, so it is only consulted once loaded
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is not None and isinstance(exc, aiohttp.ClientConnectionError):
+        return "connection"
+    return type(exc).__name__
+
+
+def discard_response(future):
+    """Done-callback for a request that lost a hedge race: free its spilled body, if any."""
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].discard()
+
+
+def backoff_delay(policy, attempt):
+    """Exponential backoff for the given (1-based) attempt that just failed."""
+    delay = min(float(policy['backoff_max']), float(policy['backoff_base']) * (2 ** (attempt - 1)))
+    if policy.get('jitter'):
+        delay = random.uniform(0, delay)
+    return delay
+
+
+class LatencyTracker:
+    """Rolling latency window per (environment, template), used to derive the hedge threshold."""
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key, elapsed_ms):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(elapsed_ms)
+
+    def percentile(self, key, pct, min_samples):
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+
+def hedge_threshold_ms(latency, policy, latency_key):
+    """When to fire the hedge: the fixed `hedge_after_ms`, else the observed percentile (None until enough samples)."""
+    if policy.get('hedge_after_ms'):
+        return float(policy['hedge_after_ms'])
+    return latency.percentile(latency_key, float(policy['hedge_percentile']), int(policy['hedge_min_samples']))
+
+
+_latency_tracker = None
+_latency_tracker_lock = threading.Lock()
+
+
+def get_latency_tracker():
+    """Process-wide latencies, so hedge thresholds carry over between runs and engines."""
+    global _latency_tracker
+    if _latency_tracker is None:
+        with _latency_tracker_lock:
+            if _latency_tracker is None:
+                _latency_tracker = LatencyTracker()
+    return _latency_tracker
+
+
+class RetryingTransport:
+    """
+    Retries retriable failures with exponential backoff + jitter and optionally hedges slow requests.
+    Every attempt is recorded in request_info['attempts'] so the run result shows what happened.
+    A given `limiter` (rate_limit.EnvLimiter) is taken for each attempt and each hedge, not held across backoff.
+    """
+    def __init__(self, inner, latency_tracker=None):
+        self.inner = inner
+        self.latency = latency_tracker or get_latency_tracker()
+        self._hedge_executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def session_pool(self):
+        return getattr(self.inner, 'session_pool', None)
+
+    def _executor(self):
+        if self._hedge_executor is None:
+            with self._lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return self._hedge_executor
+
+    def _timed_send(self, env, api_template, request_info, limiter=None):
+        with (limiter.slot() if limiter else nullcontext()):
+            started = time.monotonic()
+            response = self.inner.send(env, api_template, request_info)
+            return response, int((time.monotonic() - started) * 1000)
+
+    def _send_once(self, env, api_template, request_info, policy, latency_key, record, limiter=None):
+        """One logical attempt: a plain send, or a hedged pair taking whichever answers first."""
+        method = (request_info.get('method') or '').upper()
+        threshold = None
+        if policy.get('hedge') and method in [m.upper() for m in policy['hedge_methods']]:
+            threshold = hedge_threshold_ms(self.latency, policy, latency_key)
+        if threshold is None:
+            response, elapsed = self._timed_send(env, api_template, request_info, limiter)
+            self.latency.observe(latency_key, elapsed)
+            return response
+
+        executor = self._executor()
+        primary = executor.submit(self._timed_send, env, api_template, request_info, limiter)
+        done, _ = wait([primary], timeout=threshold / 1000.0)
+        if done:
+            response, elapsed = primary.result()
+            self.latency.observe(latency_key, elapsed)
+            return response
+
+        record['hedged'] = True
+        hedge = executor.submit(self._timed_send, env, api_template, request_info, limiter)
+        racing = {primary: "primary", hedge: "hedge"}
+        last_error = None
+        while racing:
+            done, _ = wait(list(racing), return_when=FIRST_COMPLETED)
+            for future in done:
+                winner = racing.pop(future)
+                try:
+                    response, elapsed = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self.latency.observe(latency_key, elapsed)
+                record['winner'] = winner
+                for loser in racing:
+                    loser.add_done_callback(discard_response)
+                return response
+        raise last_error
+
+    def send(self, env, api_template, request_info, limiter=None):
+        policy = get_retry_policy(env, api_template)
+        latency_key = ((env or {}).get('id'), (api_template or {}).get('id'))
+        attempts = request_info.setdefault('attempts', [])
+        retry_status = set(int(s) for s in policy['retry_on_status'])
+        retry_exceptions = set(policy['retry_on_exceptions'])
+
+        for attempt in range(1, policy['max_attempts'] + 1):
+            record = {"attempt": attempt}
+            attempts.append(record)
+            started = time.monotonic()
+            try:
+                response = self._send_once(env, api_template, request_info, policy, latency_key, record, limiter)
+            except Exception as e:
+                record['error'] = str(e)
+                record['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+                if attempt >= policy['max_attempts'] or classify_exception(e) not in retry_exceptions:
+                    raise
+            else:
+                record['status'] = response.status_code
+                record['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+                if attempt >= policy['max_attempts'] or response.status_code not in retry_status:
+                    return response
+                response.discard()
+            time.sleep(backoff_delay(policy, attempt))
+
+
+class AsyncRetryingTransport:
+    """
+    RetryingTransport for async transports (async_engine): same policy and attempt records,
+    backoff on the event loop, and a hedge that cancels the slower request.
+    The limiter is passed to the inner transport, which takes its async slot per request.
+    """
+    def __init__(self, inner, latency_tracker=None):
+        self.inner = inner
+        self.latency = latency_tracker or get_latency_tracker()
+
+    async def open(self):
+        await self.inner.open()
+
+    async def close(self):
+        await self.inner.close()
+
+    async def _timed_send(self, env, api_template, request_info, limiter=None):
+        started = time.monotonic()
+        response = await self.inner.send(env, api_template, request_info, limiter=limiter)
+        return response, int((time.monotonic() - started) * 1000)
+
+    async def _send_once(self, env, api_template, request_info, policy, latency_key, record, limiter=None):
+        method = (request_info.get('method') or '').upper()
+        threshold = None
+        if policy.get('hedge') and method in [m.upper() for m in policy['hedge_methods']]:
+            threshold = hedge_threshold_ms(self.latency, policy, latency_key)
+        if threshold is None:
+            response, elapsed = await self._timed_send(env, api_template, request_info, limiter)
+            self.latency.observe(latency_key, elapsed)
+            return response
+
+        primary = asyncio.ensure_future(self._timed_send(env, api_template, request_info, limiter))
+        racing = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait([primary], timeout=threshold / 1000.0)
+            if not done:
+                record['hedged'] = True
+                racing[asyncio.ensure_future(self._timed_send(env, api_template, request_info, limiter))] = "hedge"
+            last_error = None
+            while racing:
+                done, _ = await asyncio.wait(list(racing), return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    winner = racing.pop(future)
+                    try:
+                        response, elapsed = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    self.latency.observe(latency_key, elapsed)
+                    if record.get('hedged'):
+                        record['winner'] = winner
+                    return response
+            raise last_error
+        finally:
+            for loser in racing:
+                loser.add_done_callback(discard_response)
+                loser.cancel()
+
+    async def send(self, env, api_template, request_info, limiter=None):
+        policy = get_retry_policy(env, api_template)
+        latency_key = ((env or {}).get('id'), (api_template or {}).get('id'))
+        attempts = request_info.setdefault('attempts', [])
+        retry_status = set(int(s) for s in policy['retry_on_status'])
+        retry_exceptions = set(policy['retry_on_exceptions'])
+
+        for attempt in range(1, policy['max_attempts'] + 1):
+            record = {"attempt": attempt}
+            attempts.append(record)
+            started = time.monotonic()
+            try:
+                response = await self._send_once(env, api_template, request_info, policy, latency_key, record, limiter)
+            except Exception as e:
+                record['error'] = str(e) or type(e).__name__
+                record['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+                if attempt >= policy['max_attempts'] or classify_exception(e) not in retry_exceptions:
+                    raise
+            else:
+                record['status'] = response.status_code
+                record['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+                if attempt >= policy['max_attempts'] or response.status_code not in retry_status:
+                    return response
+                response.discard()
+            await asyncio.sleep(backoff_delay(policy, attempt))
@@ -0,0 +1,88 @@
+import os
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# --- Settings (overridable through environment variables) ---
+# "orjson" (optional package, used when installed) or "json" (stdlib)
+JSON_BACKEND = os.environ.get("APICOMP_JSON_BACKEND") or ("orjson" if orjson else "json")
+
+# Set types DeepDiff puts in its results (orderly_set / older deepdiff releases)
+SET_TYPE_NAMES = {"SetOrdered", "OrderedSet", "PrettyOrderedSet"}
+
+
+def json_default(obj):
+    """
+    Fallback for values JSON has no type for: sets (DeepDiff's included) become lists,
+    anything else its str() like the old `default=str`. Replaces the recursive make_serializable copy.
+    """
+    if isinstance(obj, (set, frozenset)) or type(obj).__name__ in SET_TYPE_NAMES:
+        return list(obj)
+    return str(obj)
+
+
+def _use_orjson():
+    return orjson is not None and JSON_BACKEND == "orjson"
+
+
+def dumps_bytes(obj, pretty=False, sort_keys=False):
+    """UTF-8 JSON (non-ASCII kept as is). `pretty` = 2-space indent for files people read or edit."""
+    if _use_orjson():
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=json_default, option=option)
+        except (orjson.JSONEncodeError, TypeError):
+            pass  # e.g. integers over 64 bits: let the stdlib encoder handle it
+    return json.dumps(
+        obj, default=json_default, ensure_ascii=False, sort_keys=sort_keys,
+        indent=2 if pretty else None, separators=None if pretty else (",", ":")
+    ).encode("utf-8")
+
+
+def dumps(obj, pretty=False, sort_keys=False):
+    return dumps_bytes(obj, pretty, sort_keys).decode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from str or bytes."""
+    if _use_orjson():
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # NaN/Infinity and other stdlib-only extensions
+    return json.loads(data)
+
+
+def load_file(path, default=None):
+    """Parsed JSON file; `default` when the file is missing or not valid JSON."""
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        return loads(raw)
+    except ValueError:
+        return default
+
+
+def save_file(path, data, pretty=True):
+    """
+    Write `data` as JSON. Use pretty=False for machine-only files.
+    Written to a temp file then renamed over `path`, so readers never see a half-written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(dumps_bytes(data, pretty))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
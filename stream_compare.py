@@ -0,0 +1,449 @@
+import re
+import codecs
+from json.decoder import scanstring, JSONDecodeError
+from diff_engine import run_deepdiff
+from fingerprint import parse_ignore_path
+from http_client import STREAM_CHUNK_BYTES
+from response_body import SpilledBody
+
+# --- Settings (per template: `comparator` and `max_diffs`) ---
+COMPARATORS = ["deepdiff", "stream"]
+DEFAULT_STREAM_MAX_DIFFS = 10
+
+_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+_WHITESPACE = ' \t\n\r'
+_LITERALS = (('true', True), ('false', False), ('null', None))
+
+
+def get_comparator(api_tpl):
+    comparator = api_tpl.get('comparator')
+    comparator = comparator.strip().lower() if isinstance(comparator, str) else ""
+    return comparator if comparator in COMPARATORS else "deepdiff"
+
+
+def get_max_diffs(api_tpl):
+    try:
+        return max(1, int(api_tpl.get('max_diffs') or DEFAULT_STREAM_MAX_DIFFS))
+    except (TypeError, ValueError):
+        return DEFAULT_STREAM_MAX_DIFFS
+
+
+# --- Event Sources ---
+# Events: ('start_map'|'end_map'|'start_array'|'end_array', None), ('map_key', key), ('scalar', value)
+
+class JsonTokenizer:
+    """Incremental JSON parser over a binary stream: yields events while reading fixed-size chunks."""
+    def __init__(self, stream, chunk_size=STREAM_CHUNK_BYTES):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _more(self):
+        if self._eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buf += self._decoder.decode(b'', final=True)
+        else:
+            self._buf += self._decoder.decode(chunk)
+        return True
+
+    def _peek_char(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                return ''
+
+    def _string(self):
+        search = self._pos + 1
+        while True:
+            end = self._buf.find('"', search)
+            if end == -1:
+                search = len(self._buf)
+                if not self._more():
+                    raise ValueError("Unterminated string in JSON stream")
+                continue
+            backslashes = 0
+            while self._buf[end - 1 - backslashes] == '\\':
+                backslashes += 1
+            if backslashes % 2:
+                search = end + 1
+                continue
+            try:
+                value, self._pos = scanstring(self._buf, self._pos + 1)
+            except JSONDecodeError as e:
+                raise ValueError(str(e))
+            return value
+
+    def _number(self):
+        # Read ahead so a number split across chunks ("1." + "5", "2e" + "+3") is matched whole
+        while len(self._buf) - self._pos < 32 and self._more():
+            pass
+        match = _NUMBER.match(self._buf, self._pos)
+        while match and len(self._buf) - match.end() < 3 and self._more():
+            match = _NUMBER.match(self._buf, self._pos)
+        if not match:
+            raise ValueError(f"Invalid JSON at: {self._buf[self._pos:self._pos + 20]!r}")
+        self._pos = match.end()
+        text = match.group(0)
+        return float(text) if match.group(1) or match.group(2) else int(text)
+
+    def _literal(self):
+        while len(self._buf) - self._pos < 5 and self._more():
+            pass
+        for text, value in _LITERALS:
+            if self._buf.startswith(text, self._pos):
+                self._pos += len(text)
+                return value
+        raise ValueError(f"Invalid JSON at: {self._buf[self._pos:self._pos + 20]!r}")
+
+    def __iter__(self):
+        stack = []
+        expect_key = False
+        while True:
+            if self._pos > self.chunk_size:
+                self._buf = self._buf[self._pos:]
+                self._pos = 0
+            c = self._peek_char()
+            if c == '':
+                if stack:
+                    raise ValueError("Unexpected end of JSON stream")
+                return
+            if c in ',:':
+                self._pos += 1
+                continue
+            if c == '{':
+                self._pos += 1
+                stack.append('map')
+                expect_key = True
+                yield ('start_map', None)
+                continue
+            if c == '[':
+                self._pos += 1
+                stack.append('array')
+                expect_key = False
+                yield ('start_array', None)
+                continue
+            if c in '}]':
+                self._pos += 1
+                if not stack or stack.pop() != ('map' if c == '}' else 'array'):
+                    raise ValueError(f"Unbalanced {c!r} in JSON stream")
+                event = ('end_map', None) if c == '}' else ('end_array', None)
+            elif c == '"':
+                value = self._string()
+                if expect_key:
+                    expect_key = False
+                    yield ('map_key', value)
+                    continue
+                event = ('scalar', value)
+            elif c in '-0123456789':
+                event = ('scalar', self._number())
+            else:
+                event = ('scalar', self._literal())
+            expect_key = bool(stack) and stack[-1] == 'map'
+            yield event
+
+
+def iter_object_events(obj):
+    """The same events for an already parsed value."""
+    if isinstance(obj, dict):
+        yield ('start_map', None)
+        for key, value in obj.items():
+            yield ('map_key', key)
+            yield from iter_object_events(value)
+        yield ('end_map', None)
+    elif isinstance(obj, list):
+        yield ('start_array', None)
+        for item in obj:
+            yield from iter_object_events(item)
+        yield ('end_array', None)
+    else:
+        yield ('scalar', obj)
+
+
+def _without_debug_keys(events):
+    """Drop top-level keys starting with _ (debug/status), as clean_response_data does for parsed bodies."""
+    depth = 0
+    skipping = None
+    for event in events:
+        kind = event[0]
+        if skipping is not None:
+            # Depth inside the skipped value: back to 0 once it is complete
+            if kind in ('start_map', 'start_array'):
+                skipping += 1
+            elif kind in ('end_map', 'end_array'):
+                skipping -= 1
+            if skipping == 0:
+                skipping = None
+            continue
+        if depth == 1 and kind == 'map_key' and isinstance(event[1], str) and event[1].startswith('_'):
+            skipping = 0
+            continue
+        if kind in ('start_map', 'start_array'):
+            depth += 1
+        elif kind in ('end_map', 'end_array'):
+            depth -= 1
+        yield event
+
+
+class _Events:
+    def __init__(self, events):
+        self._it = iter(events)
+        self._peeked = None
+
+    def peek(self):
+        if self._peeked is None:
+            self._peeked = next(self._it, ('eof', None))
+        return self._peeked
+
+    def next(self):
+        event = self.peek()
+        self._peeked = None
+        return event
+
+
+# --- Lockstep Comparison ---
+
+_NO_DETAIL = object()
+
+
+class _StopComparison(Exception):
+    pass
+
+
+class _DiffCollector:
+    """DeepDiff-shaped report that stops the comparison once `max_diffs` differences are recorded."""
+    def __init__(self, max_diffs):
+        self.max_diffs = max_diffs
+        self.count = 0
+        self.report = {}
+
+    def add(self, category, path, detail=_NO_DETAIL):
+        if detail is _NO_DETAIL:
+            self.report.setdefault(category, []).append(path)
+        else:
+            self.report.setdefault(category, {})[path] = detail
+        self.count += 1
+        if self.count >= self.max_diffs:
+            raise _StopComparison()
+
+
+def _child_path(path, key):
+    return f"{path}[{key!r}]"
+
+
+def _skip(first, events):
+    if first[0] not in ('start_map', 'start_array'):
+        return
+    depth = 1
+    while depth:
+        kind = events.next()[0]
+        if kind in ('start_map', 'start_array'):
+            depth += 1
+        elif kind in ('end_map', 'end_array'):
+            depth -= 1
+        elif kind == 'eof':
+            raise ValueError("Unexpected end of JSON stream")
+
+
+def _build(first, events):
+    kind, value = first
+    if kind == 'scalar':
+        return value
+    if kind == 'start_map':
+        obj = {}
+        while True:
+            kind, key = events.next()
+            if kind == 'end_map':
+                return obj
+            if kind != 'map_key':
+                raise ValueError("Malformed JSON object in stream")
+            obj[key] = _build(events.next(), events)
+    if kind == 'start_array':
+        items = []
+        while events.peek()[0] != 'end_array':
+            if events.peek()[0] == 'eof':
+                raise ValueError("Unexpected end of JSON stream")
+            items.append(_build(events.next(), events))
+        events.next()
+        return items
+    raise ValueError(f"Unexpected {kind} in JSON stream")
+
+
+def _placeholder(first):
+    """Containers are reported by type only, so a type change never materializes a large subtree."""
+    return {'start_map': "{...}", 'start_array': "[...]"}.get(first[0], first[1])
+
+
+def _report_scalar(diff, path, old, new):
+    if type(old) is not type(new):
+        diff.add('type_changes', path, {
+            "old_type": type(old).__name__, "new_type": type(new).__name__,
+            "old_value": old, "new_value": new
+        })
+    elif old != new:
+        diff.add('values_changed', path, {"new_value": new, "old_value": old})
+
+
+class LockstepComparator:
+    """
+    Walks two event streams side by side and records differences in DeepDiff's report shape,
+    stopping after `max_diffs`. Objects whose keys diverge in order are compared by key
+    (only the rest of that object is buffered).
+    """
+    def __init__(self, max_diffs=DEFAULT_STREAM_MAX_DIFFS, exclude_paths=()):
+        self.max_diffs = max_diffs
+        self.exclude = set(exclude_paths)
+
+    def compare(self, left_events, right_events):
+        diff = _DiffCollector(self.max_diffs)
+        left, right = _Events(left_events), _Events(right_events)
+        stopped = False
+        try:
+            self._value(left.next(), right.next(), left, right, "root", (), diff)
+        except _StopComparison:
+            stopped = True
+        if not diff.report:
+            return None
+        diff.report['stream_compare'] = {"max_differences": self.max_diffs, "stopped_early": stopped}
+        return diff.report
+
+    def _value(self, lfirst, rfirst, left, right, path, steps, diff):
+        if steps in self.exclude:
+            _skip(lfirst, left)
+            _skip(rfirst, right)
+            return
+        lkind, rkind = lfirst[0], rfirst[0]
+        if 'eof' in (lkind, rkind) or 'map_key' in (lkind, rkind):
+            raise ValueError("Malformed JSON stream")
+        if lkind == rkind == 'start_map':
+            self._map(left, right, path, steps, diff)
+        elif lkind == rkind == 'start_array':
+            self._array(left, right, path, steps, diff)
+        elif lkind == rkind == 'scalar':
+            _report_scalar(diff, path, lfirst[1], rfirst[1])
+        else:
+            _skip(lfirst, left)
+            _skip(rfirst, right)
+            diff.add('type_changes', path, {
+                "old_type": {'start_map': 'dict', 'start_array': 'list'}.get(lkind, type(lfirst[1]).__name__),
+                "new_type": {'start_map': 'dict', 'start_array': 'list'}.get(rkind, type(rfirst[1]).__name__),
+                "old_value": _placeholder(lfirst), "new_value": _placeholder(rfirst)
+            })
+
+    def _map(self, left, right, path, steps, diff):
+        while True:
+            lev, rev = left.next(), right.next()
+            if lev[0] == rev[0] == 'end_map':
+                return
+            if lev[0] == rev[0] == 'map_key' and lev[1] == rev[1]:
+                key = lev[1]
+                self._value(left.next(), right.next(), left, right, _child_path(path, key), steps + (key,), diff)
+                continue
+            # Keys diverge: buffer the rest of this object on both sides and compare it by key
+            self._objects(self._rest_of_map(lev, left), self._rest_of_map(rev, right), path, steps, diff)
+            return
+
+    @staticmethod
+    def _rest_of_map(event, events):
+        rest = {}
+        while event[0] != 'end_map':
+            if event[0] != 'map_key':
+                raise ValueError("Malformed JSON object in stream")
+            rest[event[1]] = _build(events.next(), events)
+            event = events.next()
+        return rest
+
+    def _array(self, left, right, path, steps, diff):
+        index = 0
+        while True:
+            lkind, rkind = left.peek()[0], right.peek()[0]
+            if lkind == rkind == 'end_array':
+                left.next(), right.next()
+                return
+            child, child_steps = f"{path}[{index}]", steps + (index,)
+            if lkind == 'end_array':
+                if child_steps not in self.exclude:
+                    diff.add('iterable_item_added', child, _build(right.next(), right))
+                else:
+                    _skip(right.next(), right)
+            elif rkind == 'end_array':
+                if child_steps not in self.exclude:
+                    diff.add('iterable_item_removed', child, _build(left.next(), left))
+                else:
+                    _skip(left.next(), left)
+            else:
+                self._value(left.next(), right.next(), left, right, child, child_steps, diff)
+            index += 1
+
+    def _objects(self, old, new, path, steps, diff):
+        """In-memory comparison for the buffered parts (same report, same limit)."""
+        if steps in self.exclude:
+            return
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old:
+                if key not in new and steps + (key,) not in self.exclude:
+                    diff.add('dictionary_item_removed', _child_path(path, key))
+            for key in new:
+                if key not in old and steps + (key,) not in self.exclude:
+                    diff.add('dictionary_item_added', _child_path(path, key))
+            for key in old:
+                if key in new:
+                    self._objects(old[key], new[key], _child_path(path, key), steps + (key,), diff)
+        elif isinstance(old, list) and isinstance(new, list):
+            for index in range(max(len(old), len(new))):
+                child, child_steps = f"{path}[{index}]", steps + (index,)
+                if index >= len(old):
+                    if child_steps not in self.exclude:
+                        diff.add('iterable_item_added', child, new[index])
+                elif index >= len(new):
+                    if child_steps not in self.exclude:
+                        diff.add('iterable_item_removed', child, old[index])
+                else:
+                    self._objects(old[index], new[index], child, child_steps, diff)
+        elif isinstance(old, (dict, list)) or isinstance(new, (dict, list)):
+            diff.add('type_changes', path, {
+                "old_type": type(old).__name__, "new_type": type(new).__name__,
+                "old_value": "{...}" if isinstance(old, dict) else "[...]" if isinstance(old, list) else old,
+                "new_value": "{...}" if isinstance(new, dict) else "[...]" if isinstance(new, list) else new
+            })
+        else:
+            _report_scalar(diff, path, old, new)
+
+
+def _open_events(value, files):
+    if isinstance(value, SpilledBody):
+        f = open(value.ref['path'], 'rb')
+        files.append(f)
+        return _without_debug_keys(JsonTokenizer(f))
+    return iter_object_events(value)
+
+
+def run_stream_compare(clean_ref, clean_target, diff_options):
+    """
+    Comparator for templates with `comparator: "stream"`, runnable in a diff worker.
+    Spilled bodies are parsed incrementally from disk; DeepDiff is used instead when the template
+    needs order-insensitive or pattern-based excludes, or when a body isn't valid JSON.
+    """
+    deepdiff_options = {k: v for k, v in diff_options.items() if k in ('ignore_order', 'exclude_paths')}
+    exclude = [parse_ignore_path(p) for p in diff_options.get('exclude_paths') or []]
+    if diff_options.get('ignore_order') or any(p is None for p in exclude):
+        return run_deepdiff(clean_ref, clean_target, deepdiff_options)
+
+    comparator = LockstepComparator(diff_options.get('max_diffs', DEFAULT_STREAM_MAX_DIFFS), exclude)
+    files = []
+    try:
+        return comparator.compare(_open_events(clean_ref, files), _open_events(clean_target, files))
+    except (ValueError, OSError) as e:
+        print(f"Stream comparison fell back to DeepDiff: {e}")
+        return run_deepdiff(clean_ref, clean_target, deepdiff_options)
+    finally:
+        for f in files:
+            f.close()
@@ -0,0 +1,173 @@
+import re
+import json
+import copy
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# regex for {{var}}, permissive on characters between curly braces
+TEMPLATE_VAR_PATTERN = re.compile(r'\{\{\s*([^\}]+?)\s*\}\}')
+
+COMPILED_TEMPLATE_CACHE_SIZE = 2048
+
+
+# --- Render Plans ---
+# A plan renders one value by slot substitution only; the regex runs once, at compile time.
+
+class StaticPlan:
+    """A value without any {{var}}: rendering returns it as-is."""
+    __slots__ = ('value',)
+    refs = frozenset()
+
+    def __init__(self, value):
+        self.value = value
+
+    def render(self, context, used_keys=None):
+        return self.value
+
+
+class StringPlan:
+    """
+    A string split into static segments and variable slots.
+    Missing variables keep their raw `{{ name }}` text, exactly like render_template_string.
+    """
+    __slots__ = ('parts', 'refs')
+
+    def __init__(self, parts):
+        self.parts = parts  # [(text, None)] static or [(raw_match, var_name)] slot
+        self.refs = frozenset(name for _, name in parts if name is not None)
+
+    def render(self, context, used_keys=None):
+        out = []
+        for text, name in self.parts:
+            if name is None:
+                out.append(text)
+            elif name in context:
+                if used_keys is not None:
+                    used_keys.add(name)
+                out.append(str(context.get(name)))
+            else:
+                out.append(text)
+        return "".join(out)
+
+
+class ListPlan:
+    __slots__ = ('items', 'refs')
+
+    def __init__(self, items):
+        self.items = items
+        self.refs = frozenset().union(*(p.refs for p in items)) if items else frozenset()
+
+    def render(self, context, used_keys=None):
+        return [p.render(context, used_keys) for p in self.items]
+
+
+class DictPlan:
+    __slots__ = ('items', 'refs')
+
+    def __init__(self, items):
+        self.items = items  # [(key, plan)]
+        self.refs = frozenset().union(*(p.refs for _, p in items)) if items else frozenset()
+
+    def render(self, context, used_keys=None):
+        return {k: p.render(context, used_keys) for k, p in self.items}
+
+
+@lru_cache(maxsize=8192)
+def compile_string(template_str):
+    parts = []
+    pos = 0
+    for match in TEMPLATE_VAR_PATTERN.finditer(template_str):
+        if match.start() > pos:
+            parts.append((template_str[pos:match.start()], None))
+        parts.append((match.group(0), match.group(1).strip()))
+        pos = match.end()
+    if not parts:
+        return StaticPlan(template_str)
+    if pos < len(template_str):
+        parts.append((template_str[pos:], None))
+    return StringPlan(parts)
+
+
+def compile_obj(obj):
+    """Compile a str/dict/list structure (values only, like render_template_obj) into a render plan."""
+    if isinstance(obj, str):
+        return compile_string(obj)
+    if isinstance(obj, list):
+        items = [compile_obj(item) for item in obj]
+        if all(isinstance(p, StaticPlan) for p in items):
+            return StaticPlan(copy.deepcopy(obj))
+        return ListPlan(items)
+    if isinstance(obj, dict):
+        items = [(k, compile_obj(v)) for k, v in obj.items()]
+        if all(isinstance(p, StaticPlan) for _, p in items):
+            return StaticPlan(copy.deepcopy(obj))
+        return DictPlan(items)
+    return StaticPlan(obj)
+
+
+# --- Compiled API Templates ---
+
+def _parse_json_field(value, empty):
+    if isinstance(value, str):
+        try: return json.loads(value) if value.strip() else empty
+        except: return empty
+    return value
+
+
+class CompiledTemplate:
+    """
+    Pre-parsed render plan for one API template: path, headers, params and json_body,
+    plus the set of variable names it references.
+    """
+    def __init__(self, api_template):
+        rel_path = api_template.get('relative_path', '')
+        # A non-string path is kept so rendering fails the same way it always has
+        self.path_plan = compile_string(rel_path.lstrip('/')) if isinstance(rel_path, str) else None
+
+        api_headers = api_template.get('headers', {})
+        if isinstance(api_headers, str):
+            try: api_headers = json.loads(api_headers)
+            except: api_headers = {}
+        self.headers_plan = compile_obj(api_headers)
+
+        self.params_plan = compile_obj(_parse_json_field(api_template.get('params'), None))
+
+        json_body = _parse_json_field(api_template.get('json_body'), None)
+        if json_body is None: json_body = {}
+        self.body_plan = compile_obj(json_body)
+
+        self.refs = frozenset().union(
+            self.path_plan.refs if self.path_plan else frozenset(),
+            self.headers_plan.refs, self.params_plan.refs, self.body_plan.refs
+        )
+
+    def render_path(self, context, used_keys=None):
+        if self.path_plan is None:
+            raise TypeError("relative_path must be a string")
+        return self.path_plan.render(context, used_keys)
+
+
+_compiled_templates = OrderedDict()  # id(template) -> (template, CompiledTemplate)
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_template(api_template):
+    """
+    Compile once per template object. Template edits replace the dict (project files are reloaded,
+    the editors build new rows), so identity stands for the version; the cache keeps a reference to
+    each template so its id cannot be reused by another dict while the entry lives.
+    """
+    key = id(api_template)
+    with _compiled_lock:
+        entry = _compiled_templates.get(key)
+        if entry is not None and entry[0] is api_template:
+            _compiled_templates.move_to_end(key)
+            return entry[1]
+    compiled = CompiledTemplate(api_template)
+    with _compiled_lock:
+        _compiled_templates[key] = (api_template, compiled)
+        _compiled_templates.move_to_end(key)
+        while len(_compiled_templates) > COMPILED_TEMPLATE_CACHE_SIZE:
+            _compiled_templates.popitem(last=False)
+    return compiled
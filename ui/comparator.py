@@ -1,40 +1,81 @@
 import streamlit as st
 import pandas as pd
 import json
-import difflib
 import time
 import uuid
 from logic import execute_comparison_run, save_json_file
+from response_body import get_body_ref, load_response_body
+from async_engine import ASYNC_TRANSPORTS
+from cassette import TRANSPORT_MODES, build_transport
+from project_store import make_private, release_private
 from .common import generate_side_by_side_html
-from report_utils import generate_pdf_report, generate_word_report
+from report_jobs import REPORT_FORMATS, get_report_jobs, report_path, get_api_similarity
 
-@st.cache_data(show_spinner=False)
-def calculate_api_similarity(api_data):
-    """Cached calculation of similarity between two environments' data."""
-    try:
-        env_keys = list(api_data['data_by_env'].keys())
-        if len(env_keys) >= 2:
-            ref_content = json.dumps({k:v for k,v in api_data['data_by_env'][env_keys[0]]['data'].items() if not k.startswith('_')}, sort_keys=True)
-            target_content = json.dumps({k:v for k,v in api_data['data_by_env'][env_keys[1]]['data'].items() if not k.startswith('_')}, sort_keys=True)
-            return int(difflib.SequenceMatcher(None, ref_content, target_content).ratio() * 100)
-    except:
-        pass
-    return 0
+@st.fragment(run_every=1)
+def wait_for_reports(paths):
+    """Polls while reports are being built; reruns the page once they are all done."""
+    jobs = get_report_jobs()
+    if all(jobs.status(path)[0] != "running" for path in paths):
+        st.rerun()
+
+@st.fragment
+def render_report_exports(res, report_dir, history_store):
+    """Export buttons: a report is built in the background on first request, then served from its cache file."""
+    jobs = get_report_jobs()
+    file_stem = f"Comparison_Report_{res['timestamp'].replace(' ', '_')}"
+    cols = st.columns([1, 1, 4])
+    running = []
+    for col, (fmt, label) in zip(cols, [("pdf", "PDF"), ("word", "Word")]):
+        with col:
+            path = report_path(report_dir, res['run_id'], fmt)
+            state, error = jobs.status(path)
+            if state == "ready":
+                with open(path, "rb") as f:
+                    st.download_button(
+                        label=f"⬇️ Export {label}",
+                        data=f.read(),
+                        file_name=f"{file_stem}.{REPORT_FORMATS[fmt][1]}",
+                        mime=REPORT_FORMATS[fmt][2],
+                        use_container_width=True,
+                        key=f"download_{fmt}_{res['run_id']}"
+                    )
+            elif state == "running":
+                st.button(f"⏳ Building {label}...", disabled=True, use_container_width=True, key=f"building_{fmt}_{res['run_id']}")
+                running.append(path)
+            else:
+                if error is not None:
+                    st.error(f"{label} Error: {str(error)[:50]}...")
+                if st.button(f"📄 Prepare {label}", use_container_width=True, key=f"prepare_{fmt}_{res['run_id']}"):
+                    jobs.request(res, fmt, report_dir, load_payloads=history_store.load_payloads)
+                    st.rerun(scope="fragment")
+    if running:
+        wait_for_reports(running)
 
 @st.fragment
 def render_api_result_row(api_id, api_data, run_timestamp):
     icon = "🟢" if api_data['overall_status'] == "Consistent" else "🔴"
-    similarity_score = api_data.get('similarity', 100)
+    similarity_score = get_api_similarity(api_data)
     title_text = f"{icon} [{similarity_score}%] {api_data['name']}"
     
     with st.expander(title_text):
         comparison_data = []
         debug_info = None
         
+        # Oversized bodies were spilled to disk during the run: only read them when asked to
+        spilled_refs = [get_body_ref(e['data']) for e in api_data['data_by_env'].values()]
+        spilled_mb = sum(ref.get('size') or 0 for ref in spilled_refs if ref) / (1024 * 1024)
+        load_spilled = any(spilled_refs) and st.checkbox(
+            f"📦 Load large response bodies ({spilled_mb:.1f} MB)", key=f"load_body_{api_id}_{run_timestamp}"
+        )
+        
         for env_id, env_entry in api_data['data_by_env'].items():
             content_to_show = env_entry['data'].copy()
             if "_debug_request" in content_to_show:
                 debug_info = content_to_show.pop("_debug_request")
+            body_ref = get_body_ref(content_to_show)
+            if body_ref and load_spilled:
+                body = load_response_body(body_ref)
+                content_to_show = body if body is not None else {"_body_ref": body_ref, "error": "Body file is no longer available"}
             
             comparison_data.append({
                 "name": env_entry['env_name'],
@@ -47,7 +88,7 @@ def render_api_result_row(api_id, api_data, run_timestamp):
         
         st.markdown(generate_side_by_side_html(comparison_data), unsafe_allow_html=True)
 
-def render_comparator(history_file, env_config_file, api_template_file):
+def render_comparator(history_store, env_config_file, api_template_file, cassette_dir=None, blob_dir=None, report_dir=None):
     st.title("🚀 Comparator")
     
     # --- Execution Controls ---
@@ -61,6 +102,26 @@ def render_comparator(history_file, env_config_file, api_template_file):
             col = cols[i % 4]
             if col.checkbox(env.get('name') or "Unnamed", key=f"env_select_{env['id']}"):
                 selected_env_ids.append(env['id'])
+
+        e_col1, e_col2, e_col3, e_col4 = st.columns([1, 1, 1, 1])
+        run_engine = e_col1.selectbox(
+            "Execution Engine", ["threads", "asyncio"], key="run_engine",
+            help="threads: one worker per environment. asyncio: all environments on one event loop."
+        )
+        async_transport = e_col2.selectbox(
+            "Async Transport", list(ASYNC_TRANSPORTS.keys()), key="run_async_transport",
+            disabled=run_engine != "asyncio",
+            help="threaded: pooled sessions on a thread pool. aiohttp: native async with the same retry, hedge, cache and connection settings (requires aiohttp)."
+        )
+        run_scheduler = e_col3.selectbox(
+            "Chain Scheduling", ["dag", "sequential"], key="run_scheduler",
+            help="dag: APIs that don't consume another API's extracted variables run concurrently. sequential: strictly by Order."
+        )
+        transport_mode = e_col4.selectbox(
+            "Transport Mode", TRANSPORT_MODES, key="run_transport_mode",
+            disabled=not cassette_dir,
+            help="live: call the backends. record: call them and save every response. replay: re-compare from saved responses only."
+        )
         
         # Helper to stringify JSON
         def to_json_str(x):
@@ -201,23 +262,35 @@ def render_comparator(history_file, env_config_file, api_template_file):
                     prog_place.progress(current / total)
                     status_place.caption(msg)
                 
-                # Execute Logic
-                with st.spinner("🚀 Comparing APIs across environments..."):
-                    results = execute_comparison_run(
-                        selected_api_ids, 
-                        selected_env_ids, 
-                        st.session_state.environments, 
-                        st.session_state.api_templates, 
-                        progress_callback=update_progress
-                    )
-                
-                # Update State & Save
-                st.session_state.current_run_results = results
-                st.session_state.comparison_history.insert(0, results)
-                save_json_file(history_file, st.session_state.comparison_history)
+                changed_envs = []
+                # Extraction writes variables into the environments: edit a private copy
+                make_private('environments')
                 
-                # Save Environments (extraction might have updated them)
-                save_json_file(env_config_file, st.session_state.environments)
+                # Execute Logic
+                try:
+                    with st.spinner("🚀 Comparing APIs across environments..."):
+                        results = execute_comparison_run(
+                            selected_api_ids, 
+                            selected_env_ids, 
+                            st.session_state.environments, 
+                            st.session_state.api_templates, 
+                            progress_callback=update_progress,
+                            transport=build_transport(transport_mode, cassette_dir),
+                            engine=run_engine,
+                            async_transport=async_transport,
+                            scheduler=run_scheduler,
+                            on_variables_changed=changed_envs.extend,
+                            blob_dir=blob_dir
+                        )
+                    
+                    # Update State & Save
+                    st.session_state.current_run_results = results
+                    history_store.add_run(results)
+                finally:
+                    # Save Environments only if extraction updated them; either way the session shares the snapshot again
+                    if changed_envs:
+                        save_json_file(env_config_file, st.session_state.environments)
+                    release_private('environments')
                 
                 st.success("Comparison completed!")
                 st.rerun()
@@ -242,39 +315,8 @@ def render_comparator(history_file, env_config_file, api_template_file):
         </div>
         """, unsafe_allow_html=True)
 
-        # Pre-calculate similarity scores for all APIs for report export
-        for api_id, api_data in res['api_results'].items():
-            if api_data['overall_status'] == "Consistent":
-                similarity_score = 100
-            else:
-                similarity_score = calculate_api_similarity(api_data)
-            api_data['similarity'] = similarity_score
-
-        exp_col1, exp_col2, _ = st.columns([1, 1, 4])
-        with exp_col1:
-            try:
-                pdf_data = generate_pdf_report(res)
-                st.download_button(
-                    label="⬇️ Export PDF",
-                    data=pdf_data,
-                    file_name=f"Comparison_Report_{res['timestamp'].replace(' ', '_')}.pdf",
-                    mime="application/pdf",
-                    use_container_width=True
-                )
-            except Exception as e:
-                st.error(f"PDF Error: {str(e)[:50]}...")
-        with exp_col2:
-            try:
-                word_data = generate_word_report(res)
-                st.download_button(
-                    label="⬇️ Export Word",
-                    data=word_data,
-                    file_name=f"Comparison_Report_{res['timestamp'].replace(' ', '_')}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    use_container_width=True
-                )
-            except Exception as e:
-                st.error(f"Word Error: {str(e)[:50]}...")
+        # Reports are only built when asked for (see report_jobs)
+        render_report_exports(res, report_dir, history_store)
         
         f_col1, f_col2, f_col3 = st.columns([1, 1, 3])
         with f_col1:
@@ -307,7 +349,8 @@ def render_comparator(history_file, env_config_file, api_template_file):
         
         # 3. Render page
         for api_id, api_data in page_apis:
-            render_api_result_row(api_id, api_data, res['timestamp'])
+            # Stored runs keep responses compressed until their row is shown
+            render_api_result_row(api_id, history_store.load_payloads(api_data), res['timestamp'])
         
         if total_pages > 1:
             st.info(f"Showing {start_idx+1}-{min(end_idx, total_apis)} of {total_apis} results")
@@ -4,6 +4,35 @@ import json
 import uuid
 import time
 from logic import save_json_file, parse_openapi_spec, parse_apifox_project
+from http_client import DEFAULT_POOL_MAXSIZE, DEFAULT_KEEP_ALIVE, DEFAULT_WARM_UP, DEFAULT_TIMEOUT, DEFAULT_MAX_BODY_MB
+from rate_limit import DEFAULT_MAX_CONCURRENCY, DEFAULT_RATE_LIMIT_RPS, DEFAULT_RATE_LIMIT_BURST
+from retry_policy import DEFAULT_RETRY_POLICY
+from stream_compare import COMPARATORS, DEFAULT_STREAM_MAX_DIFFS
+from project_store import make_private, release_private
+
+# Every session reads the shared project snapshot (see project_store). An edit first takes this
+# session's own copy (make_private), and a successful save hands the session back to the snapshot.
+
+def save_templates(api_template_file):
+    save_json_file(api_template_file, st.session_state.api_templates)
+    release_private('api_templates')
+
+def save_environments(env_config_file):
+    save_json_file(env_config_file, st.session_state.environments)
+    release_private('environments')
+
+def private_env(env_id):
+    """This session's own copy of an environment, to edit in place."""
+    make_private('environments')
+    return next(e for e in st.session_state.environments if e['id'] == env_id)
+
+def env_needs_migration(e):
+    """True when the legacy-field migration in the Environments tab would change `e`."""
+    variables = e.get("variables")
+    if not isinstance(variables, list) or "auth_token" not in e or "headers" not in e:
+        return True
+    keys = {v['key'] for v in variables if isinstance(v, dict) and 'key' in v}
+    return (bool(e.get("auth_token")) and "auth_token" not in keys) or (isinstance(e.get("headers"), dict) and bool(e["headers"]))
 
 def render_configuration(api_template_file, env_config_file):
     st.title("⚙️ Configuration")
@@ -47,6 +76,7 @@ def render_configuration(api_template_file, env_config_file):
                             
                             if new_apis:
                                  # Merge logic
+                                 make_private('api_templates')
                                  c_ids = {t['id'] for t in st.session_state.api_templates if 'id' in t}
                                  cnt = 0
                                  for item in reversed(new_apis):
@@ -56,7 +86,7 @@ def render_configuration(api_template_file, env_config_file):
                                              if f not in item or item[f] is None: item[f] = {}
                                          st.session_state.api_templates.insert(0, item)
                                          cnt += 1
-                                 save_json_file(api_template_file, st.session_state.api_templates)
+                                 save_templates(api_template_file)
                                  msg_placeholder.success(f"Imported {cnt} APIs!")
                                  st.session_state.uploader_key = str(uuid.uuid4())
                                  st.rerun()
@@ -68,7 +98,7 @@ def render_configuration(api_template_file, env_config_file):
                      st.write("Delete ALL?")
                      if st.button("Confirm", type="primary", use_container_width=True):
                          st.session_state.api_templates = []
-                         save_json_file(api_template_file, [])
+                         save_templates(api_template_file)
                          st.rerun()
             
             # Delete Selected
@@ -94,6 +124,7 @@ def render_configuration(api_template_file, env_config_file):
         # Simulated "Select All" Header
         def toggle_select_all():
             target = st.session_state.get("select_all_apis_master", False)
+            make_private('api_templates')
             for item in st.session_state.api_templates:
                 item['_selected'] = target
 
@@ -105,7 +136,7 @@ def render_configuration(api_template_file, env_config_file):
         api_df = pd.DataFrame(st.session_state.api_templates)
         
         # Ensure Columns
-        cols = ["name", "relative_path", "method", "headers", "params", "json_body", "extract", "id"]
+        cols = ["name", "relative_path", "method", "headers", "params", "json_body", "extract", "cache_ttl", "comparator", "max_diffs", "id"]
         for c in cols:
             if c not in api_df.columns: api_df[c] = None
 
@@ -119,8 +150,6 @@ def render_configuration(api_template_file, env_config_file):
             if json_col in api_df.columns:
                 api_df[json_col] = api_df[json_col].apply(to_json_str)
 
-        for item in st.session_state.api_templates:
-             if '_selected' not in item: item['_selected'] = False
         api_df["Select"] = [item.get('_selected', False) for item in st.session_state.api_templates]
 
         # Data Editor (Reverted to manual Select column to avoid TypeError)
@@ -145,8 +174,24 @@ def render_configuration(api_template_file, env_config_file):
                     width="medium", 
                     help='Define variables to extract from response.\n\nFormat: JSON List of Key-Value pairs.\n\nExample:\n[{"token": "$.result.token"}, {"user_id": "$.result.id"}]'
                 ),
+                "cache_ttl": st.column_config.NumberColumn(
+                    "Cache TTL (s)",
+                    help="GET only. Serve repeated calls from a local cache for this many seconds, revalidating with ETag/Last-Modified afterwards. Empty = no caching.",
+                    min_value=0,
+                    width="small"
+                ),
+                "comparator": st.column_config.SelectboxColumn(
+                    "Comparator", options=COMPARATORS, width="small",
+                    help="deepdiff (default): full diff of both parsed bodies. stream: parse both bodies incrementally side by side and stop after 'Max Diffs' differences (for very large responses)."
+                ),
+                "max_diffs": st.column_config.NumberColumn(
+                    "Max Diffs",
+                    help=f"stream comparator only: stop after this many differences. Empty = {DEFAULT_STREAM_MAX_DIFFS}.",
+                    min_value=1,
+                    width="small"
+                ),
             },
-            column_order=["Select", "order", "name", "relative_path", "method", "headers", "json_body", "extract"],
+            column_order=["Select", "order", "name", "relative_path", "method", "headers", "json_body", "extract", "cache_ttl", "comparator", "max_diffs"],
             use_container_width=True,
             hide_index=True,
             num_rows="dynamic",
@@ -196,7 +241,7 @@ def render_configuration(api_template_file, env_config_file):
                     filtered_data.append(row)
 
                 st.session_state.api_templates = filtered_data
-                save_json_file(api_template_file, st.session_state.api_templates)
+                save_templates(api_template_file)
                 st.session_state.autosave_success = True
                 st.session_state.save_timestamp = time.time()
                 st.session_state.autosave_error = None
@@ -214,12 +259,15 @@ def render_configuration(api_template_file, env_config_file):
                 if ids_to_delete:
                     new_list = [t for t in st.session_state.api_templates if t.get('id') not in ids_to_delete]
                     st.session_state.api_templates = new_list
-                    save_json_file(api_template_file, st.session_state.api_templates)
+                    save_templates(api_template_file)
                     msg_placeholder.success(f"Deleted {len(ids_to_delete)} items.")
                     st.rerun()
                     
     with tab2:
         # Environments Tab
+        # Legacy fields are migrated on this session's own copy (until its next save); nothing is copied otherwise
+        if any(env_needs_migration(e) for e in st.session_state.environments):
+            make_private('environments')
         env_list = st.session_state.environments
         for e in env_list:
             if "variables" not in e: e["variables"] = []
@@ -295,9 +343,10 @@ def render_configuration(api_template_file, env_config_file):
                     "variables": [],
                     "headers": {}
                 }
+                make_private('environments')
                 st.session_state.environments.append(new_env)
                 st.session_state.selected_env_id = new_id 
-                save_json_file(env_config_file, st.session_state.environments)
+                save_environments(env_config_file)
 
             def delete_env():
                 current = st.session_state.selected_env_id
@@ -307,7 +356,7 @@ def render_configuration(api_template_file, env_config_file):
                          st.session_state.selected_env_id = st.session_state.environments[0]['id']
                      else:
                          st.session_state.selected_env_id = None
-                     save_json_file(env_config_file, st.session_state.environments)
+                     save_environments(env_config_file)
 
             c_add, c_del = st.columns(2)
             c_add.button("➕ New", use_container_width=True, on_click=add_env)
@@ -328,9 +377,96 @@ def render_configuration(api_template_file, env_config_file):
                      new_url = c_url.text_input("Base URL", value=target_env.get('base_url', ''))
                      
                      if new_name != target_env.get('name') or new_url != target_env.get('base_url'):
+                         target_env = private_env(target_env['id'])
                          target_env['name'] = new_name
                          target_env['base_url'] = new_url
-                         save_json_file(env_config_file, st.session_state.environments)
+                         save_environments(env_config_file)
+                         st.rerun()
+
+                with st.expander("🔌 Connection & Throttling"):
+                     c_pool, c_alive, c_warm, c_timeout = st.columns(4)
+                     new_pool_size = c_pool.number_input(
+                         "Pool Size", min_value=1, max_value=500, step=1,
+                         value=int(target_env.get('pool_size') or DEFAULT_POOL_MAXSIZE),
+                         key=f"pool_size_{target_env['id']}",
+                         help="Max keep-alive connections kept open to this environment's host."
+                     )
+                     new_keep_alive = c_alive.checkbox(
+                         "Keep-Alive", value=bool(target_env.get('keep_alive', DEFAULT_KEEP_ALIVE)),
+                         key=f"keep_alive_{target_env['id']}"
+                     )
+                     new_warm_up = c_warm.checkbox(
+                         "Warm-up", value=bool(target_env.get('warm_up', DEFAULT_WARM_UP)),
+                         key=f"warm_up_{target_env['id']}",
+                         help="Open a connection before each run so the first API skips the TCP/TLS handshake."
+                     )
+                     new_timeout = c_timeout.number_input(
+                         "Timeout (s)", min_value=0.5, max_value=600.0, step=0.5,
+                         value=float(target_env.get('timeout') or DEFAULT_TIMEOUT),
+                         key=f"timeout_{target_env['id']}"
+                     )
+                     new_max_body = c_timeout.number_input(
+                         "Max Body in Memory (MB)", min_value=0.0, max_value=4096.0, step=1.0,
+                         value=float(target_env.get('max_body_mb') if target_env.get('max_body_mb') is not None else DEFAULT_MAX_BODY_MB),
+                         key=f"max_body_mb_{target_env['id']}",
+                         help="Larger responses are streamed to a file and only loaded when diffed or viewed. 0 = no cap."
+                     )
+
+                     c_conc, c_rps, c_burst, c_retry = st.columns(4)
+                     new_max_concurrency = c_conc.number_input(
+                         "Max Concurrent", min_value=1, max_value=1000, step=1,
+                         value=int(target_env.get('max_concurrency') or DEFAULT_MAX_CONCURRENCY),
+                         key=f"max_concurrency_{target_env['id']}",
+                         help="Max requests in flight against this environment during a run."
+                     )
+                     new_rps = c_rps.number_input(
+                         "Requests / s", min_value=0.0, max_value=10000.0, step=1.0,
+                         value=float(target_env.get('rate_limit_rps') or DEFAULT_RATE_LIMIT_RPS),
+                         key=f"rate_limit_rps_{target_env['id']}",
+                         help="Token bucket rate shared by all runs. 0 = unlimited."
+                     )
+                     new_burst = c_burst.number_input(
+                         "Burst", min_value=0, max_value=10000, step=1,
+                         value=int(target_env.get('rate_limit_burst') or DEFAULT_RATE_LIMIT_BURST),
+                         key=f"rate_limit_burst_{target_env['id']}",
+                         help="Requests allowed at once before the rate applies. 0 = same as Requests / s."
+                     )
+
+                     env_retry = target_env.get('retry') if isinstance(target_env.get('retry'), dict) else {}
+                     new_attempts = c_retry.number_input(
+                         "Max Attempts", min_value=1, max_value=10, step=1,
+                         value=int(env_retry.get('max_attempts') or DEFAULT_RETRY_POLICY['max_attempts']),
+                         key=f"retry_attempts_{target_env['id']}",
+                         help=f"Retries timeouts, connection errors and {DEFAULT_RETRY_POLICY['retry_on_status']} with exponential backoff + jitter. Templates can override with a 'retry' object."
+                     )
+                     new_hedge = c_retry.checkbox(
+                         "Hedge slow GETs", value=bool(env_retry.get('hedge', DEFAULT_RETRY_POLICY['hedge'])),
+                         key=f"retry_hedge_{target_env['id']}",
+                         help="Send a duplicate request once a GET is slower than its p95 latency and keep the first answer."
+                     )
+                     current_retry = {k: env_retry.get(k, DEFAULT_RETRY_POLICY[k]) for k in ('max_attempts', 'hedge')}
+                     if current_retry != {'max_attempts': int(new_attempts), 'hedge': new_hedge}:
+                         target_env = private_env(target_env['id'])
+                         target_env['retry'] = {**env_retry, 'max_attempts': int(new_attempts), 'hedge': new_hedge}
+                         save_environments(env_config_file)
+                         st.rerun()
+
+                     conn_defaults = {
+                         'pool_size': DEFAULT_POOL_MAXSIZE, 'keep_alive': DEFAULT_KEEP_ALIVE, 'warm_up': DEFAULT_WARM_UP,
+                         'timeout': DEFAULT_TIMEOUT, 'max_concurrency': DEFAULT_MAX_CONCURRENCY,
+                         'rate_limit_rps': DEFAULT_RATE_LIMIT_RPS, 'rate_limit_burst': DEFAULT_RATE_LIMIT_BURST,
+                         'max_body_mb': DEFAULT_MAX_BODY_MB
+                     }
+                     conn_settings = {
+                         'pool_size': int(new_pool_size), 'keep_alive': new_keep_alive, 'warm_up': new_warm_up,
+                         'timeout': float(new_timeout), 'max_concurrency': int(new_max_concurrency),
+                         'rate_limit_rps': float(new_rps), 'rate_limit_burst': int(new_burst),
+                         'max_body_mb': float(new_max_body)
+                     }
+                     if {k: target_env.get(k, d) for k, d in conn_defaults.items()} != conn_settings:
+                         target_env = private_env(target_env['id'])
+                         target_env.update(conn_settings)
+                         save_environments(env_config_file)
                          st.rerun()
 
                 st.caption(f"Variables for: **{target_env.get('name')}**")
@@ -364,8 +500,9 @@ def render_configuration(api_template_file, env_config_file):
                     try:
                         new_vars_list = json.loads(edited_vars.to_json(orient="records"))
                         new_vars_list = [v for v in new_vars_list if v.get('key')]
+                        target_env = private_env(target_env['id'])
                         target_env['variables'] = new_vars_list
-                        save_json_file(env_config_file, st.session_state.environments)
+                        save_environments(env_config_file)
                         st.session_state.autosave_success = True
                         st.session_state.save_timestamp = time.time()
                         st.rerun()
@@ -1,20 +1,24 @@
 import streamlit as st
 from logic import execute_comparison_run, save_json_file
+from project_store import make_private, release_private
+from report_jobs import discard_reports
+from response_body import discard_run_bodies
 
 def render_dashboard():
     st.title("📊 Dashboard")
+    history_store = st.session_state.project_manager.get_history_store(st.session_state.current_project_id)
     
     @st.dialog("Delete Record")
-    def confirm_delete(index, run_id):
+    def confirm_delete(run_id):
         st.warning(f"Are you sure you want to delete this record? (ID: {run_id})")
         c1, c2 = st.columns(2)
         if c1.button("Cancel", use_container_width=True):
             st.rerun()
         if c2.button("Confirm Delete", type="primary", use_container_width=True):
-            st.session_state.comparison_history.pop(index)
-            pm = st.session_state.project_manager
-            paths = pm.get_project_paths(st.session_state.current_project_id)
-            save_json_file(paths['history_file'], st.session_state.comparison_history)
+            history_store.delete_run(run_id)
+            paths = st.session_state.project_manager.get_project_paths(st.session_state.current_project_id)
+            discard_reports(paths['report_dir'], run_id)
+            discard_run_bodies(paths['blob_dir'], run_id)
             st.session_state['deletion_success'] = True
             st.rerun()
 
@@ -22,8 +26,8 @@ def render_dashboard():
         st.toast("✅ Record deleted successfully!")
         del st.session_state['deletion_success']
     
-    total_runs = len(st.session_state.comparison_history)
-    last_run = st.session_state.comparison_history[0] if total_runs > 0 else None
+    latest, total_runs = history_store.query_summaries(limit=1)
+    last_run = latest[0] if latest else None
     
     col1, col2, col3 = st.columns(3)
     col1.metric("Total Runs", total_runs)
@@ -32,10 +36,37 @@ def render_dashboard():
         col3.metric("Last Run Time", last_run['timestamp'].split(' ')[0])
         
     st.markdown("### Recent History")
-    if not st.session_state.comparison_history:
+    if not total_runs:
         st.info("No history available. Go to 'Comparator' to run a comparison.")
         return
 
+    # --- Filters & Pagination (only the visible page is read from the history store) ---
+    f_col1, f_col2, f_col3, f_col4 = st.columns([2, 3, 1.2, 1])
+    date_range = f_col1.date_input("Date range", value=(), key="hist_filter_dates")
+    env_filter = f_col2.multiselect("Environments", history_store.env_names(), key="hist_filter_envs")
+    status_filter = f_col3.selectbox("Show:", ["All", "Same", "Different", "Error"], key="hist_filter_status")
+    page_size = f_col4.selectbox("Per page", [10, 25, 50], key="hist_page_size")
+
+    date_range = tuple(date_range) if isinstance(date_range, (list, tuple)) else (date_range,)
+    date_from = date_range[0] if len(date_range) > 0 else None
+    date_to = date_range[1] if len(date_range) > 1 else date_from
+    filters = dict(date_from=date_from, date_to=date_to, envs=env_filter, status=status_filter)
+
+    # Back to the first page whenever the filters change
+    filter_key = (date_from, date_to, tuple(env_filter), status_filter, page_size)
+    if st.session_state.get('hist_filter_key') != filter_key:
+        st.session_state.hist_filter_key = filter_key
+        st.session_state.hist_page = 1
+
+    _, total_matches = history_store.query_summaries(limit=0, **filters)
+    total_pages = max(1, (total_matches + page_size - 1) // page_size)
+    current_page = min(st.session_state.get('hist_page', 1), total_pages)
+    st.session_state.hist_page = current_page
+    page_runs, _ = history_store.query_summaries(offset=(current_page - 1) * page_size, limit=page_size, **filters)
+    if not page_runs:
+        st.info("No runs match these filters.")
+        return
+
     # Header
     h_cols = [1.3, 1.8, 1, 1.2, 3.2, 3]
     h1, h2, h3, h4, h5, h6 = st.columns(h_cols)
@@ -47,7 +78,7 @@ def render_dashboard():
     h6.markdown("**Comment**")
     st.markdown("---")
 
-    for i, run in enumerate(st.session_state.comparison_history):
+    for run in page_runs:
         c1, c2, c3, c4, c5, c6 = st.columns(h_cols)
         c1.write(run['timestamp'])
         c2.write(", ".join(run['envs']))
@@ -55,12 +86,12 @@ def render_dashboard():
         # API List Popover
         with c3.popover(f"🔍 {run['api_count']}"):
             api_list = []
-            for uid, details in run.get('api_results', {}).items():
+            for details in run.get('apis', []):
                 path = details.get('relative_path')
                 if not path: # Fallback for old history
-                    path = next((t['relative_path'] for t in st.session_state.api_templates if t['id'] == uid), "N/A")
+                    path = next((t['relative_path'] for t in st.session_state.api_templates if t['id'] == details['id']), "N/A")
                 api_list.append({
-                    "Name": details.get('name', 'Unknown'),
+                    "Name": details.get('name') or 'Unknown',
                     "Path": path
                 })
             if api_list:
@@ -73,7 +104,7 @@ def render_dashboard():
         # Action Column (View, Rerun, Delete)
         v_col, r_col, d_col = c5.columns([1, 1, 0.6])
         if v_col.button("View", key=f"view_{run['run_id']}", use_container_width=True):
-            st.session_state.current_run_results = run
+            st.session_state.current_run_results = history_store.open_run(run['run_id'])
             st.session_state.page = "comparator"
             st.rerun()
         
@@ -82,39 +113,51 @@ def render_dashboard():
             with st.spinner("Rerunning..."):
                 env_name_to_id = {e['name']: e['id'] for e in st.session_state.environments}
                 run_env_ids = [env_name_to_id[name] for name in run['envs'] if name in env_name_to_id]
-                run_api_ids = list(run['api_results'].keys())
+                run_api_ids = [api['id'] for api in run.get('apis', [])]
                 
                 if len(run_env_ids) < 2:
                     st.error("Error: Environments missing.")
                 elif not run_api_ids:
                     st.error("Error: APIs missing.")
                 else:
-                    new_results = execute_comparison_run(
-                        run_api_ids,
-                        run_env_ids,
-                        st.session_state.environments,
-                        st.session_state.api_templates
-                    )
-                    st.session_state.comparison_history.insert(0, new_results)
-                    pm = st.session_state.project_manager
-                    paths = pm.get_project_paths(st.session_state.current_project_id)
-                    save_json_file(paths['history_file'], st.session_state.comparison_history)
+                    changed_envs = []
+                    # Extraction writes variables into the environments: edit a private copy
+                    make_private('environments')
+                    paths = st.session_state.project_manager.get_project_paths(st.session_state.current_project_id)
+                    try:
+                        new_results = execute_comparison_run(
+                            run_api_ids,
+                            run_env_ids,
+                            st.session_state.environments,
+                            st.session_state.api_templates,
+                            on_variables_changed=changed_envs.extend,
+                            blob_dir=paths['blob_dir']
+                        )
+                        history_store.add_run(new_results)
+                    finally:
+                        # Save Environments only if extraction updated them; either way the session shares the snapshot again
+                        if changed_envs:
+                            save_json_file(paths['env_file'], st.session_state.environments)
+                        release_private('environments')
                     st.session_state.current_run_results = new_results
                     st.success("Rerun done!")
                     st.rerun()
 
         if d_col.button("🗑️", key=f"btn_del_{run['run_id']}", use_container_width=True):
-            confirm_delete(i, run['run_id'])
+            confirm_delete(run['run_id'])
 
         # Comment Column (Persistent)
         comment_val = run.get('comment', "")
         new_comment = c6.text_input("Comment", value=comment_val, key=f"cmt_{run['run_id']}", label_visibility="collapsed")
         if new_comment != comment_val:
-            run['comment'] = new_comment
-            pm = st.session_state.project_manager
-            paths = pm.get_project_paths(st.session_state.current_project_id)
-            save_json_file(paths['history_file'], st.session_state.comparison_history)
+            history_store.update_comment(run['run_id'], new_comment)
             st.rerun()
 
         st.markdown("<hr style='margin: 5px 0; opacity: 0.5;'>", unsafe_allow_html=True)
 
+    p_col1, p_col2 = st.columns([1, 5])
+    if total_pages > 1:
+        p_col1.number_input(f"Page (1-{total_pages})", min_value=1, max_value=total_pages, step=1, key="hist_page")
+    start_idx = (current_page - 1) * page_size
+    p_col2.caption(f"Showing {start_idx + 1}-{start_idx + len(page_runs)} of {total_matches} runs")
+
@@ -1,6 +1,9 @@
 import streamlit as st
 import json
+import uuid
 from logic import fetch_api_data, save_json_file
+from response_body import get_body_ref, load_response_body, discard_run_bodies, run_blob_dir
+from project_store import make_private
 
 def render_debugger():
     st.title("🛠️ Single API Debugger")
@@ -33,6 +36,7 @@ def render_debugger():
         st.write("")
         if st.button("🔄 Reset", use_container_width=True):
             if 'debug_api_id' in st.session_state: del st.session_state['debug_api_id']
+            st.session_state.pop('playground_last', None)
             st.rerun()
 
     # Initialize/Update State from Template
@@ -92,16 +96,13 @@ def render_debugger():
         with ex_col1:
             extract_var_name = st.text_input("Target Variable Name", placeholder="e.g. auth_token", help="Variable to update/create in the selected environment")
         with ex_col2:
-            extract_json_path = st.text_input("JSON Path", placeholder="e.g. $.result.token", help="Path to value in response JSON")
+            extract_json_path = st.text_input("JSON Path", placeholder="e.g. $.result.token", help="JSONPath to the value in the response, e.g. $.items[0].id, $['key.with.dots'], $.items[?(@.type=='x')].id, $..token (first match is used)")
             
     st.markdown("<br>", unsafe_allow_html=True)
     send_clicked = st.button("🚀 Send Request", type="primary", use_container_width=True)
 
     # --- Response Area ---
     if send_clicked:
-        st.markdown("---")
-        st.subheader("Response")
-        
         # Construct temporary template
         temp_template = {
             "id": "debug_temp",
@@ -121,8 +122,11 @@ def render_debugger():
 
         with st.spinner("Sending request..."):
             temp_template['headers'] = custom_headers
+            # A Playground response is never stored: its spilled body only lives until the next request
+            spill_id = st.session_state.setdefault('playground_spill_id', f"playground-{uuid.uuid4()}")
+            discard_run_bodies(None, spill_id)
             # Pass empty dict for context if None, logic.py handles it now regardless
-            result = fetch_api_data(selected_env, temp_template, {})
+            result = fetch_api_data(selected_env, temp_template, {}, blob_dir=run_blob_dir(None, spill_id))
             
         # Separate Debug Info
         debug_info = None
@@ -132,46 +136,62 @@ def render_debugger():
         # Display Status Code if available
         status_code = result.get("_status_code", "N/A") if isinstance(result, dict) else "N/A"
         if "_status_code" in result: del result["_status_code"]
+
+        # Kept across reruns so widgets below (e.g. loading a spilled body) don't lose the response
+        st.session_state.playground_last = {"result": result, "debug_info": debug_info, "status_code": status_code}
+        st.session_state.pop("pg_load_body", None)
         
+        failed = isinstance(result, dict) and "error" in result and result.get("status") == "failed"
+        # --- Logic: Post-Process Extraction ---
+        if not failed and extract_var_name and extract_json_path:
+            from logic import extract_value_from_response
+            # Reuse existing extraction logic which takes a list of rules
+            rule = {"source": extract_json_path, "target_var": extract_var_name}
+            extracted = extract_value_from_response(load_response_body(result) or {} if get_body_ref(result) else result, [rule])
+            
+            if extract_var_name in extracted:
+                new_val = extracted[extract_var_name]
+                
+                # Update Environment Variables (on this session's own copy)
+                make_private('environments')
+                selected_env = next(e for e in st.session_state.environments if e['id'] == selected_env['id'])
+                var_found = False
+                for v in selected_env['variables']:
+                    if v['key'] == extract_var_name:
+                        v['value'] = str(new_val)
+                        var_found = True
+                        break
+                if not var_found:
+                    selected_env['variables'].append({
+                        "key": extract_var_name,
+                        "value": str(new_val),
+                        "description": "Extracted from Playground"
+                    })
+                
+                save_json_file("environments.json", st.session_state.environments) # Note: path relies on default or needs to be passed in
+                st.toast(f"✅ Updated variable '{extract_var_name}' with value: {new_val}", icon="💾")
+            else:
+                st.warning(f"⚠️ Could not find path '{extract_json_path}' in response.")
+
+    last = st.session_state.get("playground_last")
+    if last:
+        st.markdown("---")
+        st.subheader("Response")
+        result = last["result"]
+
         # 1. Status Bar
         if isinstance(result, dict) and "error" in result and result.get("status") == "failed":
             st.error(f"❌ Failed: {result['error']}")
         else:
-            st.success(f"✅ Success (Status: {status_code})")
-            
-            # --- Logic: Post-Process Extraction ---
-            if extract_var_name and extract_json_path:
-                from logic import extract_value_from_response
-                # Reuse existing extraction logic which takes a list of rules
-                rule = {"source": extract_json_path, "target_var": extract_var_name}
-                extracted = extract_value_from_response(result, [rule])
-                
-                if extract_var_name in extracted:
-                    new_val = extracted[extract_var_name]
-                    
-                    # Update Environment Variables
-                    var_found = False
-                    for v in selected_env['variables']:
-                        if v['key'] == extract_var_name:
-                            v['value'] = str(new_val)
-                            var_found = True
-                            break
-                    if not var_found:
-                        selected_env['variables'].append({
-                            "key": extract_var_name,
-                            "value": str(new_val),
-                            "description": "Extracted from Playground"
-                        })
-                    
-                    save_json_file("environments.json", st.session_state.environments) # Note: path relies on default or needs to be passed in
-                    st.toast(f"✅ Updated variable '{extract_var_name}' with value: {new_val}", icon="💾")
-                else:
-                    st.warning(f"⚠️ Could not find path '{extract_json_path}' in response.")
+            st.success(f"✅ Success (Status: {last['status_code']})")
 
         # 2. Debug Info (Collapsible)
-        if debug_info:
+        if last["debug_info"]:
             with st.expander("ℹ️ Request Details"):
-                st.json(debug_info)
+                st.json(last["debug_info"])
 
-        # 3. Response Body
+        # 3. Response Body (oversized bodies were spilled to disk)
+        body_ref = get_body_ref(result)
+        if body_ref and st.checkbox(f"📦 Load large response body ({(body_ref.get('size') or 0) / (1024 * 1024):.1f} MB)", key="pg_load_body"):
+            result = load_response_body(body_ref)
         st.json(result)
@@ -0,0 +1,62 @@
+import threading
+
+
+class VariableStore:
+    """
+    Keyed, thread-safe view over one environment's `variables` list for the duration of a run.
+    Extracted values are recorded in O(1) and only written back to env['variables'] by flush(),
+    once, at the end of the run.
+    """
+    def __init__(self, env):
+        self.env = env
+        self._lock = threading.RLock()
+        self._values = {}
+        variables = env.get('variables')
+        if isinstance(variables, list):
+            for item in variables:
+                if isinstance(item, dict) and 'key' in item:
+                    self._values.setdefault(item['key'], item.get('value'))
+        self._dirty = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def set_many(self, new_vars):
+        """Record extracted values ("Refresh if exists, Create if not"); unchanged values are not dirty."""
+        with self._lock:
+            for key, value in new_vars.items():
+                str_val = str(value)
+                if key in self._values and self._values[key] == str_val and key not in self._dirty:
+                    continue
+                self._values[key] = str_val
+                self._dirty[key] = str_val
+
+    @property
+    def dirty(self):
+        with self._lock:
+            return bool(self._dirty)
+
+    def flush(self):
+        """Write pending values into env['variables'] in one pass. Returns True if the environment changed."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            # env['variables'] is a list of dicts: [{"key": "k", "value": "v", ...}]
+            if 'variables' not in self.env or not isinstance(self.env['variables'], list):
+                self.env['variables'] = []
+            items = {}
+            for item in self.env['variables']:
+                if isinstance(item, dict) and 'key' in item:
+                    items.setdefault(item.get('key'), item)
+            for key, value in self._dirty.items():
+                if key in items:
+                    items[key]['value'] = value
+                else:
+                    self.env['variables'].append({
+                        "key": key,
+                        "value": value,
+                        "description": "Auto-extracted"
+                    })
+            self._dirty = {}
+            return True
@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from async_engine import get_async_transport, fetch_api_data_async
+from rate_limit import EnvLimiter
+from response_cache import get_response_cache
+
+# Requires the optional aiohttp package: the native async path must honour the same
+# retry/hedge and cache_ttl settings as the default sync transport.
+
+hits = {}
+connection_headers = []
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        path = self.path.split('?')[0]
+        hits[path] = hits.get(path, 0) + 1
+        connection_headers.append(self.headers.get('Connection'))
+        if path == "/flaky" and hits[path] < 3:
+            return self.reply(503, {"error": "busy"})
+        if path == "/slow" and hits[path] == 1:
+            time.sleep(1.0)
+        if path == "/cached" and self.headers.get('If-None-Match') == '"v1"':
+            return self.reply(304, None, {"ETag": '"v1"'})
+        self.reply(200, {"path": path, "hit": hits[path]}, {"ETag": '"v1"'} if path == "/cached" else {})
+
+    def reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # The losing hedge was cancelled
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+env = {"id": "async_env", "name": "Async Env", "base_url": f"http://127.0.0.1:{server.server_port}", "variables": [], "headers": {}}
+
+
+def template(path, **extra):
+    return {"id": f"tpl{path}", "name": path, "relative_path": path, "method": "GET", "headers": {}, "params": {}, "json_body": {}, **extra}
+
+
+async def fetch_all(calls, env=env):
+    transport = get_async_transport("aiohttp")
+    limiter = EnvLimiter(env)
+    await transport.open()
+    try:
+        results = []
+        for api_template in calls:
+            results.append(await fetch_api_data_async(env, api_template, {}, transport, limiter))
+        return results
+    finally:
+        await transport.close()
+
+
+failures = []
+
+
+def check(label, ok, detail=""):
+    print(f"{'✅' if ok else '❌'} {label}" + (f": {detail}" if not ok and detail else ""))
+    if not ok:
+        failures.append(label)
+
+
+print("Running verification for the aiohttp transport chain...")
+
+# --- Retry: 503 twice, then 200 ---
+print("\n[RETRY]")
+fast_retry = {"max_attempts": 3, "backoff_base": 0.01, "jitter": False}
+[flaky] = asyncio.run(fetch_all([template("/flaky", retry=fast_retry)]))
+attempts = flaky.get('_debug_request', {}).get('attempts', [])
+check("succeeds after retrying", flaky.get('_status_code') == 200, json.dumps(flaky, default=str)[:300])
+check("every attempt recorded", [a.get('status') for a in attempts] == [503, 503, 200], attempts)
+
+dead_env = {**env, "id": "dead_env", "base_url": "http://127.0.0.1:1", "retry": {"max_attempts": 2, "backoff_base": 0.01}}
+[dead] = asyncio.run(fetch_all([template("/down")], env=dead_env))
+dead_attempts = dead.get('_debug_request', {}).get('attempts', [])
+check("connection errors are retried", dead.get('status') == "failed" and len(dead_attempts) == 2 and all('error' in a for a in dead_attempts), dead_attempts)
+
+# --- Hedge: the first request stalls, the duplicate wins ---
+print("\n[HEDGE]")
+started = time.monotonic()
+[slow] = asyncio.run(fetch_all([template("/slow", retry={"hedge": True, "hedge_after_ms": 100})]))
+record = slow.get('_debug_request', {}).get('attempts', [{}])[0]
+check("hedge answers before the stalled request", record.get('hedged') and record.get('winner') == "hedge" and time.monotonic() - started < 0.9, record)
+
+# --- Cache: fresh hit, then 304 revalidation once stale ---
+print("\n[CACHE]")
+get_response_cache().clear()
+first, second = asyncio.run(fetch_all([template("/cached", cache_ttl=0.3)] * 2))
+check("first GET is a miss", first.get('_debug_request', {}).get('cache') == "miss")
+check("second GET is served from the cache", second.get('_debug_request', {}).get('cache') == "hit" and hits.get("/cached") == 1, hits)
+time.sleep(0.4)
+[stale] = asyncio.run(fetch_all([template("/cached", cache_ttl=0.3)]))
+check("stale entry is revalidated", stale.get('_debug_request', {}).get('cache') == "revalidated" and stale.get('hit') == 1, stale)
+[uncached] = asyncio.run(fetch_all([template("/cached")]))
+check("templates without cache_ttl skip the cache", 'cache' not in uncached.get('_debug_request', {}) and hits.get("/cached") == 3, hits)
+
+# --- Connection settings ---
+print("\n[KEEP-ALIVE]")
+connection_headers.clear()
+asyncio.run(fetch_all([template("/plain")], env={**env, "id": "close_env", "keep_alive": False}))
+check("keep_alive off closes the connection", connection_headers == ["close"], connection_headers)
+
+server.shutdown()
+if failures:
+    print(f"\n❌ {len(failures)} check(s) failed:", json.dumps(failures))
+    sys.exit(1)
+print("\n✅ All async transport checks passed.")
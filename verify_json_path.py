@@ -0,0 +1,166 @@
+import sys
+import json
+from json_path import JsonPathError, compile_path, find_first
+from logic import extract_value_from_response
+
+
+def legacy_extract_value_from_response(response_data, extraction_rules):
+    """Post Action extraction as it was before json_path: dotted paths applied rule by rule."""
+    extracted = {}
+    if not extraction_rules or not isinstance(extraction_rules, list):
+        return extracted
+
+    for rule in extraction_rules:
+        if 'source' in rule and 'target_var' in rule:
+            items = [(rule['target_var'], rule['source'])]
+        else:
+            items = list(rule.items())
+
+        for target_var, source_path in items:
+            val = response_data
+            try:
+                parts = source_path.replace("$.", "").split('.')
+                for part in parts:
+                    if isinstance(val, dict):
+                        val = val.get(part)
+                    elif isinstance(val, list) and part.isdigit():
+                        val = val[int(part)]
+                    else:
+                        val = None
+                        break
+
+                if val is not None:
+                    extracted[target_var] = val
+            except Exception:
+                pass
+    return extracted
+
+
+# Mock Response
+response = {
+    "result": {
+        "token": "abc",
+        "user": {"id": 7, "roles": ["admin", "dev"]},
+        "zero": 0,
+        "flag": False,
+        "empty": "",
+        "none": None,
+    },
+    "items": [
+        {"id": 1, "type": "a", "price": 5},
+        {"id": 2, "type": "b", "price": 20},
+        {"id": 3, "type": "b", "price": 30, "discount": 0.1},
+    ],
+    "matrix": [[1, 2], [3, 4]],
+    "key.with.dots": "dotted",
+    "it's": "quoted",
+}
+
+failures = []
+
+
+def check(label, got, expected):
+    if got == expected:
+        print(f"✅ {label}")
+    else:
+        print(f"❌ {label}: expected {expected!r}, got {got!r}")
+        failures.append(label)
+
+
+print("Running verification for Post Action extraction paths...")
+
+# --- Dotted paths: same results as the old extraction ---
+print("\n[LEGACY PATHS]")
+legacy_paths = [
+    "result.token", "$.result.token", "$.result.user.id", "result.user.roles.1",
+    "items.0.id", "$.items.2.price", "matrix.1.0",
+    "result.zero", "result.flag", "result.empty", "result.none",
+    "result.missing", "missing.deep.key", "items.9.id", "items.x", "result.token.deeper",
+]
+for path in legacy_paths:
+    rules = [{"value": path}]
+    check(path, extract_value_from_response(response, rules), legacy_extract_value_from_response(response, rules))
+
+rules = [
+    {"source": "result.user.id", "target_var": "uid"},
+    {"token": "$.result.token", "role": "result.user.roles.0"},
+    {"token": "result.missing"},
+    {"uid": "items.1.id"},
+]
+check("rule formats, later rules win", extract_value_from_response(response, rules), legacy_extract_value_from_response(response, rules))
+
+# --- JSONPath: bracket and quoted keys ---
+print("\n[BRACKETS & QUOTED KEYS]")
+for path, expected in [
+    ("$['key.with.dots']", "dotted"),
+    ("$[\"it's\"]", "quoted"),
+    ("$['it\\'s']", "quoted"),
+    ("$.result['user']['roles'][0]", "admin"),
+    ("$['result'].user.id", 7),
+    ("$.items[1].id", 2),
+    ("$.items[-1].id", 3),
+    ("$.matrix[1][0]", 3),
+    ("$['result','items'].token", "abc"),
+]:
+    check(path, find_first(response, path), expected)
+
+# --- JSONPath: wildcards, slices, filters, recursive descent (first match) ---
+print("\n[WILDCARDS]")
+for path, expected in [
+    ("$.items[*].id", 1),
+    ("$.items.*.price", 5),
+    ("$.items[*].discount", 0.1),
+    ("$.matrix[*][1]", 2),
+    ("$.items[1:3].id", 2),
+    ("$.items[::2].id", 1),
+    ("$.items[?(@.type=='b' && @.price > 25)].id", 3),
+    ("$.items[?(@.discount)].price", 30),
+    ("$..id", 7),
+    ("$..roles[1]", "dev"),
+]:
+    check(path, find_first(response, path), expected)
+
+# --- Missing keys: nothing is extracted ---
+print("\n[MISSING KEYS]")
+for path in ["$['missing']", "$.items[5]", "$.items[*].missing", "$.result.none", "$..nowhere",
+             "$.items[?(@.type=='z')].id", "$.result.token[0]"]:
+    check(path, find_first(response, path), None)
+check("missing keys are left out", extract_value_from_response(response, [{"a": "$['missing']", "b": "$.items[*].missing"}]), {})
+
+# --- Overlapping paths: one traversal gives what each path gives on its own ---
+print("\n[OVERLAPPING PATHS]")
+overlapping = {
+    "first_id": "$.items[*].id",
+    "first_price": "$.items[*].price",
+    "discount": "$.items[*].discount",
+    "b_id": "$.items[?(@.type=='b')].id",
+    "item0": "$.items[0]",
+    "item0_id": "$.items[0].id",
+    "items": "$.items",
+    "legacy_id": "items.0.id",
+    "role": "$.result.user.roles[1]",
+    "none": "$.result.none",
+}
+together = extract_value_from_response(response, [overlapping])
+one_by_one = {var: find_first(response, path) for var, path in overlapping.items()}
+check("shared prefixes, single traversal", together, {k: v for k, v in one_by_one.items() if v is not None})
+check("values", together, {
+    "first_id": 1, "first_price": 5, "discount": 0.1, "b_id": 2, "item0": response["items"][0],
+    "item0_id": 1, "items": response["items"], "legacy_id": 1, "role": "dev",
+})
+
+# --- Invalid paths fail to compile and extract nothing ---
+print("\n[INVALID PATHS]")
+for path in ["$.items[", "$.items[?(@.type==)]", "$.items[1:2:0]", "$.a..", "$.items[abc]"]:
+    try:
+        compile_path(path)
+        print(f"❌ {path}: compiled")
+        failures.append(path)
+    except JsonPathError as e:
+        print(f"✅ {path}: {e}")
+check("invalid path is skipped", extract_value_from_response(response, [{"bad": "$.items[", "ok": "$.result.token"}]), {"ok": "abc"})
+
+if failures:
+    print(f"\n❌ {len(failures)} check(s) failed:", json.dumps(failures))
+    sys.exit(1)
+print("\n✅ All extraction checks passed.")